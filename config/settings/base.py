@@ -9,10 +9,36 @@ INSTALLED_APPS = (
 ETHEREUM_NODE_URL = 'https://mainnet.infura.io:8545'
 ETHEREUM_MAX_WORKERS = 10
 ETHEREUM_MAX_BATCH_REQUESTS = 500
+# Adapt batch size (starting with ETHEREUM_MAX_BATCH_REQUESTS) to node response time and rejected batches
+ETHEREUM_ADAPTIVE_BATCH_REQUESTS = True
+# Batch size is shrunk when a batch response is bigger than this size in bytes, `None` for no limit
+ETHEREUM_MAX_BATCH_RESPONSE_SIZE = None
+# Method to get every receipt of a block with one request: `auto` (detect), `eth_getBlockReceipts`,
+# `parity_getBlockReceipts` or `None` (receipts are retrieved transaction by transaction)
+ETHEREUM_BLOCK_RECEIPTS_METHOD = 'auto'
+# Max requests and max weight (compute units) per second sent to the node, `None` for no limit
+ETHEREUM_MAX_REQUESTS_PER_SECOND = None
+ETHEREUM_MAX_WEIGHT_PER_SECOND = None
+# Compression of batched requests: `None` (not compressed), `auto` (gzip until node rejects a compressed request),
+# `gzip` or `deflate`
+ETHEREUM_REQUEST_COMPRESSION = None
+# Proxy for the node always accepting compressed requests, used for batched requests
+ETHEREUM_COMPRESSED_PROXY_URL = None
+# Send block number, block and receipt requests without the web3 middleware stack
+ETHEREUM_RAW_REQUESTS = True
 
 ETH_BACKUP_BLOCKS = 100
 ETH_PROCESS_BLOCKS = 10000
 ETH_FILTER_PROCESS_BLOCKS = 100000
+# Logs prefetch strategy for live sync: `auto`, `range` (eth_getLogs), `filter` (eth_getLogs only for
+# watched addresses and known events) or `receipts`
+ETH_LOGS_PREFETCH_STRATEGY = 'auto'
+# Max number of addresses in the same eth_getLogs filter
+ETH_FILTER_MAX_ADDRESSES = 1000
+# Process logs while they are received when syncing with filters, so memory doesn't grow with the number of logs
+ETH_FILTER_STREAM_LOGS = False
+# Event receivers get lazy decoded events, params are decoded when they are read
+ETH_LAZY_DECODED_EVENTS = False
 
 # ------------------------------------------------------------------------------
 # CELERY CONFIGURATION
@@ -0,0 +1,275 @@
+import asyncio
+import itertools
+import logging
+from typing import Dict, List, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from eth_utils import to_checksum_address
+
+from .exceptions import (UnknownBlock, UnknownTransaction,
+                         Web3ConnectionException)
+from .json_codec import json_codec
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWeb3Service:
+    """
+    Asyncio version of `Web3Service` for http/s nodes. Every request goes through the same `aiohttp` session,
+    and no more than `max_in_flight_requests` requests are sent to the node at the same time.
+    Results are formatted like `Web3Service` batched results: block `number` and `timestamp` and log
+    `blockNumber`, `logIndex` and `transactionIndex` are integers and log `address` is checksumed
+    """
+
+    def __init__(self, node_uri: str, max_in_flight_requests: int=100, max_batch_requests: int=10,
+                 request_timeout: int=30, slow_request_timeout: int=400):
+        """
+        :param node_uri: Node http address
+        :param max_in_flight_requests: Max requests waiting for the node response at the same time
+        :param max_batch_requests: Max requests in the same batch for RPC
+        :param request_timeout: Timeout for requests
+        :param slow_request_timeout: Timeout for time lasting requests (like filters)
+        """
+        if aiohttp is None:
+            raise ImproperlyConfigured('aiohttp is required for AsyncWeb3Service, '
+                                       'install django-eth-events[async]')
+        if not node_uri.startswith('http'):
+            raise ValueError('%s uri is not supported. Must start by http' % node_uri)
+
+        self.node_uri = node_uri
+        self.max_in_flight_requests = max_in_flight_requests
+        self.max_batch_requests = max_batch_requests
+        self.request_timeout = request_timeout
+        self.slow_request_timeout = slow_request_timeout
+        self._request_ids = itertools.count(1)
+        # Both are bound to the event loop, so they are created when first used
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight_requests)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight_requests)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _do_request(self, rpc_request, timeout: Optional[int]=None):
+        """
+        :param rpc_request: JSON-RPC request or list of JSON-RPC requests
+        :raises Web3ConnectionException: if node cannot be reached or doesn't answer with a 2xx status
+        :return: decoded JSON-RPC response
+        """
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.post(self.node_uri, json=rpc_request,
+                                        timeout=timeout or self.request_timeout) as response:
+                    if not 200 <= response.status < 300:
+                        raise Web3ConnectionException('Node %s answered with HTTP %d' % (self.node_uri,
+                                                                                        response.status))
+                    return json_codec.loads(await response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise Web3ConnectionException('Web3 provider is not connected') from e
+
+    async def _call(self, method: str, params: List[any], timeout: Optional[int]=None):
+        rpc_response = await self._do_request(self._build_request(method, params), timeout=timeout)
+        if 'error' in rpc_response:
+            raise ValueError(rpc_response['error'])
+        return rpc_response['result']
+
+    async def _batch_call(self, rpc_requests: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        Sends batches of `max_batch_requests` concurrently
+        :raises Web3ConnectionException: if node doesn't answer every request
+        :return: list of JSON-RPC responses, sorted like `rpc_requests`
+        """
+        batches = [rpc_requests[i:i + self.max_batch_requests]
+                   for i in range(0, len(rpc_requests), self.max_batch_requests)]
+        rpc_responses = await asyncio.gather(*[self._do_request(batch) for batch in batches])
+        responses_by_id = {}
+        for rpc_response in rpc_responses:
+            if isinstance(rpc_response, dict):
+                raise ValueError(rpc_response.get('error'))
+            responses_by_id.update((response.get('id'), response) for response in rpc_response)
+        missing_ids = [rpc_request['id'] for rpc_request in rpc_requests if rpc_request['id'] not in responses_by_id]
+        if missing_ids:
+            raise Web3ConnectionException('Node did not answer requests with ids %s' % missing_ids)
+        return [responses_by_id[rpc_request['id']] for rpc_request in rpc_requests]
+
+    def _build_request(self, method: str, params: List[any]) -> Dict[str, any]:
+        return {"jsonrpc": "2.0",
+                "method": method,
+                "params": params,
+                "id": next(self._request_ids)}
+
+    @staticmethod
+    def _format_block(block: Dict[str, any]) -> Dict[str, any]:
+        block['number'] = int(block['number'], 16)
+        block['timestamp'] = int(block['timestamp'], 16)
+        return block
+
+    @staticmethod
+    def _format_log(log: Dict[str, any]) -> Dict[str, any]:
+        for field in ('blockNumber', 'logIndex', 'transactionIndex'):
+            if isinstance(log.get(field), str):
+                log[field] = int(log[field], 16)
+        log['address'] = to_checksum_address(log['address'])
+        return log
+
+    async def get_current_block_number(self) -> int:
+        """
+        :raises Web3ConnectionException
+        :return: <int>
+        """
+        return int(await self._call('eth_blockNumber', []), 16)
+
+    async def get_block(self, block_number: int, full_transactions=False):
+        """
+        :raises Web3ConnectionException
+        :raises UnknownBlock
+        """
+        block = await self._call('eth_getBlockByNumber', ['0x{:x}'.format(block_number), full_transactions])
+        if not block:
+            raise UnknownBlock
+        return self._format_block(block)
+
+    async def get_blocks(self, block_identifiers, full_transactions=False) -> Dict[int, Dict[str, any]]:
+        """
+        :raises Web3ConnectionException
+        :raises UnknownBlock
+        :return: a dictionary, the key is the block number and value is the block
+        """
+        rpc_requests = [self._build_request('eth_getBlockByNumber', ['0x{:x}'.format(block_number),
+                                                                     full_transactions])
+                        for block_number in block_identifiers]
+        blocks = {}
+        for rpc_response in await self._batch_call(rpc_requests):
+            block = rpc_response.get('result')
+            if not block:
+                raise UnknownBlock
+            block = self._format_block(block)
+            blocks[block['number']] = block
+        return blocks
+
+    async def get_transaction_receipt(self, transaction_hash: str):
+        """
+        :raises Web3ConnectionException
+        :raises UnknownTransaction
+        """
+        receipt = await self._call('eth_getTransactionReceipt', [transaction_hash])
+        if not receipt:
+            # Might be because a reorg
+            raise UnknownTransaction
+        return receipt
+
+    async def get_transaction_receipts(self, tx_hashes) -> Dict[str, Dict[str, any]]:
+        """
+        :raises Web3ConnectionException
+        :raises UnknownTransaction
+        :return: a dictionary, the key is the transaction hash and value is the receipt
+        """
+        rpc_requests = [self._build_request('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes]
+        tx_with_receipt = {}
+        for rpc_response in await self._batch_call(rpc_requests):
+            receipt = rpc_response.get('result')
+            if not receipt:
+                raise UnknownTransaction
+            tx_with_receipt[receipt['transactionHash']] = receipt
+        return tx_with_receipt
+
+    async def get_logs_for_block(self, block) -> List[Dict[str, any]]:
+        """
+        Extract raw logs from ethereum block
+        :param block: block to get logs from
+        :return: list of log dictionaries
+        """
+        return (await self.get_logs_for_blocks([block]))[block['number']]
+
+    async def get_logs_for_blocks(self, blocks) -> Dict[int, List[Dict[str, any]]]:
+        """
+        Recover logs for every block, receipts of every block are retrieved concurrently
+        :param blocks: blocks to get logs from
+        :return: a dictionary, the key is the block number and value is list of logs
+        """
+        blocks = list(blocks)
+        tx_with_receipt = await self.get_transaction_receipts([tx for block in blocks
+                                                               for tx in block['transactions']])
+        block_number_with_logs = {}
+        for block in blocks:
+            logs = block_number_with_logs[block['number']] = []
+            for tx in block['transactions']:
+                logs.extend(self._format_log(log) for log in tx_with_receipt[tx].get('logs', []))
+        return block_number_with_logs
+
+    async def get_logs_using_filter(self, logs_filter: Dict[str, any]) -> List[Dict[str, any]]:
+        logs_filter = dict(logs_filter)
+        for field in ('fromBlock', 'toBlock'):
+            if isinstance(logs_filter.get(field), int):
+                logs_filter[field] = '0x{:x}'.format(logs_filter[field])
+        logs = await self._call('eth_getLogs', [logs_filter], timeout=self.slow_request_timeout)
+        return [self._format_log(log) for log in logs]
+
+    async def get_logs_for_block_range(self, from_block: int, to_block: int, addresses: Optional[List[str]]=None,
+                                       topics: Optional[List[str]]=None,
+                                       max_addresses_per_filter: int=1000) -> Dict[int, List[Dict[str, any]]]:
+        """
+        Same as `Web3Service.get_logs_for_block_range`, filters for every chunk of addresses are sent concurrently
+        :return: a dictionary, the key is the block number and value is list of logs
+        """
+        block_number_with_logs = {block_number: [] for block_number in range(from_block, to_block + 1)}
+        logs_filter = {'fromBlock': from_block,
+                       'toBlock': to_block}
+        if topics is not None:
+            logs_filter['topics'] = [sorted(topics)]
+
+        if (addresses is not None and not addresses) or (topics is not None and not topics):
+            # An empty filter would match every log
+            logs = []
+        elif addresses is None:
+            logs = await self.get_logs_using_filter(logs_filter)
+        else:
+            addresses = sorted(addresses)
+            logs_chunks = await asyncio.gather(*[
+                self.get_logs_using_filter(dict(logs_filter, address=addresses[i:i + max_addresses_per_filter]))
+                for i in range(0, len(addresses), max_addresses_per_filter)
+            ])
+            logs = sorted((log for logs_chunk in logs_chunks for log in logs_chunk),
+                          key=lambda log: (log['blockNumber'], log['logIndex']))
+
+        for log in logs:
+            block_number_with_logs.setdefault(log['blockNumber'], []).append(log)
+        return block_number_with_logs
+
+    async def get_logs_for_address_using_filter(self, from_block: int, to_block: int,
+                                                address: str) -> List[Dict[str, any]]:
+        """
+        Recover logs using filter for address
+        """
+        return await self.get_logs_using_filter({'fromBlock': from_block,
+                                                 'toBlock': to_block,
+                                                 'address': address})
+
+    async def get_logs_for_event_using_filter(self, from_block: int, to_block: int,
+                                              event_hash: str) -> List[Dict[str, any]]:
+        """
+        Recover logs using filter for event
+        """
+        return await self.get_logs_using_filter({'fromBlock': from_block,
+                                                 'toBlock': to_block,
+                                                 'topics': [event_hash]})
@@ -0,0 +1,93 @@
+import logging
+import math
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBatchSize:
+    """
+    Number of requests to send in the same JSON-RPC batch, adapted to the node. Size grows while throughput
+    (requests answered per second) improves, goes back to the best known size when it gets worse, and is
+    quickly shrunk when the node rejects a batch for being too big or the response is too big.
+    Rejected sizes are not tried again until `recovery_batches` batches succeed.
+    Batches can be sent concurrently, so results of batches sent before the size changed never grow the size
+    """
+
+    def __init__(self, initial_size: int, min_size: int=1, max_size: Optional[int]=None,
+                 growth_factor: float=1.5, shrink_factor: float=0.5, min_improvement: float=1.05,
+                 max_response_size: Optional[int]=None, recovery_batches: int=50):
+        """
+        :param initial_size: Size for the first batches
+        :param min_size: Batch size will never be smaller
+        :param max_size: Batch size will never be bigger. By default 8 times `initial_size`
+        :param growth_factor: Size is multiplied by this factor while throughput improves
+        :param shrink_factor: Size is multiplied by this factor when a batch is rejected
+        :param min_improvement: Throughput must be multiplied by this factor to consider it an improvement
+        :param max_response_size: Size in bytes. Batch size is shrunk if a response is bigger
+        :param recovery_batches: Successful batches needed to try again a size that was rejected
+        """
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size or initial_size * 8)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.growth_factor = growth_factor
+        self.shrink_factor = shrink_factor
+        self.min_improvement = min_improvement
+        self.max_response_size = max_response_size
+        self.recovery_batches = recovery_batches
+        self.best_size = self.size
+        self.best_throughput = 0.
+        self.ceiling = self.max_size
+        self.successful_batches = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, batch_length: int, elapsed: float, response_size: int=0) -> int:
+        """
+        Updates batch size using the stats of a batch answered by the node
+        :param batch_length: Number of requests sent in the batch
+        :param elapsed: Seconds until the whole response was received
+        :param response_size: Size of the response in bytes
+        :return: new batch size
+        """
+        with self._lock:
+            self.successful_batches += 1
+            if self.successful_batches >= self.recovery_batches:
+                self.ceiling = self.max_size
+                self.successful_batches = 0
+
+            if self.max_response_size and response_size > self.max_response_size:
+                logger.info('Batch of %d requests returned %d bytes, shrinking batch size', batch_length,
+                            response_size)
+                self._shrink(batch_length)
+            elif batch_length == self.size:
+                # Smaller batches (last chunk of the requests) are not representative, and batches of a
+                # different size were sent concurrently before the size changed
+                throughput = batch_length / max(elapsed, 1e-6)
+                if throughput >= self.best_throughput * self.min_improvement:
+                    self.best_throughput = throughput
+                    self.best_size = self.size
+                    self.size = min(math.ceil(self.size * self.growth_factor), self.ceiling)
+                else:
+                    # Forget old best slowly, so bigger sizes are probed again if node conditions change
+                    self.best_throughput *= 0.9
+                    self.size = self.best_size
+            return self.size
+
+    def record_failure(self, batch_length: Optional[int]=None) -> int:
+        """
+        Shrinks batch size after a rejected batch
+        :param batch_length: Number of requests sent in the rejected batch. Current size if not provided
+        :return: new batch size
+        """
+        with self._lock:
+            self._shrink(batch_length or self.size)
+            return self.size
+
+    def _shrink(self, batch_length: int):
+        self.ceiling = max(self.min_size, min(self.ceiling, batch_length - 1))
+        # A batch sent before the size was shrunk by a concurrent failure must not make the size bigger
+        self.size = max(self.min_size, min(int(batch_length * self.shrink_factor), self.ceiling, self.size))
+        self.best_size = min(self.best_size, self.size)
+        self.best_throughput = 0.
+        self.successful_batches = 0
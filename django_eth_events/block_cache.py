@@ -0,0 +1,151 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_hash(block_hash) -> str:
+    """
+    :param block_hash: hex string or bytes (web3 returns `HexBytes`)
+    :return: lowercase hex string without 0x
+    """
+    block_hash = block_hash.hex() if isinstance(block_hash, bytes) else block_hash
+    block_hash = block_hash.lower()
+    return block_hash[2:] if block_hash.startswith('0x') else block_hash
+
+
+class BlockCache:
+    """
+    LRU cache for block headers (blocks without full transactions), keyed by number and by hash. Only blocks
+    inside the finality depth (from the highest block stored) are kept, as they are the ones requested again
+    (reorg checks, prefetching and event receivers).
+    Cache is reorg aware: storing a block with a different hash than the cached one, or not linked to its cached
+    parent, removes the cached blocks of the old chain. Blocks above the current block number of the node are
+    also removed (see `update_head`)
+    """
+
+    def __init__(self, max_size: int=1000, finality_depth: int=100,
+                 formatter: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]=None):
+        """
+        :param max_size: Max number of blocks stored. 0 disables the cache
+        :param finality_depth: Blocks older than this depth (from the highest block stored) are evicted
+        :param formatter: Blocks are stored formatted with it, so every cached block has the same format
+        no matter how it was retrieved
+        """
+        self.max_size = max_size
+        self.finality_depth = finality_depth
+        self.formatter = formatter
+        self.head_block_number = None
+        self.hits = 0
+        self.misses = 0
+        self._blocks_by_number: OrderedDict = OrderedDict()
+        self._block_numbers_by_hash: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._blocks_by_number)
+
+    def get(self, block_number: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            block = self._blocks_by_number.get(block_number)
+            if block is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._blocks_by_number.move_to_end(block_number)
+            return block
+
+    def get_by_hash(self, block_hash) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            block_number = self._block_numbers_by_hash.get(normalize_hash(block_hash))
+        if block_number is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self.get(block_number)
+
+    def is_cached(self, block: Dict[str, Any]) -> bool:
+        """
+        :return: True if this same block is still stored (it was not removed because of a reorg)
+        """
+        with self._lock:
+            return self._blocks_by_number.get(block.get('number')) is block
+
+    def put(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stores a block header. Blocks of a different chain are removed. Blocks without number or hash are ignored
+        :return: block formatted with `formatter`, also if it was not stored
+        """
+        if self.formatter is not None:
+            block = self.formatter(block)
+        if not self.max_size or block.get('number') is None or not block.get('hash'):
+            return block
+
+        block_number = block['number']
+        block_hash = normalize_hash(block['hash'])
+        with self._lock:
+            if self.head_block_number is not None and block_number < self.head_block_number - self.finality_depth:
+                return block
+
+            cached_block = self._blocks_by_number.get(block_number)
+            if cached_block is not None and normalize_hash(cached_block['hash']) != block_hash:
+                logger.info('Block %d hash changed, might be a reorg. Removing cached blocks', block_number)
+                self._invalidate(block_number)
+
+            parent_block = self._blocks_by_number.get(block_number - 1)
+            if parent_block is not None and block.get('parentHash') and \
+                    normalize_hash(parent_block['hash']) != normalize_hash(block['parentHash']):
+                logger.info('Block %d is not linked to cached block %d, might be a reorg. Removing cached blocks',
+                            block_number, block_number - 1)
+                self._invalidate(block_number - self.finality_depth)
+
+            self._blocks_by_number[block_number] = block
+            self._blocks_by_number.move_to_end(block_number)
+            self._block_numbers_by_hash[block_hash] = block_number
+
+            if self.head_block_number is None or block_number > self.head_block_number:
+                self.head_block_number = block_number
+                for old_block_number in [cached_block_number for cached_block_number in self._blocks_by_number
+                                         if cached_block_number < block_number - self.finality_depth]:
+                    self._remove(old_block_number)
+
+            while len(self._blocks_by_number) > self.max_size:
+                self._remove(next(iter(self._blocks_by_number)))
+        return block
+
+    def update_head(self, block_number: int):
+        """
+        Blocks above the current block number of the node are from other chain (node was resynced or reorged to a
+        shorter chain), so they are removed
+        :param block_number: current block number of the node
+        """
+        with self._lock:
+            if self.head_block_number is not None and self.head_block_number > block_number:
+                logger.info('Node block number %d is lower than cached block %d. Removing cached blocks',
+                            block_number, self.head_block_number)
+                self._invalidate(block_number + 1)
+
+    def invalidate(self, from_block_number: int=0):
+        """
+        Removes every block with number equal or greater than `from_block_number`, for example when
+        a rollback happens
+        """
+        with self._lock:
+            self._invalidate(from_block_number)
+
+    def clear(self):
+        self.invalidate()
+
+    def _invalidate(self, from_block_number: int):
+        for block_number in [block_number for block_number in self._blocks_by_number
+                             if block_number >= from_block_number]:
+            self._remove(block_number)
+        self.head_block_number = max(self._blocks_by_number) if self._blocks_by_number else None
+
+    def _remove(self, block_number: int):
+        block = self._blocks_by_number.pop(block_number)
+        block_hash = normalize_hash(block['hash'])
+        if self._block_numbers_by_hash.get(block_hash) == block_number:
+            del self._block_numbers_by_hash[block_hash]
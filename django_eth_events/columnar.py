@@ -0,0 +1,116 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# `uint`/`int` are aliases of `uint256`/`int256`
+INTEGER_TYPE_PATTERN = re.compile(r'(u?)int(\d*)')
+
+
+def get_column_dtype(param_type: str, indexed: bool) -> Optional[str]:
+    """
+    :param param_type: abi type of the param
+    :param indexed: True if param is indexed (its value is the topic, only decoded for addresses)
+    :return: NumPy dtype for a column of decoded values of `param_type`, `None` if values must be stored as objects
+    (numbers bigger than 64 bits, bytes, arrays and dynamic types)
+    """
+    if param_type == 'address':
+        # Decoded addresses are hex without 0x
+        return 'U40'
+    elif indexed:
+        return None
+    elif param_type == 'bool':
+        return '?'
+    match = INTEGER_TYPE_PATTERN.fullmatch(param_type)
+    if match and int(match.group(2) or 256) <= 64:
+        return 'u8' if match.group(1) else 'i8'
+    return None
+
+
+def build_column(values: List[Any], dtype: Optional[str]) -> Sequence[Any]:
+    """
+    :return: NumPy array for `values` (object array if `dtype` is `None`), same list if NumPy is not installed
+    """
+    if numpy is None:
+        return values
+    if dtype is not None:
+        return numpy.array(values, dtype=dtype)
+    # Assigned one by one, so lists (decoded arrays) are not converted to a second dimension
+    column = numpy.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+class DecodedColumns:
+    """
+    Decoded logs of the same event stored by columns, instead of one dictionary for every log. If NumPy is
+    installed columns are arrays: numbers up to 64 bits, booleans and addresses use native dtypes and the rest
+    of types use object arrays. If not, columns are lists.
+    Decoded events, like `Decoder.decode_log` returns them, are built on demand
+    """
+
+    def __init__(self, name: str, param_names: List[str], param_dtypes: List[Optional[str]],
+                 values: List[List[Any]], addresses: List[str], transaction_hashes: List[str]):
+        """
+        :param name: Name of the event
+        :param param_names: Name of every param
+        :param param_dtypes: NumPy dtype for every param, see `get_column_dtype`
+        :param values: Decoded values of every param, one list for every param
+        :param addresses: Decoded address of every log
+        :param transaction_hashes: Decoded transaction hash of every log
+        """
+        self.name = name
+        self.param_names = param_names
+        self.columns = [build_column(param_values, dtype) for param_values, dtype in zip(values, param_dtypes)]
+        self.addresses = build_column(addresses, str)
+        self.transaction_hashes = build_column(transaction_hashes, str)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __getitem__(self, param_name: str) -> Sequence[Any]:
+        """
+        :return: column of the first param named `param_name`
+        """
+        try:
+            return self.columns[self.param_names.index(param_name)]
+        except ValueError:
+            raise KeyError(param_name)
+
+    @staticmethod
+    def _to_list(column: Sequence[Any]) -> List[Any]:
+        # NumPy values are converted to python types
+        return column.tolist() if numpy is not None else column
+
+    def get_event(self, i: int) -> Dict[str, Any]:
+        """
+        :return: decoded event of the log in position `i`
+        """
+        return {
+            'params': [{'name': name, 'value': self._to_list(column[i:i + 1])[0]}
+                       for name, column in zip(self.param_names, self.columns)],
+            'name': self.name,
+            'address': self._to_list(self.addresses[i:i + 1])[0],
+            'transaction_hash': self._to_list(self.transaction_hashes[i:i + 1])[0],
+        }
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        :return: decoded events, one dictionary for every log
+        """
+        columns = [self._to_list(column) for column in self.columns]
+        return [
+            {
+                'params': [{'name': name, 'value': value} for name, value in zip(self.param_names, values)],
+                'name': self.name,
+                'address': address,
+                'transaction_hash': transaction_hash,
+            }
+            for address, transaction_hash, *values in zip(self._to_list(self.addresses),
+                                                          self._to_list(self.transaction_hashes),
+                                                          *columns)
+        ]
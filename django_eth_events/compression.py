@@ -0,0 +1,97 @@
+import gzip
+import logging
+import threading
+import zlib
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+# Responses of the node are decompressed by `requests`
+ACCEPT_ENCODING = 'gzip, deflate'
+# Status codes of nodes (or proxies in front of them) not supporting compressed requests
+COMPRESSION_REJECTED_STATUS_CODES = (400, 415)
+# JSON-RPC parse error, returned by nodes not decompressing the request before parsing it
+PARSE_ERROR_CODE = -32700
+
+
+def compress(data: bytes, encoding: str, level: int=1) -> bytes:
+    """
+    :param encoding: `gzip` or `deflate` (zlib format, as used by HTTP)
+    :param level: Compression level, hex JSON compresses well even with the fastest level
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    elif encoding == 'deflate':
+        return zlib.compress(data, level)
+    raise ValueError('%s encoding is not supported. Must be one of %s' % (encoding, SUPPORTED_ENCODINGS))
+
+
+def is_compression_rejected(status_code: int, content: bytes) -> bool:
+    """
+    :return: True if response to a compressed request shows the node could not read it
+    """
+    if status_code in COMPRESSION_REJECTED_STATUS_CODES:
+        return True
+    # Batch responses are lists, only a single error object can be a rejection
+    return content.lstrip()[:1] == b'{' and str(PARSE_ERROR_CODE).encode() in content
+
+
+class RequestCompression:
+    """
+    Compresses request bodies sent to the node. Most nodes answer compressed responses, but only some of them
+    (or the proxies in front of them) accept compressed requests, so using `auto` requests are compressed
+    until the node rejects one, and then they are sent uncompressed
+    """
+
+    def __init__(self, encoding: Optional[str]='auto', min_size: int=1024, level: int=1):
+        """
+        :param encoding: `auto` (gzip, disabled if node doesn't support it), `gzip` or `deflate` (always, for
+        proxies known to support it) or `None` to never compress requests
+        :param min_size: Smaller requests are not compressed, as it's not worth it
+        :param level: Compression level
+        """
+        if encoding is not None and encoding != 'auto' and encoding not in SUPPORTED_ENCODINGS:
+            raise ValueError('%s encoding is not supported. Must be one of %s' % (encoding, SUPPORTED_ENCODINGS))
+        self.negotiate = encoding == 'auto'
+        self.encoding = 'gzip' if self.negotiate else encoding
+        self.min_size = min_size
+        self.level = level
+        self.bytes = 0
+        self.compressed_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.encoding is not None
+
+    def encode(self, data: bytes) -> Tuple[bytes, Dict[str, str]]:
+        """
+        :param data: JSON-RPC request body
+        :return: Tuple (body to send, http headers)
+        """
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': ACCEPT_ENCODING}
+        encoding = self.encoding
+        if encoding and len(data) >= self.min_size:
+            body = compress(data, encoding, level=self.level)
+            headers['Content-Encoding'] = encoding
+        else:
+            body = data
+        with self._lock:
+            self.bytes += len(data)
+            self.compressed_bytes += len(body)
+        return body, headers
+
+    def rejected(self) -> bool:
+        """
+        Node could not read a compressed request. If compression is negotiated, it's disabled
+        :return: True if request must be sent again uncompressed
+        """
+        if not self.negotiate:
+            return False
+        with self._lock:
+            if self.encoding:
+                logger.warning('Node does not support %s compressed requests, sending them uncompressed',
+                               self.encoding)
+                self.encoding = None
+        return True
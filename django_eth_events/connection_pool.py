@@ -0,0 +1,76 @@
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+from .json_codec import json_codec
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP connection pool shared by every http client of a `Web3Service`. Pool must be big enough
+    for every thread requesting the node at the same time, if not connections are discarded when they are
+    returned to the pool and new connections (TCP + TLS handshake) are needed
+    """
+
+    def __init__(self, pool_size: int=10, max_hosts: int=10):
+        """
+        :param pool_size: Max connections kept alive for every host, should be at least `ETHEREUM_MAX_WORKERS`
+        :param max_hosts: Max number of hosts (nodes) with connections kept alive
+        """
+        self.pool_size = pool_size
+        self.adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        :return: Dictionary with number of `connections` opened, number of `requests` sent and number of requests
+        that reused an already opened connection (`reused_connections`)
+        """
+        pools = self.adapter.poolmanager.pools
+        connections = requests_sent = 0
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        return {
+            'pool_size': self.pool_size,
+            'connections': connections,
+            'requests': requests_sent,
+            'reused_connections': requests_sent - connections,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider using the session of a `ConnectionPool` instead of the web3 global sessions
+    """
+
+    def __init__(self, endpoint_uri=None, request_kwargs=None, session: Optional[requests.Session]=None):
+        super().__init__(endpoint_uri=endpoint_uri, request_kwargs=request_kwargs)
+        self.session = session or requests.Session()
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s", self.endpoint_uri, method)
+        request_kwargs = dict(self.get_request_kwargs())
+        request_kwargs.setdefault('timeout', 10)
+        response = self.session.post(self.endpoint_uri, data=self.encode_rpc_request(method, params),
+                                     **request_kwargs)
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+    def encode_rpc_request(self, method, params):
+        return json_codec.dumps_bytes({'jsonrpc': '2.0',
+                                       'method': method,
+                                       'params': params or [],
+                                       'id': next(self.request_counter)})
+
+    def decode_rpc_response(self, response):
+        return json_codec.loads(response)
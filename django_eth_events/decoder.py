@@ -1,16 +1,214 @@
 import binascii
+from collections.abc import Mapping
 from logging import getLogger
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from eth_abi import decode_abi
+from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+from eth_abi.registry import registry
 from ethereum.utils import sha3
 from hexbytes import HexBytes
 
+from .columnar import DecodedColumns, get_column_dtype
 from .singleton import Singleton
+from .static_codecs import get_static_data_decoder
 from .utils import normalize_address_without_0x, remove_0x_head
 
 logger = getLogger(__name__)
 
 
+class DecodePlan:
+    """
+    Steps to decode the logs of an event, compiled once when the abi is added: decoder for the not indexed params
+    (the same `decode_abi` would build for every log) and, for every param, where its value is (topic or `data`
+    position) and how it's normalized. Decoding a log only runs the plan
+    """
+
+    def __init__(self, event: Dict[str, Any]):
+        """
+        :param event: Event item of an abi
+        """
+        self.name = event['name']
+        self.param_names = [param['name'] for param in event['inputs']]
+        self.data_types = [param['type'] for param in event['inputs'] if not param['indexed']]
+        self.data_decoder = TupleDecoder(decoders=[registry.get_decoder(data_type) for data_type in self.data_types])
+        # Tuples of (name, indexed, position in topics or decoded data, post processor or `None`)
+        self.params: List[Tuple[str, bool, int, Optional[Callable[[Any], Any]]]] = []
+        data_i = 0
+        topics_i = 1
+        for param in event['inputs']:
+            if param['indexed']:
+                self.params.append((param['name'], True, topics_i, self.get_post_processor(param['type'])))
+                topics_i += 1
+            else:
+                self.params.append((param['name'], False, data_i, self.get_post_processor(param['type'])))
+                data_i += 1
+        self.column_dtypes = [get_column_dtype(param['type'], param['indexed']) for param in event['inputs']]
+        # If every not indexed param is a common static type, data is decoded slicing it by words. Values are
+        # already normalized, so only indexed params need post processing
+        self.static_data_decoder = get_static_data_decoder(self.data_types)
+        self.static_params = [(name, indexed, position, post_processor if indexed else None)
+                              for name, indexed, position, post_processor in self.params]
+
+    @staticmethod
+    def get_post_processor(param_type: str) -> Optional[Callable[[Any], Any]]:
+        """
+        :return: function normalizing the decoded value of a param of `param_type`, `None` if it's not needed
+        """
+        if '[]' in param_type:
+            if 'address' in param_type:
+                return lambda addresses: [Decoder.decode_address(address) for address in addresses]
+            return list
+        elif 'address' == param_type:
+            return Decoder.decode_address
+        return None
+
+    def decode_data(self, data) -> Tuple[Any, ...]:
+        """
+        :param data: `data` of the log, hex str or bytes
+        :return: decoded values of the not indexed params
+        """
+        # Decoder expects data in bytes format instead of str starting by 0x
+        return self.data_decoder(ContextFramesBytesIO(HexBytes(data)))
+
+    def decode_data_values(self, data) -> Tuple[Tuple[Any, ...], List[Tuple[str, bool, int, Any]]]:
+        """
+        :param data: `data` of the log, hex str or bytes
+        :return: Tuple (decoded values of the not indexed params, `params` with the post processors to apply
+        to those values)
+        """
+        decoded_data = self.static_data_decoder(data) if self.static_data_decoder is not None else None
+        if decoded_data is None:
+            return self.decode_data(data), self.params
+        return decoded_data, self.static_params
+
+    def decode_values(self, log: Dict[str, Any]) -> List[Any]:
+        """
+        :return: list of decoded values of the params
+        """
+        topics = log['topics']
+        decoded_data, params = self.decode_data_values(log['data'])
+        values = []
+        for _, indexed, position, post_processor in params:
+            value = topics[position] if indexed else decoded_data[position]
+            if post_processor is not None:
+                value = post_processor(value)
+            values.append(value)
+        return values
+
+    def decode_params(self, log: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        :return: list of decoded params, dictionaries with `name` and `value`
+        """
+        return [{'name': name, 'value': value} for name, value in zip(self.param_names, self.decode_values(log))]
+
+
+class LazyDecodedParam(Mapping):
+    """
+    Param of a `LazyDecodedEvent`, like `{'name': name, 'value': value}`. Value is decoded when it's read
+    """
+    __slots__ = ('event', 'i')
+    KEYS = ('name', 'value')
+
+    def __init__(self, event: 'LazyDecodedEvent', i: int):
+        self.event = event
+        self.i = i
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'name':
+            return self.event.decode_plan.param_names[self.i]
+        elif key == 'value':
+            return self.event.get_value(self.i)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class LazyDecodedEvent(Mapping):
+    """
+    Decoded event that behaves like the (read only) dictionary returned by `Decoder.decode_log`, but params,
+    address and transaction hash are only decoded the first time they are read, and then cached. Errors decoding
+    them are raised when they are read. `to_dict` returns the decoded dictionary (to serialize it, for example)
+    """
+    KEYS = ('params', 'name', 'address', 'transaction_hash')
+
+    def __init__(self, decode_plan: DecodePlan, log: Dict[str, Any]):
+        self.decode_plan = decode_plan
+        self.log = log
+        self._values: Dict[int, Any] = {}
+        self._params: Optional[List[LazyDecodedParam]] = None
+        # Decoded `data` and params with the post processors for it
+        self._decoded_data = None
+        self._data_params = None
+        self._address = None
+        self._transaction_hash = None
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'name':
+            return self.decode_plan.name
+        elif key == 'params':
+            if self._params is None:
+                self._params = [LazyDecodedParam(self, i) for i in range(len(self.decode_plan.params))]
+            return self._params
+        elif key == 'address':
+            if self._address is None:
+                self._address = Decoder.decode_address(self.log['address'])
+            return self._address
+        elif key == 'transaction_hash':
+            if self._transaction_hash is None:
+                self._transaction_hash = Decoder.decode_transaction(self.log['transactionHash'])
+            return self._transaction_hash
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def get_value(self, i: int) -> Any:
+        """
+        :return: decoded value of the param in position `i`
+        """
+        try:
+            return self._values[i]
+        except KeyError:
+            pass
+
+        _, indexed, position, post_processor = self.decode_plan.params[i]
+        if indexed:
+            value = self.log['topics'][position]
+        else:
+            if self._decoded_data is None:
+                self._decoded_data, self._data_params = self.decode_plan.decode_data_values(self.log['data'])
+            value = self._decoded_data[position]
+            post_processor = self._data_params[i][3]
+        if post_processor is not None:
+            value = post_processor(value)
+        self._values[i] = value
+        return value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: decoded event, as `Decoder.decode_log` returns it
+        """
+        return {
+            'params': [{'name': param['name'], 'value': param['value']} for param in self['params']],
+            'name': self['name'],
+            'address': self['address'],
+            'transaction_hash': self['transaction_hash'],
+        }
+
+
 class Decoder(Singleton):
     """
     This module allows to decode ethereum logs (hexadecimal) into readable dictionaries, by using
@@ -21,11 +219,14 @@ class Decoder(Singleton):
         self.methods = {}
         self.added_abis = {}
         self.events = set()
+        # Method id -> DecodePlan, only for events
+        self.decode_plans = {}
 
     def reset(self):
         self.methods.clear()
         self.added_abis.clear()
         self.events.clear()
+        self.decode_plans.clear()
 
     @staticmethod
     def get_method_id(item):
@@ -54,9 +255,16 @@ class Decoder(Singleton):
                 if item.get('name'):
                     method_id = self.get_method_id(item)
                     self.methods[method_id] = item
+                    self.decode_plans.pop(method_id, None)
                     added += 1
                 if item.get('type') == 'event':
                     self.events.add(HexBytes(method_id).hex())
+                    if item.get('name'):
+                        try:
+                            self.decode_plans[method_id] = DecodePlan(item)
+                        except Exception:
+                            logger.warning('Cannot decode logs of event %s, abi is not valid', item['name'],
+                                           exc_info=True)
             self.added_abis[abi_sha3] = None
         return added
 
@@ -72,59 +280,30 @@ class Decoder(Singleton):
                 method_id = self.get_method_id(item)
                 if self.methods.get(method_id):
                     del self.methods[method_id]
+                self.decode_plans.pop(method_id, None)
 
-    def decode_log(self, log):
+    def decode_log(self, log, lazy: bool=False):
         """
         Decodes an ethereum log and returns the recovered parameters along with the method from the abi that was used
         in decoding. Raises a LookupError if the log's topic is unknown,
         :param log: ethereum log
+        :param lazy: if True, a `LazyDecodedEvent` is returned, decoding params only when they are read
         :return: dictionary of decoded parameters, decoding method reference
         """
         method_id = remove_0x_head(log['topics'][0])
 
-        if method_id not in self.methods:
+        decode_plan = self.decode_plans.get(method_id)
+        if decode_plan is None:
             raise LookupError("Unknown log topic.")
 
-        # method item has the event name, inputs and types
-        method = self.methods[method_id]
-        decoded_params = []
-        data_i = 0
-        topics_i = 1
-        data_types = []
-
-        # get param types from properties not indexed
-        for param in method['inputs']:
-            if not param['indexed']:
-                data_types.append(param['type'])
-
-        # decode_abi expect data in bytes format instead of str starting by 0x
-        log_data_bytes = HexBytes(log['data'])
-        decoded_data = decode_abi(data_types, log_data_bytes)
-
-        for param in method['inputs']:
-            decoded_p = {
-                'name': param['name']
-            }
-            if param['indexed']:
-                decoded_p['value'] = log['topics'][topics_i]
-                topics_i += 1
-            else:
-                decoded_p['value'] = decoded_data[data_i]
-                data_i += 1
-
-            if '[]' in param['type']:
-                if 'address' in param['type']:
-                    decoded_p['value'] = [self.decode_address(address) for address in decoded_p['value']]
-                else:
-                    decoded_p['value'] = list(decoded_p['value'])
-            elif 'address' == param['type']:
-                decoded_p['value'] = self.decode_address(decoded_p['value'])
+        if lazy:
+            return LazyDecodedEvent(decode_plan, log)
 
-            decoded_params.append(decoded_p)
+        decoded_params = decode_plan.decode_params(log)
 
         decoded_event = {
             'params': decoded_params,
-            'name': method['name'],
+            'name': decode_plan.name,
             'address': self.decode_address(log['address']),
             'transaction_hash': self.decode_transaction(log['transactionHash'])
         }
@@ -162,17 +341,50 @@ class Decoder(Singleton):
 
         return tx_hash
 
-    def decode_logs(self, logs):
+    def decode_logs_columns(self, logs) -> DecodedColumns:
+        """
+        Decodes logs of the same event together, storing the decoded params by columns instead of one dictionary
+        for every log (NumPy arrays if it's installed). Decoded events can be built from the columns on demand
+        :param logs: ethereum logs with the same topic
+        :raises LookupError: if topic is unknown
+        :raises ValueError: if there are no logs or they have different topics
+        :return: DecodedColumns
+        """
+        logs = list(logs)
+        if not logs:
+            raise ValueError('No logs to decode')
+
+        method_id = remove_0x_head(logs[0]['topics'][0])
+        decode_plan = self.decode_plans.get(method_id)
+        if decode_plan is None:
+            raise LookupError("Unknown log topic.")
+
+        values = [[] for _ in decode_plan.params]
+        addresses = []
+        transaction_hashes = []
+        for log in logs:
+            if remove_0x_head(log['topics'][0]) != method_id:
+                raise ValueError('Every log must have the same topic')
+            for column, value in zip(values, decode_plan.decode_values(log)):
+                column.append(value)
+            addresses.append(self.decode_address(log['address']))
+            transaction_hashes.append(self.decode_transaction(log['transactionHash']))
+
+        return DecodedColumns(decode_plan.name, decode_plan.param_names, decode_plan.column_dtypes, values,
+                              addresses, transaction_hashes)
+
+    def decode_logs(self, logs, lazy: bool=False):
         """
         Processes and array of ethereum logs and returns an array of dictionaries of logs that could be decoded
         from the ABIs loaded. Logs that could not be decoded are omitted from the result.
         :param logs: array of ethereum logs
+        :param lazy: if True, `LazyDecodedEvent` are returned instead of dictionaries
         :return: array of dictionaries
         """
         decoded = []
         for log in logs:
             try:
-                decoded.append(self.decode_log(log))
+                decoded.append(self.decode_log(log, lazy=lazy))
             except LookupError:
                 pass
 
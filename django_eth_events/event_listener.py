@@ -1,18 +1,24 @@
-from json import dumps, loads
-from typing import Set
+import asyncio
+import concurrent.futures
+import itertools
+from typing import Dict, List, Optional, Set
 
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
 from django.utils.module_loading import import_string
 from ethereum.utils import checksum_encode
 
-from .decoder import Decoder
-from .exceptions import InvalidAddressException
+from .async_web3_service import AsyncWeb3Service
+from .decoder import Decoder, LazyDecodedEvent
+from .exceptions import InvalidAddressException, UnknownBlock
+from .json_codec import json_codec
+from .log_router import LogRouter
 from .models import Block, Daemon
+from .rate_limiter import RequestPriority
 from .reorgs import check_reorg
-from .utils import (JsonBytesEncoder, normalize_address_without_0x,
-                    remove_0x_head)
+from .utils import normalize_address_without_0x, remove_0x_head
 from .web3_service import Web3Service, Web3ServiceProvider
 
 logger = get_task_logger(__name__)
@@ -48,6 +54,14 @@ class EventListener:
     max_blocks_to_backup = settings.ETH_BACKUP_BLOCKS
     max_blocks_to_process = settings.ETH_PROCESS_BLOCKS
     blocks_to_process_with_filters = settings.ETH_FILTER_PROCESS_BLOCKS
+    # `auto` uses `range` if node supports `eth_getLogs`, `receipts` otherwise
+    logs_prefetch_strategy = getattr(settings, 'ETH_LOGS_PREFETCH_STRATEGY', 'auto')
+    max_addresses_per_filter = getattr(settings, 'ETH_FILTER_MAX_ADDRESSES', 1000)
+    # Process logs of filters while they are received instead of loading them all in memory
+    stream_filter_logs = getattr(settings, 'ETH_FILTER_STREAM_LOGS', False)
+    max_in_flight_requests = getattr(settings, 'ETHEREUM_MAX_IN_FLIGHT_REQUESTS', 100)
+    # Receivers get `LazyDecodedEvent`, decoding params only when they are read
+    lazy_decoded_events = getattr(settings, 'ETH_LAZY_DECODED_EVENTS', False)
 
     def __init__(self, contract_map=None, provider=None):
         self.web3_service = Web3Service(provider=provider) if provider else Web3ServiceProvider()
@@ -67,9 +81,12 @@ class EventListener:
         for contract in self.contract_map:
             self.decoder.add_abi(contract['EVENT_ABI'])
 
+        # Routes logs to the contracts watching their addresses
+        self.log_router = LogRouter(self.decoder)
+
     @property
     def provider(self):
-        return self.web3_service.main_provider
+        return self.web3_service.provider
 
     @staticmethod
     def import_class_from_string(class_string):
@@ -158,6 +175,147 @@ class EventListener:
         normalized_addresses = {checksum_encode(address) for address in addresses}
         return normalized_addresses
 
+    def get_all_watched_addresses(self) -> Set[str]:
+        """
+        :return: checksumed addresses watched by any of the contracts
+        """
+        addresses = set()
+        for contract in self.contract_map:
+            addresses.update(self.get_watched_contract_addresses(contract))
+        return addresses
+
+    def invalidate_contract_address_cache(self, contract_address_cache: Dict[str, Set[str]]):
+        """
+        Removes from the cache the contracts using an addresses getter, as saved events can add new addresses
+        to them. Contracts with fixed `ADDRESSES` are kept
+        :param contract_address_cache: watched addresses for every contract name
+        """
+        for contract in self.contract_map:
+            if not contract.get('ADDRESSES'):
+                contract_address_cache.pop(contract['NAME'], None)
+
+    def route_logs(self, logs: List[any], contract_address_cache: Dict[str, Set[str]],
+                   routed_logs: Optional[List[List[any]]]=None) -> List[List[any]]:
+        """
+        Routes logs to the contracts watching their addresses, using `contract_address_cache` to get the watched
+        addresses. Only the entries of the router for contracts whose watched addresses changed are updated
+        :param logs: logs of a block
+        :param contract_address_cache: watched addresses for every contract name, missing ones are retrieved
+        :param routed_logs: logs already routed, returned if watched addresses didn't change
+        :return: logs of every contract, in the same order as `contract_map`
+        """
+        for contract in self.contract_map:
+            if contract['NAME'] not in contract_address_cache:
+                contract_address_cache[contract['NAME']] = self.get_watched_contract_addresses(contract)
+        address_sets = [contract_address_cache[contract['NAME']] for contract in self.contract_map]
+        if self.log_router.update(address_sets) or routed_logs is None:
+            routed_logs = self.log_router.route(logs)
+        return routed_logs
+
+    def get_logs_prefetch_strategy(self) -> str:
+        if self.logs_prefetch_strategy == 'auto':
+            return 'range' if self.web3_service.supports_logs_range() else 'receipts'
+        return self.logs_prefetch_strategy
+
+    def prefetch_logs(self, prefetched_blocks, block_numbers, watched_addresses=None):
+        """
+        Recover logs for every prefetched block using the configured logs prefetch strategy:
+            - `range`: `eth_getLogs` calls for the whole range of blocks, split if node refuses the range
+            - `filter`: Like `range`, but node only returns logs of watched addresses and known events
+            - `receipts`: Every receipt of every block is retrieved to get the logs
+        If node refuses the `eth_getLogs` calls, logs are recovered using `receipts`
+        :param prefetched_blocks: dictionary of block number and prefetched block
+        :param block_numbers: range of block numbers to get logs from
+        :param watched_addresses: addresses for `filter` strategy, every watched address will be used if not provided
+        :return: a dictionary, the key is the block number and value is list of logs
+        :raises UnknownBlock: if a block changed while logs were retrieved
+        """
+        strategy = self.get_logs_prefetch_strategy()
+        if strategy in ('range', 'filter'):
+            try:
+                prefetched_logs = self.web3_service.get_logs_for_block_range(
+                    block_numbers[0], block_numbers[-1], **self.get_logs_range_filter(strategy, watched_addresses))
+            except self.web3_service.logs_range_exceptions as e:
+                logger.warning('Node refused logs from block=%d to block=%d, retrieving them using receipts: %s',
+                               block_numbers[0], block_numbers[-1], e)
+                return self.web3_service.get_logs_for_blocks(prefetched_blocks.values())
+            try:
+                self.check_logs_block_hashes(prefetched_blocks, prefetched_logs)
+            except UnknownBlock:
+                # Cached blocks might belong to the old chain
+                self.web3_service.block_cache.invalidate(block_numbers[0])
+                raise
+            return prefetched_logs
+        elif strategy == 'receipts':
+            return self.web3_service.get_logs_for_blocks(prefetched_blocks.values())
+        else:
+            raise ImproperlyConfigured('%s logs prefetch strategy is not supported' % strategy)
+
+    async def prefetch_logs_async(self, async_web3_service: AsyncWeb3Service, prefetched_blocks, block_numbers,
+                                  watched_addresses=None):
+        """
+        Same as `prefetch_logs` using `AsyncWeb3Service`
+        """
+        strategy = self.get_logs_prefetch_strategy()
+        if strategy in ('range', 'filter'):
+            try:
+                prefetched_logs = await async_web3_service.get_logs_for_block_range(
+                    block_numbers[0], block_numbers[-1], **self.get_logs_range_filter(strategy, watched_addresses))
+            except ValueError as e:
+                logger.warning('Node refused logs from block=%d to block=%d, retrieving them using receipts: %s',
+                               block_numbers[0], block_numbers[-1], e)
+                return await async_web3_service.get_logs_for_blocks(prefetched_blocks.values())
+            self.check_logs_block_hashes(prefetched_blocks, prefetched_logs)
+            return prefetched_logs
+        elif strategy == 'receipts':
+            return await async_web3_service.get_logs_for_blocks(prefetched_blocks.values())
+        else:
+            raise ImproperlyConfigured('%s logs prefetch strategy is not supported' % strategy)
+
+    def get_logs_range_filter(self, strategy, watched_addresses=None) -> Dict[str, any]:
+        """
+        :return: `get_logs_for_block_range` filter arguments for `range` and `filter` strategies
+        """
+        if strategy == 'filter':
+            if watched_addresses is None:
+                watched_addresses = self.get_all_watched_addresses()
+            return {'addresses': list(watched_addresses),
+                    'topics': list(self.decoder.events),
+                    'max_addresses_per_filter': self.max_addresses_per_filter}
+        return {}
+
+    def prefetch_logs_for_new_addresses(self, prefetched_blocks, prefetched_logs, new_addresses, block_numbers):
+        """
+        Using `filter` strategy, logs for addresses added while processing (e.g. contracts created by a watched
+        factory) were not prefetched. Recover them and add them to `prefetched_logs`
+        :param new_addresses: addresses not used when `prefetched_logs` were recovered
+        :param block_numbers: range of block numbers not processed yet, starting with the current one
+        :return: dictionary of block number -> logs of the new addresses, for every block number
+        """
+        new_logs = self.prefetch_logs(prefetched_blocks, block_numbers, watched_addresses=new_addresses)
+        # If node refused the filter logs come from receipts, so only logs of the new addresses are kept
+        new_addresses = {address.lower() for address in new_addresses}
+        for block_number in block_numbers:
+            logs = [log for log in new_logs.get(block_number, []) if log['address'].lower() in new_addresses]
+            new_logs[block_number] = logs
+            if logs:
+                block_logs = prefetched_logs[block_number]
+                block_logs.extend(logs)
+                block_logs.sort(key=lambda log: log['logIndex'])
+        return new_logs
+
+    @staticmethod
+    def check_logs_block_hashes(prefetched_blocks, prefetched_logs):
+        """
+        Logs and blocks are not retrieved at the same time, so make sure logs belong to the prefetched blocks
+        :raises UnknownBlock: if a block hash doesn't match, might be a reorg
+        """
+        for block_number, logs in prefetched_logs.items():
+            block_hash = remove_0x_head(prefetched_blocks[block_number]['hash'])
+            for log in logs:
+                if remove_0x_head(log['blockHash']) != block_hash:
+                    raise UnknownBlock('Block %d changed while prefetching logs, might be a reorg' % block_number)
+
     @transaction.atomic
     def save_event(self, contract, decoded_log, block_info):
         event_receiver = contract['EVENT_DATA_RECEIVER_CLASS']
@@ -180,7 +338,7 @@ class EventListener:
         blocks = Block.objects.filter(block_number__gt=block_number).order_by('-block_number')
         logger.warning('Rolling back %d blocks, until block-number=%d', blocks.count(), block_number)
         for block in blocks:
-            decoded_logs = loads(block.decoded_logs)
+            decoded_logs = json_codec.loads(block.decoded_logs)
             logger.warning('Rolling back %d block and %d logs', block.block_number, len(decoded_logs))
             if len(decoded_logs):
                 # We loop decoded logs on inverse order because there might be dependencies inside the same block
@@ -196,6 +354,7 @@ class EventListener:
 
         # Remove backups from future blocks (old chain)
         blocks.delete()
+        self.web3_service.block_cache.invalidate(block_number + 1)
 
         # set daemon block_number to current one
         daemon.block_number = block_number
@@ -209,11 +368,13 @@ class EventListener:
                                                          'timestamp': timestamp}
                                                )
 
-        saved_logs = loads(block.decoded_logs)
+        if isinstance(decoded_event, LazyDecodedEvent):
+            decoded_event = decoded_event.to_dict()
+        saved_logs = json_codec.loads(block.decoded_logs)
         saved_logs.append({'event_receiver': event_receiver_string,
                            'event': decoded_event})
 
-        block.decoded_logs = dumps(saved_logs, cls=JsonBytesEncoder)
+        block.decoded_logs = json_codec.dumps(saved_logs)
         block.save()
 
     @transaction.atomic
@@ -261,136 +422,134 @@ class EventListener:
 
         logger.info('Sync with filters, start-block=%d - end-block=%d', start_block, end_block)
 
-        # Store addresses with retrieved logs
-        block_number_with_logs = {}
-
         # Cache for contracts that need access to database
         contract_address_cache = {}
 
         # Every contract address. They will be used to know which blocks have to be retrieved for sure
-        contract_addresses = set()
-        block_numbers_to_be_prefetched = set()
-        for contract in self.contract_map:
-            contract_addresses.update(self.get_watched_contract_addresses(contract))
-
-        # Load logs for every event
-        events = self.decoder.events
-        for event in events:
-            logger.info('Using filter to get logs for event=%s from block=%d to block=%d',
-                        event,
-                        start_block,
-                        end_block)
-            logs = self.web3_service.get_logs_for_event_using_filter(start_block, end_block, event)
-            logger.info('Found %d logs for event=%s', len(logs), event)
-            for log in logs:
-                block_number = log['blockNumber']
-                block_number_with_logs.setdefault(block_number, []).append(log)
-                if log['address'] in contract_addresses:
-                    block_numbers_to_be_prefetched.add(block_number)
-
-        logger.info('Start prefetching of %d blocks', len(block_numbers_to_be_prefetched))
-        prefetched_blocks = self.web3_service.get_blocks(list(block_numbers_to_be_prefetched))
-        logger.info('End block prefetching')
-
-        # Start in the first block with logs.
-        # For example, if we start in block 5 but no logs are found until 200, we start in the 200
-        new_start_block = max(min(block_number_with_logs), start_block) if block_number_with_logs else end_block
-        if new_start_block != start_block:
-            logger.info('No logs found from block=%d to block=%d, so starting in block=%d',
-                        start_block, new_start_block, new_start_block)
-
-        for block_number in range(new_start_block, end_block):
-            logger.debug('Processing block %d', block_number)
-            logs = block_number_with_logs.get(block_number)
-            if not logs:
-                continue
-
-            # Don't load block if not needed, can be `None` if not prefetched
-            current_block = prefetched_blocks.get(block_number)
-
-            ###########################
-            # Decode logs #
-            ###########################
-            for contract in self.contract_map:
-                # Query cache before retrieving contract addresses from database
-                if contract['NAME'] not in contract_address_cache:
-                    contract_address_cache[contract['NAME']] = self.get_watched_contract_addresses(contract)
-                watched_addresses = contract_address_cache[contract['NAME']]
-
-                # Filter logs by relevant addresses
-                target_logs = [log for log in logs if log['address'] in watched_addresses]
-
-                if target_logs:
-                    logger.info('Contract=%s Block=%d -> Found %d relevant logs',
-                                contract['NAME'],
-                                block_number,
-                                len(target_logs))
-
-                decoded_logs = self.decoder.decode_logs(target_logs)
-
-                if decoded_logs:
-                    logger.info('Contract=%s Block=%d -> Decoded %d relevant logs',
-                                contract['NAME'],
-                                block_number,
-                                len(decoded_logs))
-
-                    # Save events
-                    for decoded_log in decoded_logs:
-                        # Fetch block if not recovered yet
-                        if not current_block:
-                            current_block = self.web3_service.get_block(block_number)
-
-                        instance = self.save_event(contract, decoded_log, current_block)
-
-                        # Only valid data is saved in backup
-                        if instance is not None:
-                            # Clear cache, maybe new addresses are stored
-                            contract_address_cache.clear()
-
-                            if (end_block - block_number) < self.max_blocks_to_backup:
-                                self.backup(
-                                    remove_0x_head(current_block['hash']),
-                                    current_block['number'],
-                                    current_block['timestamp'],
-                                    decoded_log,
-                                    contract['EVENT_DATA_RECEIVER']
-                                )
-
-                    logger.info('Contract=%s Block=%d -> Processed %d relevant logs',
-                                contract['NAME'],
-                                block_number,
-                                len(decoded_logs))
-
-            daemon.block_number = block_number
-            logger.debug('Ended processing of block_number=%d', block_number)
+        contract_addresses = self.get_all_watched_addresses()
+
+        # Load logs for every event, sorted by block number and log index
+        events = list(self.decoder.events)
+        logger.info('Using filter to get logs for %d events from block=%d to block=%d',
+                    len(events),
+                    start_block,
+                    end_block)
+        if self.stream_filter_logs:
+            # Logs are processed while they are received, only `max_blocks_to_process` blocks are in memory
+            logs = self.web3_service.iter_logs_for_events_using_filter(start_block, end_block, events)
+        else:
+            logs = self.web3_service.get_logs_for_events_using_filter(start_block, end_block, events)
+            logger.info('Found %d logs for %d events', len(logs), len(events))
+
+        # Only blocks with logs are processed. `end_block` will be processed on next execution
+        block_numbers_with_logs = ((block_number, list(block_logs))
+                                   for block_number, block_logs in itertools.groupby(logs,
+                                                                                     lambda log: log['blockNumber'])
+                                   if block_number < end_block)
+        while True:
+            blocks_chunk = list(itertools.islice(block_numbers_with_logs, self.max_blocks_to_process))
+            if not blocks_chunk:
+                break
+
+            block_numbers_to_be_prefetched = [block_number for block_number, block_logs in blocks_chunk
+                                              if any(log['address'] in contract_addresses for log in block_logs)]
+            logger.info('Start prefetching of %d blocks', len(block_numbers_to_be_prefetched))
+            prefetched_blocks = self.web3_service.get_blocks(block_numbers_to_be_prefetched)
+            logger.info('End block prefetching')
+
+            for block_number, block_logs in blocks_chunk:
+                logger.debug('Processing block %d', block_number)
+                self.process_block_logs_with_filters(block_number, block_logs, prefetched_blocks.get(block_number),
+                                                     end_block, contract_address_cache)
+                daemon.block_number = block_number
+                logger.debug('Ended processing of block_number=%d', block_number)
 
         daemon.block_number = end_block
         daemon.save()
 
-    def execute(self):
+    def process_block_logs_with_filters(self, block_number: int, logs: List[any], current_block: Optional[any],
+                                        end_block: int, contract_address_cache: Dict[str, Set[str]]):
         """
-        :raises: Web3ConnectionException
+        Decodes and saves the logs of a block retrieved using filters
+        :param block_number: number of the block
+        :param logs: logs of the block
+        :param current_block: block if it was prefetched, `None` otherwise (it's retrieved if needed)
+        :param end_block: last block of the sync, blocks close to it are backed up
+        :param contract_address_cache: watched addresses for every contract name, cleared when events are saved
+        """
+        ###########################
+        # Decode logs #
+        ###########################
+        routed_logs = None
+        for contract_index, contract in enumerate(self.contract_map):
+            # Query cache before retrieving contract addresses from database. Route logs again if cache was cleared
+            if routed_logs is None or contract['NAME'] not in contract_address_cache:
+                routed_logs = self.route_logs(logs, contract_address_cache, routed_logs=routed_logs)
+
+            # Logs of relevant addresses with known topics
+            target_logs = routed_logs[contract_index]
+
+            if target_logs:
+                logger.info('Contract=%s Block=%d -> Found %d relevant logs',
+                            contract['NAME'],
+                            block_number,
+                            len(target_logs))
+
+            decoded_logs = self.decoder.decode_logs(target_logs, lazy=self.lazy_decoded_events)
+
+            if decoded_logs:
+                logger.info('Contract=%s Block=%d -> Decoded %d relevant logs',
+                            contract['NAME'],
+                            block_number,
+                            len(decoded_logs))
+
+                # Save events
+                for decoded_log in decoded_logs:
+                    # Fetch block if not recovered yet
+                    if not current_block:
+                        current_block = self.web3_service.get_block(block_number)
+
+                    instance = self.save_event(contract, decoded_log, current_block)
+
+                    # Only valid data is saved in backup
+                    if instance is not None:
+                        # Maybe new addresses are stored
+                        self.invalidate_contract_address_cache(contract_address_cache)
+
+                        if (end_block - block_number) < self.max_blocks_to_backup:
+                            self.backup(
+                                remove_0x_head(current_block['hash']),
+                                current_block['number'],
+                                current_block['timestamp'],
+                                decoded_log,
+                                contract['EVENT_DATA_RECEIVER']
+                            )
+
+                logger.info('Contract=%s Block=%d -> Processed %d relevant logs',
+                            contract['NAME'],
+                            block_number,
+                            len(decoded_logs))
+
+    def get_block_numbers_to_process(self, daemon: Daemon, current_block_number: int) -> range:
+        """
+        Syncs using filters if daemon is too far from the node. If not, checks reorgs and returns the
+        block numbers of next mined blocks
+        :return: range of block numbers to prefetch and process, empty if there's nothing to process
         """
-
-        # When we have address getters caching can save us a lot of time
-        contract_address_cache = {}
-
-        daemon = Daemon.get_solo()
-
-        self.clean_useless_blocks_backup(daemon.block_number)
-        current_block_number = self.web3_service.get_current_block_number()
-
         # Use filters for first sync
         if (current_block_number - daemon.block_number) > self.max_blocks_to_backup:
             self.clean_old_blocks_backup(daemon.block_number)
-            return self.execute_with_filters(daemon,
-                                             min(daemon.block_number + self.blocks_to_process_with_filters,
-                                                 current_block_number - self.max_blocks_to_backup)
-                                             )
+            # Sync of old blocks must not delay requests to follow the head of the chain
+            with self.web3_service.priority(RequestPriority.LOW):
+                self.execute_with_filters(daemon,
+                                          min(daemon.block_number + self.blocks_to_process_with_filters,
+                                              current_block_number - self.max_blocks_to_backup)
+                                          )
+            return range(0)
 
         had_reorg, reorg_block_number = check_reorg(daemon.block_number,
                                                     current_block_number,
-                                                    provider=self.provider)
+                                                    web3_service=self.web3_service)
         if had_reorg:
             # Daemon block_number could be modified
             self.rollback(daemon, reorg_block_number)
@@ -408,30 +567,121 @@ class EventListener:
                         next_mined_block_numbers[-1],
                         len(next_mined_block_numbers),
                         daemon.block_number)
+        return next_mined_block_numbers
 
-            last_mined_block_number = next_mined_block_numbers[-1]
+    def get_prefetch_watched_addresses(self) -> Optional[Set[str]]:
+        """
+        :return: watched addresses if logs are prefetched using `filter` strategy, `None` otherwise
+        """
+        if self.get_logs_prefetch_strategy() == 'filter':
+            return self.get_all_watched_addresses()
+
+    def execute(self):
+        """
+        :raises: Web3ConnectionException
+        """
+        daemon = Daemon.get_solo()
+
+        self.clean_useless_blocks_backup(daemon.block_number)
+        current_block_number = self.web3_service.get_current_block_number()
+
+        next_mined_block_numbers = self.get_block_numbers_to_process(daemon, current_block_number)
+        if next_mined_block_numbers:
             prefetched_blocks = self.web3_service.get_blocks(next_mined_block_numbers)
             logger.debug('Finished blocks prefetching')
 
             logger.info('Start log prefetching')
-            prefetched_logs = self.web3_service.get_logs_for_blocks(prefetched_blocks.values())
+            watched_addresses = self.get_prefetch_watched_addresses()
+            prefetched_logs = self.prefetch_logs(prefetched_blocks, next_mined_block_numbers, watched_addresses)
             logger.info('End log prefetching')
 
-            self.backup_blocks(prefetched_blocks, last_mined_block_number)
-            logger.debug('Finished blocks backup')
+            self.process_blocks(daemon, next_mined_block_numbers, prefetched_blocks, prefetched_logs,
+                                watched_addresses)
+
+    def build_async_web3_service(self) -> AsyncWeb3Service:
+        if not self.web3_service.node_uri:
+            raise ImproperlyConfigured('Async execution is only supported for http/s nodes')
+        return AsyncWeb3Service(self.web3_service.node_uri,
+                                max_in_flight_requests=self.max_in_flight_requests,
+                                max_batch_requests=self.web3_service.max_batch_requests)
 
-            for current_block_number in next_mined_block_numbers:
+    async def execute_async(self, async_web3_service: Optional[AsyncWeb3Service]=None):
+        """
+        Same as `execute`, but blocks and logs are prefetched concurrently using `AsyncWeb3Service`. Database
+        and `Web3Service` calls are blocking, so they are run in a thread to not block the event loop
+        :param async_web3_service: built using the same node if not provided
+        :raises: Web3ConnectionException
+        """
+        if async_web3_service is None:
+            async with self.build_async_web3_service() as async_web3_service:
+                return await self.execute_async(async_web3_service)
+
+        loop = asyncio.get_event_loop()
+        # Only one thread, so every blocking call uses the same database connection
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            daemon = await loop.run_in_executor(executor, Daemon.get_solo)
+
+            await loop.run_in_executor(executor, self.clean_useless_blocks_backup, daemon.block_number)
+            current_block_number = await async_web3_service.get_current_block_number()
+
+            next_mined_block_numbers = await loop.run_in_executor(executor, self.get_block_numbers_to_process,
+                                                                  daemon, current_block_number)
+            if next_mined_block_numbers:
+                prefetched_blocks = await async_web3_service.get_blocks(next_mined_block_numbers)
+                logger.debug('Finished blocks prefetching')
+
+                logger.info('Start log prefetching')
+                watched_addresses = await loop.run_in_executor(executor, self.get_prefetch_watched_addresses)
+                prefetched_logs = await self.prefetch_logs_async(async_web3_service, prefetched_blocks,
+                                                                 next_mined_block_numbers, watched_addresses)
+                logger.info('End log prefetching')
+
+                # Transaction must be opened by the thread using the database connection
+                await loop.run_in_executor(executor, transaction.atomic(self.process_blocks), daemon,
+                                           next_mined_block_numbers, prefetched_blocks, prefetched_logs,
+                                           watched_addresses)
+
+    def process_blocks(self, daemon, next_mined_block_numbers, prefetched_blocks, prefetched_logs,
+                       watched_addresses=None):
+        """
+        Backups and processes prefetched blocks
+        :param watched_addresses: addresses used to prefetch logs with `filter` strategy, `None` otherwise
+        """
+        # When we have address getters caching can save us a lot of time
+        contract_address_cache = {}
+
+        last_mined_block_number = next_mined_block_numbers[-1]
+        self.backup_blocks(prefetched_blocks, last_mined_block_number)
+        logger.debug('Finished blocks backup')
+
+        for current_block_number in next_mined_block_numbers:
+            block_logs = prefetched_logs[current_block_number]
+            while True:
                 self.process_block(daemon,
                                    prefetched_blocks[current_block_number],
-                                   prefetched_logs[current_block_number],
+                                   block_logs,
                                    current_block_number,
                                    last_mined_block_number,
                                    contract_address_cache)
 
-            # Remove older backups
-            self.clean_old_blocks_backup(daemon.block_number)
-
-            logger.info('Ended processing of chunk, daemon-block-number=%d', daemon.block_number)
+                # Saved events can add new addresses to watch, their logs were not prefetched. A contract can
+                # emit logs in the same block it was created, so those logs must be processed now
+                if watched_addresses is None or not block_logs:
+                    break
+                new_addresses = self.get_all_watched_addresses() - watched_addresses
+                if not new_addresses:
+                    break
+                logger.info('Found %d new addresses to watch, prefetching their logs', len(new_addresses))
+                watched_addresses |= new_addresses
+                new_logs = self.prefetch_logs_for_new_addresses(prefetched_blocks, prefetched_logs, new_addresses,
+                                                                range(current_block_number,
+                                                                      last_mined_block_number + 1))
+                block_logs = new_logs[current_block_number]
+
+        # Remove older backups
+        self.clean_old_blocks_backup(daemon.block_number)
+
+        logger.info('Ended processing of chunk, daemon-block-number=%d', daemon.block_number)
 
     @transaction.atomic
     def process_block(self, daemon, current_block, logs, current_block_number, last_mined_block_number,
@@ -444,25 +694,25 @@ class EventListener:
         # Decode logs #
         ###########################
         if logs:
-            for contract in self.contract_map:
+            routed_logs = None
+            for contract_index, contract in enumerate(self.contract_map):
 
-                # Get watched contract addresses
-                if contract['NAME'] not in contract_address_cache:
-                    contract_address_cache[contract['NAME']] = self.get_watched_contract_addresses(contract)
-                watched_addresses = contract_address_cache[contract['NAME']]
+                # Get watched contract addresses. Route logs again if cache was cleared, maybe new addresses are stored
+                if routed_logs is None or contract['NAME'] not in contract_address_cache:
+                    routed_logs = self.route_logs(logs, contract_address_cache, routed_logs=routed_logs)
 
-                # Filter logs by relevant addresses
-                target_logs = [log for log in logs if self.web3.toChecksumAddress(log['address']) in watched_addresses]
+                # Logs of relevant addresses with known topics
+                target_logs = routed_logs[contract_index]
 
                 if target_logs:
                     logger.info('Found %d relevant logs in block %d', len(target_logs), current_block_number)
 
                 # Decode logs
-                decoded_logs = self.decoder.decode_logs(target_logs)
+                decoded_logs = self.decoder.decode_logs(target_logs, lazy=self.lazy_decoded_events)
 
                 if decoded_logs:
-                    # Clear cache, maybe new addresses are stored
-                    contract_address_cache.clear()
+                    # Maybe new addresses are stored
+                    self.invalidate_contract_address_cache(contract_address_cache)
 
                     logger.info('Decoded %d relevant logs in block %d', len(decoded_logs), current_block_number)
 
@@ -14,6 +14,28 @@ class Web3ConnectionException(Exception):
     pass
 
 
+class BatchRequestRejected(Web3ConnectionException):
+    """
+    Node rejected a batched request: too many requests in the batch, response too big or rate limiting
+    """
+    pass
+
+
+class BatchRequestTimeout(Web3ConnectionException):
+    """
+    Node did not answer a batched request in time. Node could be just slow, so batch is not rejected because
+    of its size
+    """
+    pass
+
+
+class RateLimitExceeded(BatchRequestRejected):
+    """
+    Node rejected a request because of rate limiting (HTTP 429)
+    """
+    pass
+
+
 class UnknownBlock(Exception):
     pass
 
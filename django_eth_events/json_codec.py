@@ -0,0 +1,80 @@
+import json
+import re
+from typing import Any, Optional, Union
+
+from .utils import JsonBytesEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec:
+    """
+    Standard library json. Bytes are encoded as text, or as hex if they are not valid utf-8
+    """
+    name = 'json'
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, cls=JsonBytesEncoder)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode()
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    `orjson` codec. `orjson` only supports 64 bit integers, so standard library is used if there are
+    bigger numbers (`uint256` event arguments are common in backups)
+    """
+    name = 'orjson'
+    # JSON numbers with more than 18 digits. Number must be after `:`, `[` or `,` so hex strings
+    # like hashes don't match most of the time (if they do, standard library is used)
+    big_number_pattern = re.compile(r'[:\[,]\s*-?\d{19}')
+    big_number_pattern_bytes = re.compile(rb'[:\[,]\s*-?\d{19}')
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        pattern = self.big_number_pattern_bytes if isinstance(data, (bytes, bytearray)) else self.big_number_pattern
+        if pattern.search(data):
+            return super().loads(data)
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumps_bytes(obj).decode()
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, default=self._default)
+        except TypeError:
+            # Integer bigger than 64 bits
+            return super().dumps(obj).encode()
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, bytes):
+            return JsonBytesEncoder().default(obj)
+        raise TypeError
+
+
+JSON_CODECS = {codec.name: codec for codec in (JsonCodec, OrjsonCodec)}
+
+
+def get_json_codec(name: Optional[str]=None) -> JsonCodec:
+    """
+    :param name: `json` or `orjson`. If not provided, fastest codec installed is used
+    :return: json codec
+    """
+    if name is None:
+        name = 'orjson' if orjson is not None else 'json'
+    elif name not in JSON_CODECS:
+        raise ValueError('%s json codec is not supported, use one of %s' % (name, ', '.join(JSON_CODECS)))
+    elif name == 'orjson' and orjson is None:
+        raise ValueError('orjson json codec is not installed')
+    return JSON_CODECS[name]()
+
+
+json_codec = get_json_codec()
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .decoder import Decoder
+from .utils import remove_0x_head
+
+
+def normalize_log_address(address) -> str:
+    """
+    :return: address as lowercase hex without 0x, so checksumed and not checksumed addresses are the same key
+    """
+    return remove_0x_head(address).lower()
+
+
+class LogRouter:
+    """
+    Index from every watched address to the contracts (positions in the contract map) watching it, so every log of
+    a block is routed to its contracts with one dictionary lookup instead of scanning the logs once per contract.
+    Logs with topics unknown for the `Decoder` are dropped before decoding. When the watched addresses of a
+    contract change, only the entries of its added and removed addresses are updated
+    """
+
+    def __init__(self, decoder: Decoder):
+        self.decoder = decoder
+        self.address_sets: Optional[List[Set[str]]] = None
+        self.routes: Dict[str, Tuple[int, ...]] = {}
+
+    def update(self, address_sets: List[Set[str]]) -> bool:
+        """
+        Updates the index if the watched addresses changed
+        :param address_sets: watched addresses of every contract, in the same order as the contract map
+        :return: True if index was updated, False if addresses didn't change
+        """
+        if self.address_sets is None or len(address_sets) != len(self.address_sets):
+            self.build(address_sets)
+            return True
+
+        updated = False
+        for contract_index, (old_addresses, addresses) in enumerate(zip(self.address_sets, address_sets)):
+            # Cached sets are the same objects until they are invalidated, so they are not compared element by element
+            if addresses is old_addresses or addresses == old_addresses:
+                continue
+            updated = True
+            for address in old_addresses - addresses:
+                self._remove_route(normalize_log_address(address), contract_index)
+            for address in addresses - old_addresses:
+                self._add_route(normalize_log_address(address), contract_index)
+        self.address_sets = address_sets
+        return updated
+
+    def build(self, address_sets: List[Set[str]]):
+        """
+        Builds the index from scratch
+        :param address_sets: watched addresses of every contract, in the same order as the contract map
+        """
+        routes: Dict[str, List[int]] = {}
+        for contract_index, addresses in enumerate(address_sets):
+            for address in addresses:
+                contract_indexes = routes.setdefault(normalize_log_address(address), [])
+                if contract_index not in contract_indexes:
+                    contract_indexes.append(contract_index)
+        self.routes = {address: tuple(contract_indexes) for address, contract_indexes in routes.items()}
+        self.address_sets = address_sets
+
+    def _add_route(self, address: str, contract_index: int):
+        contract_indexes = self.routes.get(address, ())
+        if contract_index not in contract_indexes:
+            self.routes[address] = tuple(sorted(contract_indexes + (contract_index,)))
+
+    def _remove_route(self, address: str, contract_index: int):
+        contract_indexes = tuple(index for index in self.routes.get(address, ()) if index != contract_index)
+        if contract_indexes:
+            self.routes[address] = contract_indexes
+        else:
+            self.routes.pop(address, None)
+
+    def route(self, logs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        :param logs: ethereum logs
+        :return: logs of every contract, in the same order as the contract map. Order of logs is kept
+        """
+        if self.address_sets is None:
+            raise ValueError('Watched addresses must be set using `update` before routing logs')
+
+        routed_logs = [[] for _ in self.address_sets]
+        decode_plans = self.decoder.decode_plans
+        for log in logs:
+            contract_indexes = self.routes.get(normalize_log_address(log['address']))
+            if not contract_indexes:
+                continue
+            topics = log['topics']
+            # Logs with unknown topics would not be decoded
+            if not topics or remove_0x_head(topics[0]) not in decode_plans:
+                continue
+            for contract_index in contract_indexes:
+                routed_logs[contract_index].append(log)
+        return routed_logs
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...event_listener import EventListener
+from ...subscription import SubscriptionListener
+
+
+class Command(BaseCommand):
+    help = 'Process events as soon as blocks are mined, using a websocket subscription to the node'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ws-url', help='Websocket uri of the node. By default ETHEREUM_NODE_WS_URL, or '
+                                             'ETHEREUM_NODE_URL if it is a websocket uri')
+        parser.add_argument('--poll-interval', type=float, default=15.,
+                            help='Seconds without new blocks to poll the node anyway')
+        parser.add_argument('--logs', action='store_true', default=False,
+                            help='Also subscribe to logs of the known events')
+
+    def handle(self, *args, **options):
+        ws_url = options['ws_url'] or getattr(settings, 'ETHEREUM_NODE_WS_URL', None) or settings.ETHEREUM_NODE_URL
+        if not ws_url.startswith('ws'):
+            raise CommandError('A websocket uri is required, %s was provided' % ws_url)
+
+        logs_filter = None
+        if options['logs']:
+            logs_filter = {'topics': [sorted(EventListener().decoder.events)]}
+
+        self.stdout.write(self.style.SUCCESS('Listening to new blocks of %s' % ws_url))
+        listener = SubscriptionListener(ws_url, logs_filter=logs_filter, poll_interval=options['poll_interval'])
+        try:
+            listener.run()
+        except KeyboardInterrupt:
+            listener.stop()
@@ -0,0 +1,313 @@
+import concurrent.futures
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import requests
+from web3.providers.base import JSONBaseProvider
+
+from .exceptions import Web3ConnectionException
+from .transports import (BatchResponse, BatchTransport,
+                         get_batch_transport_from_uri)
+
+logger = logging.getLogger(__name__)
+
+
+class NodeStats:
+    """
+    Latency and error stats of a node. Latency samples are stored by kind of request (method and size of the
+    batch), as `eth_getLogs` or a batch of 500 blocks cannot be compared with `eth_blockNumber`
+    """
+
+    def __init__(self, max_samples: int=200, smoothing: float=0.1):
+        """
+        :param max_samples: Latency samples stored for every kind of request
+        :param smoothing: Weight of new samples for the moving averages of latency and errors
+        """
+        self.max_samples = max_samples
+        self.smoothing = smoothing
+        self.latencies: Dict[str, deque] = {}
+        self.latency = 0.
+        self.error_rate = 0.
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.dropped_until = 0.
+
+    def record_success(self, request_kind: str, elapsed: float):
+        self.requests += 1
+        self.latencies.setdefault(request_kind, deque(maxlen=self.max_samples)).append(elapsed)
+        self.latency = elapsed if self.requests == 1 else \
+            self.latency + self.smoothing * (elapsed - self.latency)
+        self.error_rate -= self.smoothing * self.error_rate
+
+    def record_failure(self):
+        self.requests += 1
+        self.errors += 1
+        self.error_rate += self.smoothing * (1. - self.error_rate)
+
+    def get_latency_percentile(self, request_kind: str, percentile: float, min_samples: int) -> Optional[float]:
+        """
+        :return: latency percentile for the kind of request, `None` if there are less than `min_samples`
+        """
+        samples = self.latencies.get(request_kind)
+        if not samples or len(samples) < min_samples:
+            return None
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
+
+    @property
+    def score(self) -> float:
+        """
+        :return: expected cost of sending a request to the node, lower is better. Nodes without stats
+        have the best score, so every node is tried. Error rate is also added, as a node failing fast
+        could have a better latency than the working ones
+        """
+        return self.latency * (1 + self.in_flight) / max(0.01, 1. - self.error_rate) + self.error_rate
+
+
+class Node:
+    def __init__(self, node_uri: str, transport: BatchTransport):
+        self.node_uri = node_uri
+        self.transport = transport
+        self.stats = NodeStats()
+
+    def __repr__(self):
+        return 'Node(%s)' % self.node_uri
+
+
+class NodePool(BatchTransport):
+    """
+    Spreads JSON-RPC requests across several nodes. For every request two healthy nodes are picked randomly
+    and the one with the best score (latency, errors and requests in flight) is used. Nodes with too many errors
+    or much slower than the others are dropped for a while. If a node fails the request is sent to the next one,
+    and if a node takes more than its p95 latency a hedged request is sent to another node and the first
+    response is used
+    """
+
+    def __init__(self, nodes: List[Node], hedge_requests: bool=True, hedge_percentile: float=0.95,
+                 min_samples: int=20, max_error_rate: float=0.5, outlier_factor: float=3.,
+                 min_outlier_latency: float=0.1, drop_seconds: int=30, max_concurrent_requests: int=50):
+        """
+        :param nodes: Nodes of the pool
+        :param hedge_requests: Send a duplicated request to another node when a node is slower than usual
+        :param hedge_percentile: Latency percentile of the node to wait before sending the hedged request
+        :param min_samples: Min latency samples needed for hedging and dropping slow nodes
+        :param max_error_rate: Nodes with a bigger error rate are dropped
+        :param outlier_factor: Nodes with a latency this many times bigger than the fastest one are dropped
+        :param min_outlier_latency: Seconds. Nodes are not dropped if their latency is not at least this much
+        bigger than the fastest one, to ignore noise for really fast nodes
+        :param drop_seconds: Seconds a node is not used after being dropped
+        :param max_concurrent_requests: Max requests sent to the nodes at the same time
+        """
+        if not nodes:
+            raise ValueError('At least one node is required')
+        self.nodes = nodes
+        self.hedge_requests = hedge_requests and len(nodes) > 1
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.outlier_factor = outlier_factor
+        self.min_outlier_latency = min_outlier_latency
+        self.drop_seconds = drop_seconds
+        self.max_concurrent_requests = max_concurrent_requests
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @classmethod
+    def from_uris(cls, node_uris: List[str], timeout: Optional[int]=None,
+                  session: Optional[requests.Session]=None, **kwargs) -> 'NodePool':
+        return cls([Node(node_uri, get_batch_transport_from_uri(node_uri, timeout=timeout, session=session))
+                    for node_uri in node_uris], **kwargs)
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrent_requests)
+            return self._executor
+
+    def close(self):
+        for node in self.nodes:
+            node.transport.close()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def get_healthy_nodes(self) -> List[Node]:
+        """
+        Drops nodes with too many errors or slow outliers
+        :return: nodes that can be used. Every node if all of them are dropped
+        """
+        now = time.time()
+        with self._lock:
+            latencies = [node.stats.latency for node in self.nodes
+                         if node.stats.requests >= self.min_samples and node.stats.dropped_until <= now]
+            fastest_latency = min(latencies) if latencies else None
+            for node in self.nodes:
+                stats = node.stats
+                if stats.dropped_until > now or stats.requests < self.min_samples:
+                    continue
+                too_many_errors = stats.error_rate > self.max_error_rate
+                too_slow = fastest_latency is not None and \
+                    stats.latency > fastest_latency * self.outlier_factor and \
+                    stats.latency > fastest_latency + self.min_outlier_latency
+                if too_many_errors or too_slow:
+                    logger.warning('Dropping node %s for %d seconds, latency=%.3f error-rate=%.2f',
+                                   node.node_uri, self.drop_seconds, stats.latency, stats.error_rate)
+                    # Start from scratch when node is used again
+                    node.stats = NodeStats()
+                    node.stats.dropped_until = now + self.drop_seconds
+            healthy_nodes = [node for node in self.nodes if node.stats.dropped_until <= now]
+        return healthy_nodes or list(self.nodes)
+
+    def get_nodes_by_preference(self) -> List[Node]:
+        """
+        :return: healthy nodes, first one will be used and the rest for hedging and failover. First node is the
+        best of two random nodes, so requests are spread but better nodes receive more
+        """
+        nodes = self.get_healthy_nodes()
+        random.shuffle(nodes)
+        if len(nodes) > 1 and nodes[1].stats.score < nodes[0].stats.score:
+            nodes[0], nodes[1] = nodes[1], nodes[0]
+        nodes[1:] = sorted(nodes[1:], key=lambda node: node.stats.score)
+        return nodes
+
+    @staticmethod
+    def get_request_kind(rpc_request: List[Dict[str, Any]]) -> str:
+        # Batches are grouped by size in powers of 2
+        return '%s-%d' % (rpc_request[0].get('method'), len(rpc_request).bit_length())
+
+    def _send_to_node(self, node: Node, rpc_request: List[Dict[str, Any]],
+                      timeout: Optional[int]=None) -> BatchResponse:
+        stats = node.stats
+        with self._lock:
+            stats.in_flight += 1
+        start = time.monotonic()
+        try:
+            response = node.transport.send(rpc_request, timeout=timeout)
+        except Web3ConnectionException:
+            with self._lock:
+                stats.record_failure()
+            raise
+        else:
+            with self._lock:
+                stats.record_success(self.get_request_kind(rpc_request), time.monotonic() - start)
+            return response
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+
+    def send(self, rpc_request: List[Dict[str, Any]], timeout: Optional[int]=None) -> BatchResponse:
+        """
+        :param timeout: Timeout for this batch in every node, timeout of the transports if not provided
+        :raises Web3ConnectionException: if every node fails. Last exception raised by a node is raised
+        """
+        if not rpc_request:
+            return BatchResponse([])
+
+        nodes = iter(self.get_nodes_by_preference())
+        request_kind = self.get_request_kind(rpc_request)
+        pending = {}
+        hedged = False
+        last_exception = None
+
+        def send_to_next_node() -> Optional[Node]:
+            node = next(nodes, None)
+            if node is not None:
+                pending[self.executor.submit(self._send_to_node, node, rpc_request, timeout)] = node
+            return node
+
+        send_to_next_node()
+        while pending:
+            hedge_timeout = None
+            if self.hedge_requests and not hedged and len(pending) == 1:
+                first_node = next(iter(pending.values()))
+                hedge_timeout = first_node.stats.get_latency_percentile(request_kind, self.hedge_percentile,
+                                                                        self.min_samples)
+
+            done, _ = concurrent.futures.wait(pending, timeout=hedge_timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                node = send_to_next_node()
+                if node is not None:
+                    logger.debug('Request %s is slower than p%d, sending hedged request to %s', request_kind,
+                                 self.hedge_percentile * 100, node.node_uri)
+                continue
+
+            for future in done:
+                node = pending.pop(future)
+                try:
+                    return future.result()
+                except Web3ConnectionException as e:
+                    logger.warning('Node %s failed, trying with another node: %s', node.node_uri, e)
+                    last_exception = e
+
+            if not pending:
+                send_to_next_node()
+
+        raise last_exception or Web3ConnectionException('No nodes available')
+
+    def request(self, rpc_request: Dict[str, Any]) -> Dict[str, Any]:
+        # Sent as a batch of one request, so it's hedged and sent to other nodes if needed
+        return self.send([rpc_request])[0]
+
+
+class NodePoolProvider(JSONBaseProvider):
+    """
+    Web3 provider sending every request through a `NodePool`
+    """
+
+    def __init__(self, node_uris: List[str], timeout: Optional[int]=None, session: Optional[requests.Session]=None,
+                 node_pool: Optional[NodePool]=None, **node_pool_kwargs):
+        """
+        :param node_uris: uris of the nodes (http/s, ipc or ws)
+        :param timeout: Timeout for requests
+        :param session: http session shared by the http/s nodes
+        :param node_pool: `NodePool` already created for the nodes, a new one is created if not provided
+        :param node_pool_kwargs: Parameters for the `NodePool`
+        """
+        super().__init__()
+        self.node_uris = list(node_uris)
+        self.timeout = timeout
+        self.session = session
+        self.node_pool_kwargs = node_pool_kwargs
+        self.owns_node_pool = node_pool is None
+        self.node_pool = node_pool or NodePool.from_uris(self.node_uris, timeout=timeout, session=session,
+                                                         **node_pool_kwargs)
+        self._request_ids = itertools.count(1)
+
+    def __str__(self):
+        return 'NodePoolProvider(%s)' % ', '.join(self.node_uris)
+
+    def clone(self, timeout: Optional[int]=None) -> 'NodePoolProvider':
+        """
+        :return: provider using other timeout, sharing the same `NodePool` (and node stats)
+        """
+        return NodePoolProvider(self.node_uris, timeout=timeout or self.timeout, session=self.session,
+                                node_pool=self.node_pool)
+
+    def with_session(self, session: requests.Session) -> 'NodePoolProvider':
+        """
+        :return: provider with a new `NodePool` for the same nodes, using `session` for the http/s nodes
+        """
+        return NodePoolProvider(self.node_uris, timeout=self.timeout, session=session, **self.node_pool_kwargs)
+
+    def isConnected(self):
+        try:
+            return super().isConnected()
+        except Web3ConnectionException:
+            return False
+
+    def make_request(self, method, params):
+        rpc_request = {'jsonrpc': '2.0',
+                       'method': method,
+                       'params': params,
+                       'id': next(self._request_ids)}
+        return self.node_pool.send([rpc_request], timeout=self.timeout)[0]
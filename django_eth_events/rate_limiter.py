@@ -0,0 +1,176 @@
+import contextlib
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPriority:
+    # Following the head of the chain (current block number, reorg checks)
+    HIGH = 0
+    NORMAL = 1
+    # Syncing old blocks (filters)
+    LOW = 2
+
+
+# Weight (compute units) of the requests, based on the usual costs of hosted nodes
+DEFAULT_REQUEST_WEIGHTS: Dict[str, int] = {
+    'eth_blockNumber': 10,
+    'eth_getBlockByNumber': 16,
+    'eth_getBlockByHash': 21,
+    'eth_getTransactionReceipt': 15,
+    'eth_getBlockReceipts': 500,
+    'parity_getBlockReceipts': 500,
+    'eth_getLogs': 75,
+    'net_version': 0,
+}
+
+
+class TokenBucket:
+    """
+    Allows `rate` tokens per second, with bursts up to `capacity` tokens. Tokens can go negative when taking more
+    than the capacity at once, so the average rate is always kept
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float]=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_wait_time(self, tokens: float) -> float:
+        """
+        :return: seconds to wait until `tokens` can be taken (capped to the capacity of the bucket)
+        """
+        self.refill()
+        missing = min(tokens, self.capacity) - self.tokens
+        return max(0., missing / self.rate)
+
+    def take(self, tokens: float):
+        self.tokens -= tokens
+
+    def empty(self):
+        self.refill()
+        self.tokens = min(self.tokens, 0.)
+
+
+class RateLimiter:
+    """
+    Limits the requests sent to the node using two token buckets: number of requests per second and weight
+    (compute units) per second. A batch counts as many requests as it contains. Callers waiting for tokens are
+    served by priority (`RequestPriority`), so head following requests are not delayed by a sync of old blocks.
+    Priority of the calls of a thread can be set using `priority`
+    """
+
+    def __init__(self, max_requests_per_second: Optional[float]=None, max_weight_per_second: Optional[float]=None,
+                 burst_seconds: float=1., request_weights: Optional[Dict[str, int]]=None,
+                 default_request_weight: int=10):
+        """
+        :param max_requests_per_second: Max requests per second, `None` for no limit
+        :param max_weight_per_second: Max weight (compute units) per second, `None` for no limit
+        :param burst_seconds: Tokens of this many seconds can be used at once after being idle
+        :param request_weights: Weight for every method. `DEFAULT_REQUEST_WEIGHTS` if not provided
+        :param default_request_weight: Weight of the methods not in `request_weights`
+        """
+        self.requests_bucket = TokenBucket(max_requests_per_second, max_requests_per_second * burst_seconds) \
+            if max_requests_per_second else None
+        self.weight_bucket = TokenBucket(max_weight_per_second, max_weight_per_second * burst_seconds) \
+            if max_weight_per_second else None
+        self.request_weights = DEFAULT_REQUEST_WEIGHTS if request_weights is None else request_weights
+        self.default_request_weight = default_request_weight
+        self.waited = 0.
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+        self._thread_state = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_bucket is not None or self.weight_bucket is not None
+
+    @property
+    def current_priority(self) -> int:
+        return getattr(self._thread_state, 'priority', RequestPriority.NORMAL)
+
+    @contextlib.contextmanager
+    def priority(self, priority: int):
+        """
+        Requests sent by the thread inside the context use `priority`
+        """
+        previous_priority = self.current_priority
+        self._thread_state.priority = priority
+        try:
+            yield
+        finally:
+            self._thread_state.priority = previous_priority
+
+    def get_weight(self, methods: Iterable[str]) -> int:
+        return sum(self.request_weights.get(method, self.default_request_weight) for method in methods)
+
+    def acquire_for_methods(self, methods: Iterable[str], priority: Optional[int]=None) -> float:
+        """
+        Waits until requests for the `methods` can be sent
+        :return: seconds waited
+        """
+        if not self.enabled:
+            return 0.
+        methods = list(methods)
+        return self.acquire(len(methods), self.get_weight(methods), priority=priority)
+
+    def acquire(self, requests: int=1, weight: int=0, priority: Optional[int]=None) -> float:
+        """
+        Waits until `requests` with a total `weight` can be sent. Only the waiting caller with the highest priority
+        (and then the oldest) can take tokens
+        :param priority: `current_priority` of the thread if not provided
+        :return: seconds waited
+        """
+        if not self.enabled:
+            return 0.
+
+        start = time.monotonic()
+        ticket = (self.current_priority if priority is None else priority, next(self._tickets))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] != ticket:
+                        self._condition.wait()
+                        continue
+                    wait_time = max(self.requests_bucket.get_wait_time(requests) if self.requests_bucket else 0.,
+                                    self.weight_bucket.get_wait_time(weight) if self.weight_bucket else 0.)
+                    if wait_time <= 0.:
+                        break
+                    self._condition.wait(wait_time)
+                if self.requests_bucket:
+                    self.requests_bucket.take(requests)
+                if self.weight_bucket:
+                    self.weight_bucket.take(weight)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+        waited = time.monotonic() - start
+        self.waited += waited
+        return waited
+
+    def throttled(self):
+        """
+        Node is rate limiting the requests, tokens available are removed so next requests wait
+        """
+        if not self.enabled:
+            return
+        with self._condition:
+            logger.warning('Node is throttling requests, waiting for the rate limiter')
+            for bucket in (self.requests_bucket, self.weight_bucket):
+                if bucket:
+                    bucket.empty()
@@ -1,21 +1,24 @@
 from .exceptions import NoBackupException, UnknownBlockReorgException
 from .models import Block
+from .rate_limiter import RequestPriority
 from .utils import remove_0x_head
 from .web3_service import Web3Service, Web3ServiceProvider
 
 
-def check_reorg(daemon_block_number, current_block_number=None, provider=None):
+def check_reorg(daemon_block_number, current_block_number=None, provider=None, web3_service=None):
     """
     Checks if reorgs are happening
     :param daemon_block_number: daemon database block_number
     :param current_block_number: current block_number
     :param provider: optional Web3 provider instance
+    :param web3_service: optional Web3Service instance, reusing its connections. Takes precedence over `provider`
     :return: Tuple (True|False, None|Block number)
     :raise Web3ConnectionException
     :raise UnknownBlockReorg
     :raise NoBackup
     """
-    web3_service = Web3Service(provider=provider) if provider else Web3ServiceProvider()
+    if not web3_service:
+        web3_service = Web3Service(provider=provider) if provider else Web3ServiceProvider()
     current_block_number = current_block_number if current_block_number else web3_service.get_current_block_number()
 
     if current_block_number >= daemon_block_number:
@@ -25,7 +28,10 @@ def check_reorg(daemon_block_number, current_block_number=None, provider=None):
             # check if there was reorg
             for block in blocks:
                 try:
-                    node_block_hash = remove_0x_head(web3_service.get_block(block.block_number)['hash'])
+                    # Reorg checks are needed to follow the head of the chain, they are not delayed by the sync
+                    with web3_service.priority(RequestPriority.HIGH):
+                        node_block_hash = remove_0x_head(web3_service.get_block(block.block_number,
+                                                                              use_cache=False)['hash'])
                 except:
                     raise UnknownBlockReorgException
                 if block.block_hash == node_block_hash:
@@ -54,7 +60,10 @@ def check_reorg(daemon_block_number, current_block_number=None, provider=None):
             # check if there was reorg
             for block in blocks:
                 try:
-                    node_block_hash = remove_0x_head(web3_service.get_block(block.block_number)['hash'])
+                    # Reorg checks are needed to follow the head of the chain, they are not delayed by the sync
+                    with web3_service.priority(RequestPriority.HIGH):
+                        node_block_hash = remove_0x_head(web3_service.get_block(block.block_number,
+                                                                              use_cache=False)['hash'])
                 except:
                     raise UnknownBlockReorgException
                 if block.block_hash == node_block_hash:
@@ -0,0 +1,58 @@
+import concurrent.futures
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls made at the same time from different threads: while a call for a key is in flight,
+    other callers for the same key wait for its result (or exception) instead of repeating it
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def start(self, key: Hashable) -> Tuple[concurrent.futures.Future, bool]:
+        """
+        :return: future for the result of the call and True if caller must do the call (and `finish` it),
+        False if it's already in flight and caller only needs to wait for the future
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return future, True
+
+    def finish(self, key: Hashable, result: Any=None, exception: BaseException=None):
+        """
+        Sets the result (or exception) of a call started with `start`, waking up every waiting caller
+        """
+        with self._lock:
+            future = self._calls.pop(key)
+        if exception is None:
+            future.set_result(result)
+        else:
+            future.set_exception(exception)
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Calls `function` if there's no call in flight for the `key`, waits for the result of that call otherwise
+        """
+        future, is_leader = self.start(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, exception=e)
+            raise
+        self.finish(key, result=result)
+        return result
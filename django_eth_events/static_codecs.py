@@ -0,0 +1,93 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+WORD_SIZE = 32
+ADDRESS_PADDING = bytes(12)
+FALSE_WORD = bytes(WORD_SIZE)
+TRUE_WORD = bytes(WORD_SIZE - 1) + b'\x01'
+
+
+def to_bytes(data) -> bytes:
+    """
+    :param data: hex str (with or without 0x) or bytes
+    :raises ValueError: if it's not valid hex
+    """
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data.startswith('0x') else data)
+    # `HexBytes` slices are `HexBytes`, `decode_abi` returns `bytes`
+    return bytes(data)
+
+
+def decode_address(word: bytes) -> str:
+    """
+    :return: address as `Decoder` normalizes it (lowercase hex without 0x)
+    """
+    if word[:12] != ADDRESS_PADDING:
+        raise ValueError('Padding bytes of address are not empty')
+    return word[12:].hex()
+
+
+def decode_uint256(word: bytes) -> int:
+    return int.from_bytes(word, 'big')
+
+
+def decode_int256(word: bytes) -> int:
+    return int.from_bytes(word, 'big', signed=True)
+
+
+def decode_bool(word: bytes) -> bool:
+    if word == FALSE_WORD:
+        return False
+    elif word == TRUE_WORD:
+        return True
+    raise ValueError('Not valid boolean')
+
+
+def decode_bytes32(word: bytes) -> bytes:
+    return word
+
+
+# Static types are encoded in one word (32 bytes) of the data, in the same order as the params
+STATIC_DECODERS: Dict[str, Callable[[bytes], Any]] = {
+    'address': decode_address,
+    'uint256': decode_uint256,
+    'int256': decode_int256,
+    'bool': decode_bool,
+    'bytes32': decode_bytes32,
+}
+
+
+class StaticDataDecoder:
+    """
+    Decodes `data` of logs whose not indexed params are all of types in `STATIC_DECODERS`, slicing every
+    param from its word instead of using `eth_abi.decode_abi`. Values are returned as `Decoder` returns them
+    after normalizing (addresses without 0x). Data that `decode_abi` would not decode (not enough bytes, not
+    empty padding or not valid booleans) is not decoded, so `decode_abi` can be used to raise its error
+    """
+
+    def __init__(self, data_types: List[str]):
+        self.data_types = data_types
+        self.decoders = [STATIC_DECODERS[data_type] for data_type in data_types]
+        self.size = WORD_SIZE * len(data_types)
+
+    def __call__(self, data) -> Optional[Tuple[Any, ...]]:
+        """
+        :param data: `data` of the log, hex str or bytes
+        :return: decoded values, `None` if data cannot be decoded using the fast path
+        """
+        try:
+            data = to_bytes(data)
+            if len(data) < self.size:
+                return None
+            return tuple(decoder(data[i:i + WORD_SIZE])
+                         for i, decoder in zip(range(0, self.size, WORD_SIZE), self.decoders))
+        except ValueError:
+            return None
+
+
+def get_static_data_decoder(data_types: List[str]) -> Optional[StaticDataDecoder]:
+    """
+    :return: StaticDataDecoder for `data_types`, `None` if any of them is not supported (dynamic types, arrays...)
+    """
+    if all(data_type in STATIC_DECODERS for data_type in data_types):
+        return StaticDataDecoder(data_types)
+    return None
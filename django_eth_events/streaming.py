@@ -0,0 +1,119 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+# Start of the `result` list of a JSON-RPC response
+RESULT_LIST_PATTERN = re.compile(r'"result"\s*:\s*\[')
+# Separators between the items of the list
+SEPARATORS = ' \t\n\r,'
+# Characters changing the nesting depth or the string state of a JSON document
+STRUCTURE_PATTERN = re.compile(rb'[\[\]{}"\\]')
+
+
+def iter_json_rpc_result(chunks: Iterable[bytes], max_buffer_size: int=1 << 16) -> Iterator[Any]:
+    """
+    Parses a JSON-RPC response whose `result` is a list incrementally, yielding every item of the list as soon
+    as it's received, so the whole response (that can be hundreds of MBs for `eth_getLogs`) is never in memory
+    :param chunks: chunks of the http response body
+    :param max_buffer_size: parsed text is removed from the buffer when it's bigger than this size
+    :raises ValueError: if node returns an error, result is not a list or response is not valid json
+    :return: iterator of the items of the `result` list
+    """
+    chunks = iter(chunks)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    buffer = ''
+
+    def read_chunk() -> bool:
+        nonlocal buffer
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += text_decoder.decode(b'', final=True)
+            return False
+        buffer += text_decoder.decode(chunk)
+        return True
+
+    # Find where the result list starts
+    while True:
+        match = RESULT_LIST_PATTERN.search(buffer)
+        if match:
+            position = match.end()
+            break
+        if not read_chunk():
+            # Whole response was read, result is an error or is not a list
+            response = json.loads(buffer)
+            if response.get('error'):
+                raise ValueError(response['error'])
+            elif response.get('result') is None:
+                return
+            raise ValueError('Result of JSON-RPC response is not a list')
+
+    while True:
+        while position < len(buffer) and buffer[position] in SEPARATORS:
+            position += 1
+        if position == len(buffer):
+            if not read_chunk():
+                raise ValueError('Unexpected end of JSON-RPC response')
+            continue
+        elif buffer[position] == ']':
+            return
+
+        try:
+            item, end = json_decoder.raw_decode(buffer, position)
+        except ValueError:
+            # Item is not complete yet
+            if not read_chunk():
+                raise
+            continue
+
+        # A number at the end of the buffer could be incomplete
+        if end == len(buffer) and read_chunk():
+            continue
+
+        yield item
+        position = end
+        if position > max_buffer_size:
+            buffer = buffer[position:]
+            position = 0
+
+
+class JsonDocumentScanner:
+    """
+    Tracks the nesting depth of a JSON document (object or list) received in chunks, so it's only decoded once
+    when it's complete. Every chunk is scanned only once, visiting only brackets, quotes and backslashes
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        # Next chunk starts with an escaped character
+        self.escaped_start = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        :param chunk: next chunk of the document
+        :return: True if document is complete with this chunk
+        """
+        escaped_position = 0 if self.escaped_start else None
+        self.escaped_start = False
+        for match in STRUCTURE_PATTERN.finditer(chunk):
+            position = match.start()
+            if position == escaped_position:
+                continue
+            char = chunk[position:position + 1]
+            if self.in_string:
+                if char == b'\\':
+                    escaped_position = position + 1
+                elif char == b'"':
+                    self.in_string = False
+            elif char == b'"':
+                self.in_string = True
+            elif char in b'[{':
+                self.depth += 1
+            elif char in b']}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        self.escaped_start = escaped_position == len(chunk)
+        return False
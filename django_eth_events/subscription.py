@@ -0,0 +1,193 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .json_codec import json_codec
+
+logger = logging.getLogger(__name__)
+
+
+class NodeSubscription:
+    """
+    `eth_subscribe` subscriptions to `newHeads` and, optionally, `logs` using a websocket connection
+    """
+
+    def __init__(self, endpoint_uri: str, logs_filter: Optional[Dict[str, Any]]=None,
+                 websocket_kwargs: Optional[Dict[str, Any]]=None):
+        """
+        :param endpoint_uri: ws/s uri of the node
+        :param logs_filter: `eth_subscribe` logs filter (`address` and `topics`). If `None`, logs are not subscribed
+        :param websocket_kwargs: Parameters for `websockets.connect`
+        """
+        self.endpoint_uri = endpoint_uri
+        self.logs_filter = logs_filter
+        self.websocket_kwargs = websocket_kwargs or {}
+        self.connection = None
+        # Subscription id -> kind of subscription (`newHeads` or `logs`)
+        self.subscriptions: Dict[str, str] = {}
+        self._request_ids = itertools.count(1)
+
+    async def connect(self):
+        import websockets
+        self.connection = await websockets.connect(self.endpoint_uri, **self.websocket_kwargs)
+        await self.subscribe('newHeads')
+        if self.logs_filter is not None:
+            await self.subscribe('logs', self.logs_filter)
+
+    async def subscribe(self, kind: str, *params) -> str:
+        """
+        :param kind: `newHeads` or `logs`
+        :raises ValueError: if node refuses the subscription
+        :return: subscription id
+        """
+        request_id = next(self._request_ids)
+        await self.connection.send(json_codec.dumps({'jsonrpc': '2.0',
+                                                     'method': 'eth_subscribe',
+                                                     'params': [kind] + list(params),
+                                                     'id': request_id}))
+        while True:
+            # Notifications of previous subscriptions received before the response are ignored
+            message = json_codec.loads(await self.connection.recv())
+            if message.get('id') == request_id:
+                break
+        if message.get('error') or not message.get('result'):
+            raise ValueError('Node refused subscription to %s: %s' % (kind, message.get('error')))
+        self.subscriptions[message['result']] = kind
+        return message['result']
+
+    async def next_notification(self) -> Tuple[str, Any]:
+        """
+        :return: kind of subscription (`newHeads` or `logs`) and new header or log, as returned by the node
+        """
+        while True:
+            message = json_codec.loads(await self.connection.recv())
+            params = message.get('params') or {}
+            kind = self.subscriptions.get(params.get('subscription'))
+            if message.get('method') == 'eth_subscription' and kind:
+                return kind, params.get('result')
+
+    async def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            await connection.close()
+
+
+class SubscriptionListener:
+    """
+    Follows the head of the chain using a websocket subscription. Every new header (or log) received calls
+    `process` (by default, the `event_listener` task), so events are processed as soon as blocks are mined instead
+    of waiting for the next celery beat. Notifications received while processing are merged in one call.
+    If websocket connection drops, `process` is called every `poll_interval` seconds while reconnecting
+    """
+
+    def __init__(self, endpoint_uri: str, process: Optional[Callable[[], Any]]=None,
+                 logs_filter: Optional[Dict[str, Any]]=None, poll_interval: float=15.,
+                 reconnect_interval: float=5., websocket_kwargs: Optional[Dict[str, Any]]=None):
+        """
+        :param endpoint_uri: ws/s uri of the node
+        :param process: Function called for new blocks. `event_listener` task if not provided
+        :param logs_filter: If provided, logs matching the filter are also subscribed
+        :param poll_interval: Seconds without notifications to call `process` anyway (polling), in case
+        the connection is dropped or a notification is lost
+        :param reconnect_interval: Seconds to wait before reconnecting
+        :param websocket_kwargs: Parameters for `websockets.connect`
+        """
+        if process is None:
+            from .tasks import event_listener
+            process = event_listener
+        self.endpoint_uri = endpoint_uri
+        self.process = process
+        self.logs_filter = logs_filter
+        self.poll_interval = poll_interval
+        self.reconnect_interval = reconnect_interval
+        self.websocket_kwargs = websocket_kwargs
+        self.connected = False
+        self.head_block_number = None
+        self.processed = 0
+        self._loop = None
+        self._stopped = None
+        # Processing is synchronous (database and node requests), it runs in its own thread
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def run(self):
+        """
+        Follows the chain until `stop` is called
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.run_async())
+        finally:
+            self._loop = None
+            loop.close()
+
+    def stop(self):
+        """
+        Stops the listener. Can be called from any thread
+        """
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def run_async(self):
+        self._loop = asyncio.get_event_loop()
+        self._stopped = asyncio.Event()
+        new_block = asyncio.Event()
+        follower = asyncio.ensure_future(self.follow_subscription(new_block))
+        stopped = asyncio.ensure_future(self._stopped.wait())
+        try:
+            while not self._stopped.is_set():
+                new_block_waiter = asyncio.ensure_future(new_block.wait())
+                await asyncio.wait([new_block_waiter, stopped], timeout=self.poll_interval,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                new_block_waiter.cancel()
+                if self._stopped.is_set():
+                    break
+                if not new_block.is_set():
+                    logger.debug('No new blocks notified in %.1f seconds, polling', self.poll_interval)
+                new_block.clear()
+                await self._loop.run_in_executor(self._executor, self._process)
+        finally:
+            stopped.cancel()
+            follower.cancel()
+            await asyncio.wait([follower])
+
+    def _process(self):
+        try:
+            self.process()
+        except Exception:
+            logger.error('Error processing new blocks', exc_info=True)
+        self.processed += 1
+
+    async def follow_subscription(self, new_block: asyncio.Event):
+        """
+        Sets `new_block` for every notification received. Reconnects if connection drops
+        """
+        while True:
+            subscription = NodeSubscription(self.endpoint_uri, logs_filter=self.logs_filter,
+                                            websocket_kwargs=self.websocket_kwargs)
+            try:
+                await subscription.connect()
+                self.connected = True
+                logger.info('Subscribed to new blocks of %s', self.endpoint_uri)
+                # Blocks could be mined while not connected
+                new_block.set()
+                while True:
+                    kind, result = await subscription.next_notification()
+                    if kind == 'newHeads':
+                        self.head_block_number = int(result['number'], 16)
+                        logger.debug('New head block-number=%d', self.head_block_number)
+                    new_block.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning('Subscription to %s failed, polling every %.1f seconds until reconnection: %s',
+                               self.endpoint_uri, self.poll_interval, e)
+            finally:
+                self.connected = False
+                try:
+                    await subscription.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.reconnect_interval)
+
@@ -0,0 +1,422 @@
+import asyncio
+import gzip
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from json import JSONDecodeError, dumps, loads
+
+
+def to_hex(value: int) -> str:
+    return '0x{:x}'.format(value)
+
+
+def fake_hash(prefix: int, number: int) -> str:
+    return '0x{:02x}{:062x}'.format(prefix, number)
+
+
+def fake_address(number: int) -> str:
+    return '0x{:040x}'.format(number + 1)
+
+
+class FakeNode:
+    """
+    In-memory chain answering the subset of JSON-RPC used by Web3Service. Every request received is stored
+    in `requests` and every payload (socket write or http post) is counted in `payloads`
+    """
+
+    event_topic = '0x' + 'ab' * 32
+
+    def __init__(self, blocks=10, txs_per_block=2):
+        # Filters with more addresses will be refused
+        self.max_addresses_per_filter = None
+        # Batches with more requests will be refused (HTTP 413 using http)
+        self.max_batch_size = None
+        # Filters returning more logs will be refused
+        self.max_logs_per_request = None
+        # Logs are only indexed up to this block, filters for later blocks will be refused (like nodes still
+        # building the logs index). `None` for every block
+        self.logs_indexed_to_block = None
+        # Number of next payloads rejected with HTTP 429 using http
+        self.rate_limited_payloads = 0
+        # Gzip compressed requests are accepted (HTTP 415 if not) and responses are compressed using http
+        self.compressed_requests = True
+        self.compressed_responses = False
+        # Number of compressed requests received
+        self.compressed_payloads = 0
+        # Methods returning every receipt of a block (`eth_getBlockReceipts`, `parity_getBlockReceipts`)
+        self.block_receipts_methods = ()
+        # Seconds to wait before answering every payload
+        self.delay = 0
+        # (method, first param) -> (times to fail, drop response instead of returning an error)
+        self.failures = {}
+        self.blocks = {}
+        self.receipts = {}
+        self.requests = []
+        self.payloads = 0
+        self.lock = threading.Lock()
+
+        for block_number in range(blocks):
+            block_hash = fake_hash(0xb0, block_number)
+            tx_hashes = []
+            for tx_index in range(txs_per_block):
+                tx_hash = fake_hash(0x70, block_number * 1000 + tx_index)
+                tx_hashes.append(tx_hash)
+                self.receipts[tx_hash] = {
+                    'transactionHash': tx_hash,
+                    'transactionIndex': to_hex(tx_index),
+                    'blockHash': block_hash,
+                    'blockNumber': to_hex(block_number),
+                    'logs': [{
+                        'address': fake_address(tx_index),
+                        'topics': [self.event_topic],
+                        'data': '0x',
+                        'blockNumber': to_hex(block_number),
+                        'blockHash': block_hash,
+                        'transactionHash': tx_hash,
+                        'transactionIndex': to_hex(tx_index),
+                        'logIndex': to_hex(tx_index),
+                        'removed': False,
+                    }]
+                }
+            self.blocks[block_number] = {
+                'number': to_hex(block_number),
+                'hash': block_hash,
+                'parentHash': fake_hash(0xb0, block_number - 1) if block_number else '0x' + '0' * 64,
+                'timestamp': to_hex(1500000000 + block_number * 15),
+                'transactions': tx_hashes,
+            }
+
+    @property
+    def block_number(self) -> int:
+        return max(self.blocks)
+
+    def get_logs(self, from_block: int, to_block: int, addresses=None, topics=None):
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if addresses is not None:
+            addresses = {address.lower() for address in addresses}
+        logs = []
+        for block_number in range(from_block, to_block + 1):
+            block = self.blocks.get(block_number)
+            if block:
+                for tx_hash in block['transactions']:
+                    logs.extend(log for log in self.receipts[tx_hash]['logs']
+                                if (addresses is None or log['address'] in addresses) and
+                                (not topics or not topics[0] or log['topics'][0] in topics[0]))
+        return logs
+
+    def call(self, method, params):
+        if method == 'net_version':
+            return '1'
+        elif method == 'eth_blockNumber':
+            return to_hex(self.block_number)
+        elif method == 'eth_getBlockByNumber':
+            block_identifier = params[0]
+            block_number = self.block_number if block_identifier == 'latest' else int(block_identifier, 16)
+            return self.blocks.get(block_number)
+        elif method == 'eth_getBlockByHash':
+            return next((block for block in self.blocks.values() if block['hash'] == params[0]), None)
+        elif method == 'eth_getTransactionReceipt':
+            return self.receipts.get(params[0])
+        elif method in self.block_receipts_methods:
+            block = self.blocks.get(int(params[0], 16))
+            return [self.receipts[tx_hash] for tx_hash in block['transactions']] if block else None
+        elif method == 'eth_getLogs':
+            logs_filter = params[0]
+            addresses = logs_filter.get('address')
+            if self.max_addresses_per_filter and isinstance(addresses, list) and \
+                    len(addresses) > self.max_addresses_per_filter:
+                raise ValueError('too many addresses')
+            from_block, to_block = int(logs_filter['fromBlock'], 16), int(logs_filter['toBlock'], 16)
+            if self.logs_indexed_to_block is not None and to_block > self.logs_indexed_to_block:
+                raise ValueError('logs not indexed after block %d' % self.logs_indexed_to_block)
+            logs = self.get_logs(from_block, to_block, addresses=addresses, topics=logs_filter.get('topics'))
+            if self.max_logs_per_request and len(logs) > self.max_logs_per_request:
+                raise ValueError('query returned more than %d results' % self.max_logs_per_request)
+            return logs
+        raise NotImplementedError(method)
+
+    def fail(self, method, param, times=1, drop=False):
+        """
+        Next `times` requests for `method` with `param` as first param will fail
+        """
+        self.failures[(method, param)] = (times, drop)
+
+    def handle(self, request):
+        with self.lock:
+            self.requests.append(request)
+            params = request.get('params') or [None]
+            failure_key = (request['method'], params[0] if isinstance(params[0], str) else None)
+            times, drop = self.failures.get(failure_key, (0, False))
+            if times:
+                self.failures[failure_key] = (times - 1, drop)
+                if drop:
+                    return None
+                return {'jsonrpc': '2.0', 'id': request.get('id'),
+                        'error': {'code': -32000, 'message': 'Temporary failure'}}
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            response['result'] = self.call(request['method'], request.get('params', []))
+        except NotImplementedError:
+            response['error'] = {'code': -32601, 'message': 'Method not found'}
+        except ValueError as e:
+            response['error'] = {'code': -32005, 'message': str(e)}
+        return response
+
+    def handle_payload(self, payload):
+        with self.lock:
+            self.payloads += 1
+        if self.delay:
+            time.sleep(self.delay)
+        rpc_request = loads(payload)
+        if isinstance(rpc_request, list):
+            responses = [self.handle(request) for request in rpc_request]
+            return dumps([response for response in responses if response is not None]).encode()
+        return dumps(self.handle(rpc_request)).encode()
+
+    def methods_requested(self, method):
+        return [request for request in self.requests if request['method'] == method]
+
+
+class ThreadingServerMixIn(socketserver.ThreadingMixIn):
+    """
+    Handles every connection in a daemon thread. Open connections (like keep-alive ones) are closed with
+    the server, so clients cannot keep using a stopped node
+    """
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        self.open_requests = set()
+        self.open_requests_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        with self.open_requests_lock:
+            self.open_requests.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.open_requests_lock:
+            self.open_requests.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        # Handler threads see the connection closed and close the socket
+        with self.open_requests_lock:
+            for request in self.open_requests:
+                try:
+                    request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        super().server_close()
+
+
+class FakeNodeServer:
+    """
+    Serves a FakeNode in a daemon thread. Use as a context manager
+    """
+    def __init__(self, node: FakeNode):
+        self.node = node
+        self.server = None
+
+    @property
+    def uri(self) -> str:
+        raise NotImplementedError
+
+    def build_server(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.server = self.build_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeHTTPNodeServer(FakeNodeServer):
+    def build_server(self):
+        node = self.node
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                content_len = int(self.headers.get('content-length', 0))
+                payload = self.rfile.read(content_len)
+                rate_limited = False
+                with node.lock:
+                    if node.rate_limited_payloads:
+                        node.rate_limited_payloads -= 1
+                        node.payloads += 1
+                        rate_limited = True
+                if rate_limited:
+                    self.send_response(429)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if self.headers.get('content-encoding') == 'gzip':
+                    if not node.compressed_requests:
+                        self.send_response(415)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    with node.lock:
+                        node.compressed_payloads += 1
+                    payload = gzip.decompress(payload)
+                if node.max_batch_size and len(loads(payload)) > node.max_batch_size:
+                    with node.lock:
+                        node.payloads += 1
+                    self.send_response(413)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = node.handle_payload(payload)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if node.compressed_responses and 'gzip' in self.headers.get('accept-encoding', ''):
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class ThreadedHTTPServer(ThreadingServerMixIn, HTTPServer):
+            pass
+
+        return ThreadedHTTPServer(('127.0.0.1', 0), Handler)
+
+    @property
+    def uri(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+
+class FakeIPCNodeServer(FakeNodeServer):
+    def __init__(self, node: FakeNode):
+        super().__init__(node)
+        self.ipc_path = os.path.join(tempfile.mkdtemp(), 'fake-node.ipc')
+        self.connections = 0
+
+    def build_server(self):
+        node = self.node
+        fake_server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                fake_server.connections += 1
+                buffer = b''
+                while True:
+                    chunk = self.request.recv(4096)
+                    if not chunk:
+                        return
+                    buffer += chunk
+                    try:
+                        loads(buffer)
+                    except (JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    self.request.sendall(node.handle_payload(buffer))
+                    buffer = b''
+
+        class ThreadedUnixServer(ThreadingServerMixIn, socketserver.UnixStreamServer):
+            pass
+
+        return ThreadedUnixServer(self.ipc_path, Handler)
+
+    @property
+    def uri(self) -> str:
+        return 'ipc://' + self.ipc_path
+
+    def __exit__(self, *args):
+        super().__exit__(*args)
+        os.remove(self.ipc_path)
+
+
+class FakeWebsocketNodeServer(FakeNodeServer):
+    """
+    Websocket node supporting `eth_subscribe`. Use `mine_block` to notify subscribers and `drop_connections`
+    to close every connection
+    """
+    def __init__(self, node: FakeNode):
+        super().__init__(node)
+        self.loop = None
+        self.connections = set()
+        self.subscriptions = {}
+
+    def build_server(self):
+        import websockets
+        node = self.node
+        fake_server = self
+
+        async def handler(websocket, path):
+            fake_server.connections.add(websocket)
+            try:
+                async for payload in websocket:
+                    request = loads(payload)
+                    if request.get('method') == 'eth_subscribe':
+                        with node.lock:
+                            node.requests.append(request)
+                        subscription_id = to_hex(len(fake_server.subscriptions) + 1)
+                        fake_server.subscriptions[subscription_id] = (websocket, request['params'][0])
+                        await websocket.send(dumps({'jsonrpc': '2.0', 'id': request['id'],
+                                                    'result': subscription_id}))
+                    else:
+                        await websocket.send(node.handle_payload(payload).decode())
+            except websockets.ConnectionClosed:
+                pass
+            finally:
+                fake_server.connections.discard(websocket)
+
+        self.loop = asyncio.new_event_loop()
+        server = self.loop.run_until_complete(websockets.serve(handler, '127.0.0.1', 0, loop=self.loop))
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return server
+
+    def __enter__(self):
+        self.server = self.build_server()
+        return self
+
+    def __exit__(self, *args):
+        async def close_server():
+            self.server.close()
+            await self.server.wait_closed()
+
+        self.drop_connections()
+        asyncio.run_coroutine_threadsafe(close_server(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def mine_block(self):
+        """
+        Adds a block without transactions and notifies the `newHeads` subscribers
+        """
+        block_number = self.node.block_number + 1
+        self.node.blocks[block_number] = {
+            'number': to_hex(block_number),
+            'hash': fake_hash(0xb0, block_number),
+            'parentHash': fake_hash(0xb0, block_number - 1),
+            'timestamp': to_hex(1500000000 + block_number * 15),
+            'transactions': [],
+        }
+        for subscription_id, (websocket, kind) in list(self.subscriptions.items()):
+            if kind == 'newHeads':
+                notification = dumps({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                                      'params': {'subscription': subscription_id,
+                                                 'result': self.node.blocks[block_number]}})
+                asyncio.run_coroutine_threadsafe(websocket.send(notification), self.loop).result(5)
+
+    def drop_connections(self):
+        self.subscriptions.clear()
+        for websocket in list(self.connections):
+            asyncio.run_coroutine_threadsafe(websocket.close(), self.loop).result(5)
+
+    @property
+    def uri(self) -> str:
+        return 'ws://127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
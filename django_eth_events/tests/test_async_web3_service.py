@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from unittest import skipIf
+
+from django.test import TestCase, TransactionTestCase
+from web3 import HTTPProvider, Web3
+
+from ..async_web3_service import AsyncWeb3Service, aiohttp
+from ..event_listener import EventListener
+from ..exceptions import UnknownBlock, UnknownTransaction, Web3ConnectionException
+from ..factories import DaemonFactory
+from ..models import Block, Daemon
+from .fake_node import FakeHTTPNodeServer, FakeNode, fake_address
+
+
+class AsyncFakeNodeMixin:
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.node = FakeNode(blocks=10, txs_per_block=3)
+        self.server = FakeHTTPNodeServer(self.node).__enter__()
+        self.async_web3_service = AsyncWeb3Service(self.server.uri, max_in_flight_requests=4, max_batch_requests=4)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.async_web3_service.close())
+        self.loop.close()
+        self.server.__exit__()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+
+@skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncWeb3Service(AsyncFakeNodeMixin, TestCase):
+
+    def test_get_blocks(self):
+        self.assertEqual(9, self.run_async(self.async_web3_service.get_current_block_number()))
+        block = self.run_async(self.async_web3_service.get_block(3))
+        self.assertEqual(3, block['number'])
+        self.assertEqual(self.node.blocks[3]['hash'], block['hash'])
+
+        self.node.payloads = 0
+        blocks = self.run_async(self.async_web3_service.get_blocks(range(10)))
+        self.assertEqual(list(range(10)), sorted(blocks))
+        self.assertEqual(3, self.node.payloads)  # 4 + 4 + 2
+
+        with self.assertRaises(UnknownBlock):
+            self.run_async(self.async_web3_service.get_block(10))
+        with self.assertRaises(UnknownBlock):
+            self.run_async(self.async_web3_service.get_blocks([8, 9, 10]))
+
+    def test_get_receipts_and_logs(self):
+        blocks = self.run_async(self.async_web3_service.get_blocks(range(1, 5)))
+        tx_hashes = blocks[2]['transactions']
+        tx_with_receipt = self.run_async(self.async_web3_service.get_transaction_receipts(tx_hashes))
+        self.assertEqual(set(tx_hashes), set(tx_with_receipt))
+        with self.assertRaises(UnknownTransaction):
+            self.run_async(self.async_web3_service.get_transaction_receipt('0x' + '00' * 32))
+
+        block_number_with_logs = self.run_async(self.async_web3_service.get_logs_for_blocks(blocks.values()))
+        self.assertEqual([1, 2, 3, 4], sorted(block_number_with_logs))
+        log = block_number_with_logs[2][1]
+        self.assertEqual(2, log['blockNumber'])
+        self.assertEqual(1, log['logIndex'])
+        self.assertEqual(Web3.toChecksumAddress(fake_address(1)), log['address'])
+
+        block_number_with_logs_range = self.run_async(self.async_web3_service.get_logs_for_block_range(1, 4))
+        self.assertEqual(block_number_with_logs, block_number_with_logs_range)
+
+        block_number_with_logs = self.run_async(self.async_web3_service.get_logs_for_block_range(
+            1, 4, addresses=[Web3.toChecksumAddress(fake_address(i)) for i in range(3)],
+            topics=[FakeNode.event_topic], max_addresses_per_filter=2))
+        self.assertEqual(block_number_with_logs_range, block_number_with_logs)
+        self.assertEqual(2, len(self.node.methods_requested('eth_getLogs')) - 1)
+
+        logs = self.run_async(self.async_web3_service.get_logs_for_event_using_filter(1, 4, FakeNode.event_topic))
+        self.assertEqual(12, len(logs))
+
+    def test_connection_error(self):
+        async_web3_service = AsyncWeb3Service('http://127.0.0.1:1')
+        with self.assertRaises(Web3ConnectionException):
+            self.run_async(async_web3_service.get_current_block_number())
+        self.run_async(async_web3_service.close())
+
+        # Not 2xx status
+        self.node.rate_limited_payloads = 1
+        with self.assertRaises(Web3ConnectionException):
+            self.run_async(self.async_web3_service.get_current_block_number())
+
+        # Request of a batch without response
+        self.node.fail('eth_getBlockByNumber', '0x3', drop=True)
+        with self.assertRaises(Web3ConnectionException):
+            self.run_async(self.async_web3_service.get_blocks(range(5)))
+
+
+# Blocking calls of `execute_async` use the database from another thread, so data must be committed
+@skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncEventListener(AsyncFakeNodeMixin, TransactionTestCase):
+
+    def tearDown(self):
+        super().tearDown()
+        EventListener.instance = None
+
+    def test_execute_async(self):
+        DaemonFactory()
+        event_listener = EventListener(provider=HTTPProvider(self.server.uri))
+
+        # Blocking calls are not run by the event loop thread
+        threads = []
+        get_block_numbers_to_process = event_listener.get_block_numbers_to_process
+        event_listener.get_block_numbers_to_process = lambda *args: (threads.append(threading.current_thread()) or
+                                                                     get_block_numbers_to_process(*args))
+
+        # Blocks are processed in one transaction
+        process_block = event_listener.process_block
+
+        def failing_process_block(daemon, current_block, *args):
+            if current_block['number'] == 9:
+                raise ValueError('Processing failed')
+            return process_block(daemon, current_block, *args)
+
+        event_listener.process_block = failing_process_block
+        with self.assertRaises(ValueError):
+            self.run_async(event_listener.execute_async(self.async_web3_service))
+        self.assertEqual(0, Daemon.get_solo().block_number)
+        self.assertEqual(0, Block.objects.count())
+
+        event_listener.process_block = process_block
+        self.run_async(event_listener.execute_async(self.async_web3_service))
+        self.assertEqual(9, Daemon.get_solo().block_number)
+        self.assertEqual(9, Block.objects.count())
+        self.assertEqual(2, len(threads))
+        self.assertNotIn(threading.current_thread(), threads)
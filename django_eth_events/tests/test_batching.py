@@ -0,0 +1,52 @@
+from django.test import TestCase
+
+from ..batching import AdaptiveBatchSize
+
+
+class TestAdaptiveBatchSize(TestCase):
+
+    def test_grow_while_throughput_improves(self):
+        batch_size = AdaptiveBatchSize(10, max_size=40)
+        self.assertEqual(15, batch_size.record_success(10, 1.))
+        self.assertEqual(23, batch_size.record_success(15, 1.))
+        # Throughput doesn't improve, go back to best size
+        self.assertEqual(15, batch_size.record_success(23, 1.6))
+        # Smaller batches are ignored
+        self.assertEqual(15, batch_size.record_success(3, 10.))
+        # Never bigger than max size
+        for _ in range(10):
+            batch_size.record_success(batch_size.size, 1.)
+        self.assertEqual(40, batch_size.size)
+
+    def test_shrink_on_failure(self):
+        batch_size = AdaptiveBatchSize(100, min_size=2, recovery_batches=3)
+        self.assertEqual(50, batch_size.record_failure())
+        self.assertEqual(25, batch_size.record_failure(50))
+        self.assertEqual(2, batch_size.record_failure(3))
+        self.assertEqual(2, batch_size.record_failure())
+
+        # Rejected sizes are not tried until `recovery_batches` succeed
+        batch_size = AdaptiveBatchSize(10, recovery_batches=3)
+        batch_size.record_failure(12)
+        self.assertEqual(6, batch_size.size)
+        self.assertEqual(9, batch_size.record_success(6, 1.))
+        self.assertEqual(11, batch_size.record_success(9, 1.))
+        self.assertEqual(17, batch_size.record_success(11, 1.))
+
+    def test_shrink_on_big_responses(self):
+        batch_size = AdaptiveBatchSize(10, max_response_size=1000)
+        self.assertEqual(15, batch_size.record_success(10, 1., response_size=900))
+        self.assertEqual(7, batch_size.record_success(15, 1., response_size=1500))
+
+    def test_concurrent_batches(self):
+        batch_size = AdaptiveBatchSize(10)
+        # 2 batches of 10 sent at the same time are rejected, size is only shrunk once
+        self.assertEqual(5, batch_size.record_failure(10))
+        self.assertEqual(5, batch_size.record_failure(10))
+        self.assertEqual(9, batch_size.ceiling)
+        # A batch sent before the size was shrunk does not make it grow
+        self.assertEqual(5, batch_size.record_success(10, 1.))
+        self.assertEqual(8, batch_size.record_success(5, 1.))
+        # Neither does a batch rejected before the size was shrunk again
+        self.assertEqual(4, batch_size.record_failure(8))
+        self.assertEqual(4, batch_size.record_failure(10))
@@ -0,0 +1,90 @@
+from django.test import TestCase
+from hexbytes import HexBytes
+
+from ..block_cache import BlockCache
+
+
+def build_block(number: int, chain: str='a'):
+    return {'number': number,
+            'hash': '0x{}{:063x}'.format(chain, number),
+            'parentHash': '0x{}{:063x}'.format(chain, number - 1)}
+
+
+class TestBlockCache(TestCase):
+
+    def test_get_and_put(self):
+        block_cache = BlockCache(max_size=3, finality_depth=10)
+        for number in range(5):
+            block_cache.put(build_block(number))
+        # Least recently used are evicted
+        self.assertEqual(3, len(block_cache))
+        self.assertIsNone(block_cache.get(1))
+        self.assertEqual(build_block(2), block_cache.get(2))
+        block_cache.put(build_block(5))
+        self.assertIsNotNone(block_cache.get(2))
+        self.assertIsNone(block_cache.get(3))
+
+        # By hash, `HexBytes` and hex strings with or without 0x
+        self.assertEqual(4, block_cache.get_by_hash(HexBytes(build_block(4)['hash']))['number'])
+        self.assertEqual(4, block_cache.get_by_hash(build_block(4)['hash'][2:])['number'])
+        self.assertIsNone(block_cache.get_by_hash(build_block(4, chain='b')['hash']))
+
+        # Blocks without number (e.g. pending) are not stored
+        block_cache.put({'number': None, 'hash': None})
+        self.assertEqual(3, len(block_cache))
+
+        disabled_block_cache = BlockCache(max_size=0)
+        disabled_block_cache.put(build_block(1))
+        self.assertEqual(0, len(disabled_block_cache))
+
+    def test_finality_depth(self):
+        block_cache = BlockCache(max_size=100, finality_depth=5)
+        for number in range(20):
+            block_cache.put(build_block(number))
+        self.assertEqual(list(range(14, 20)), sorted(number for number in range(20) if block_cache.get(number)))
+        # Old blocks are not stored
+        block_cache.put(build_block(3))
+        self.assertIsNone(block_cache.get(3))
+
+    def test_reorgs(self):
+        block_cache = BlockCache(max_size=100, finality_depth=50)
+        for number in range(10):
+            block_cache.put(build_block(number))
+
+        # Block 7 changed, so 7, 8 and 9 belong to the old chain
+        block_cache.put(dict(build_block(7, chain='b'), parentHash=build_block(6)['hash']))
+        self.assertEqual(build_block(7, chain='b')['hash'], block_cache.get(7)['hash'])
+        self.assertIsNone(block_cache.get(8))
+        self.assertIsNone(block_cache.get_by_hash(build_block(9)['hash']))
+
+        # Block 5 not linked to cached block 4
+        block_cache.put(build_block(5, chain='c'))
+        self.assertIsNone(block_cache.get(4))
+        self.assertIsNotNone(block_cache.get(5))
+        for number in range(6, 10):
+            block_cache.put(build_block(number, chain='c'))
+
+        # Rollback
+        block_cache.invalidate(8)
+        self.assertEqual([5, 6, 7], sorted(number for number in range(10) if block_cache.get(number)))
+        block_cache.clear()
+        self.assertEqual(0, len(block_cache))
+
+    def test_update_head(self):
+        block_cache = BlockCache(max_size=100, finality_depth=50)
+        for number in range(10):
+            block_cache.put(build_block(number))
+        block_cache.update_head(12)
+        self.assertEqual(10, len(block_cache))
+
+        # Node was resynced, blocks above its head are from other chain
+        block_cache.update_head(6)
+        self.assertEqual(list(range(7)), sorted(number for number in range(10) if block_cache.get(number)))
+        self.assertEqual(6, block_cache.head_block_number)
+
+    def test_formatter(self):
+        block_cache = BlockCache(formatter=lambda block: dict(block, hash=HexBytes(block['hash'])))
+        block = block_cache.put(build_block(1))
+        self.assertEqual(HexBytes(build_block(1)['hash']), block['hash'])
+        self.assertIs(block, block_cache.get(1))
+        self.assertIs(block, block_cache.get_by_hash(build_block(1)['hash']))
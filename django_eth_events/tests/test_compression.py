@@ -0,0 +1,54 @@
+import gzip
+import zlib
+
+from django.test import TestCase
+
+from ..compression import RequestCompression, compress, is_compression_rejected
+
+
+class TestCompression(TestCase):
+
+    def test_compress(self):
+        data = b'{"jsonrpc": "2.0", "method": "eth_getBlockByNumber", "params": ["0x1", false], "id": 1}' * 20
+        for encoding, decompress in (('gzip', gzip.decompress), ('deflate', zlib.decompress)):
+            compressed = compress(data, encoding)
+            self.assertLess(len(compressed), len(data))
+            self.assertEqual(data, decompress(compressed))
+        with self.assertRaises(ValueError):
+            compress(data, 'br')
+
+    def test_is_compression_rejected(self):
+        self.assertTrue(is_compression_rejected(415, b''))
+        self.assertTrue(is_compression_rejected(200, b'{"jsonrpc":"2.0","id":null,'
+                                                     b'"error":{"code":-32700,"message":"parse error"}}'))
+        self.assertFalse(is_compression_rejected(200, b'[{"jsonrpc":"2.0","id":1,"result":"0x1"}]'))
+        self.assertFalse(is_compression_rejected(429, b''))
+
+    def test_request_compression(self):
+        request_compression = RequestCompression(min_size=100)
+        small_data = b'[]'
+        data = b'[' + b'{"method": "eth_getBlockByNumber"},' * 20 + b'{}]'
+
+        body, headers = request_compression.encode(small_data)
+        self.assertEqual(small_data, body)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertIn('gzip', headers['Accept-Encoding'])
+
+        body, headers = request_compression.encode(data)
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertEqual(data, gzip.decompress(body))
+        self.assertLess(request_compression.compressed_bytes, request_compression.bytes)
+
+        # Node doesn't support compressed requests
+        self.assertTrue(request_compression.rejected())
+        self.assertFalse(request_compression.enabled)
+        body, headers = request_compression.encode(data)
+        self.assertEqual(data, body)
+        self.assertNotIn('Content-Encoding', headers)
+
+        # Not negotiated, compression is never disabled
+        request_compression = RequestCompression('deflate')
+        self.assertFalse(request_compression.rejected())
+        self.assertTrue(request_compression.enabled)
+        with self.assertRaises(ValueError):
+            RequestCompression('br')
@@ -4,7 +4,8 @@ from json import loads
 from django.test import TestCase
 from hexbytes import HexBytes
 
-from ..decoder import Decoder
+from ..columnar import numpy
+from ..decoder import Decoder, LazyDecodedEvent
 
 
 class TestDecoder(TestCase):
@@ -75,6 +76,135 @@ class TestDecoder(TestCase):
             decoded
         )
 
+    def test_decode_plans(self):
+        self.decoder.add_abi(self.test_abi)
+        # Only events have a decode plan
+        self.assertEqual(1, len(self.decoder.decode_plans))
+        decode_plan = list(self.decoder.decode_plans.values())[0]
+        self.assertEqual('ContractInstantiation', decode_plan.name)
+        self.assertEqual(['address', 'address'], decode_plan.data_types)
+        self.assertEqual([('sender', False, 0), ('instantiation', False, 1)],
+                         [param[:3] for param in decode_plan.params])
+
+        transfer_abi = [{'anonymous': False, 'name': 'Transfer', 'type': 'event',
+                         'inputs': [{'indexed': True, 'name': 'from', 'type': 'address'},
+                                    {'indexed': False, 'name': 'owners', 'type': 'address[]'},
+                                    {'indexed': True, 'name': 'to', 'type': 'address'},
+                                    {'indexed': False, 'name': 'value', 'type': 'uint256'}]}]
+        self.decoder.add_abi(transfer_abi)
+        topic = '0x' + self.decoder.get_method_id(transfer_abi[0])
+        log = {
+            'address': '0xa6d9c5f7d4de3cef51ad3b7235d79ccc95114de5',
+            'transactionHash': '0x54041b3ce0976ee17212100f42b3793fa4ee5f869a6d107249a75caa5fc1b8aa',
+            'topics': [topic,
+                       '0x00000000000000000000000065039084cc6f4773291a6ed7dcf5bc3a2e894ff3',
+                       '0x00000000000000000000000017e054b16ca658789c927c854976450adbda7df0'],
+            'data': '0x' + '{:064x}'.format(64) + '{:064x}'.format(10 ** 18) + '{:064x}'.format(1) +
+                    '000000000000000000000000a6d9c5f7d4de3cef51ad3b7235d79ccc95114de5',
+        }
+        self.assertEqual([{'name': 'from', 'value': '65039084cc6f4773291a6ed7dcf5bc3a2e894ff3'},
+                          {'name': 'owners', 'value': ['a6d9c5f7d4de3cef51ad3b7235d79ccc95114de5']},
+                          {'name': 'to', 'value': '17e054b16ca658789c927c854976450adbda7df0'},
+                          {'name': 'value', 'value': 10 ** 18}],
+                         self.decoder.decode_log(log)['params'])
+
+        # Topics of functions are not decoded
+        function_log = dict(log, topics=['0x' + self.decoder.get_method_id(self.test_abi[0])])
+        self.assertRaises(LookupError, self.decoder.decode_log, function_log)
+        self.assertEqual([], self.decoder.decode_logs([function_log]))
+
+        self.decoder.remove_abi(transfer_abi)
+        self.assertEqual(1, len(self.decoder.decode_plans))
+        self.assertRaises(LookupError, self.decoder.decode_log, log)
+
+    def test_decode_logs_columns(self):
+        event_abi = [{'anonymous': False, 'name': 'OutcomeTokenPurchase', 'type': 'event',
+                      'inputs': [{'indexed': True, 'name': 'buyer', 'type': 'address'},
+                                 {'indexed': False, 'name': 'outcomeTokenIndex', 'type': 'uint8'},
+                                 {'indexed': False, 'name': 'outcomeTokenCost', 'type': 'uint256'},
+                                 {'indexed': False, 'name': 'owners', 'type': 'address[]'},
+                                 {'indexed': False, 'name': 'canceled', 'type': 'bool'}]}]
+        self.decoder.add_abi(event_abi)
+        topic = '0x' + self.decoder.get_method_id(event_abi[0])
+        logs = [{
+            'address': '0x{:040x}'.format(i + 1),
+            'transactionHash': '0x{:064x}'.format(i + 1),
+            'topics': [topic, '0x{:064x}'.format(i + 100)],
+            'data': '0x' + '{:064x}'.format(i) + '{:064x}'.format(10 ** 30 + i) + '{:064x}'.format(128) +
+                    '{:064x}'.format(i % 2) + '{:064x}'.format(1) + '{:064x}'.format(i + 200),
+        } for i in range(5)]
+
+        decoded_columns = self.decoder.decode_logs_columns(logs)
+        self.assertEqual(5, len(decoded_columns))
+        self.assertEqual('OutcomeTokenPurchase', decoded_columns.name)
+        self.assertEqual([10 ** 30 + i for i in range(5)], list(decoded_columns['outcomeTokenCost']))
+        self.assertEqual([True, False] * 2 + [True], [not value for value in decoded_columns['canceled']])
+        if numpy is not None:
+            self.assertEqual(numpy.uint64, decoded_columns['outcomeTokenIndex'].dtype)
+            self.assertEqual(numpy.bool_, decoded_columns['canceled'].dtype)
+            self.assertEqual('<U40', decoded_columns['buyer'].dtype.str)
+            self.assertEqual(object, decoded_columns['outcomeTokenCost'].dtype)
+        with self.assertRaises(KeyError):
+            decoded_columns['unknown']
+
+        # Same events than decoding every log
+        decoded_events = [self.decoder.decode_log(log) for log in logs]
+        self.assertEqual(decoded_events, decoded_columns.to_dicts())
+        self.assertEqual(decoded_events[3], decoded_columns.get_event(3))
+        self.assertEqual(decoded_events, self.decoder.decode_logs(logs))
+
+        self.assertRaises(ValueError, self.decoder.decode_logs_columns, [])
+        self.assertRaises(LookupError, self.decoder.decode_logs_columns,
+                          [dict(logs[0], topics=['0x' + '12' * 32])])
+        self.assertRaises(ValueError, self.decoder.decode_logs_columns,
+                          logs + [dict(logs[0], topics=['0x' + '12' * 32])])
+
+    def test_lazy_decoded_events(self):
+        event_abi = [{'anonymous': False, 'name': 'OwnersChanged', 'type': 'event',
+                      'inputs': [{'indexed': True, 'name': 'wallet', 'type': 'address'},
+                                 {'indexed': False, 'name': 'owners', 'type': 'address[]'},
+                                 {'indexed': False, 'name': 'required', 'type': 'uint256'}]}]
+        self.decoder.add_abi(event_abi)
+        log = {
+            'address': '0xa6d9c5f7d4de3cef51ad3b7235d79ccc95114de5',
+            'transactionHash': '0x54041b3ce0976ee17212100f42b3793fa4ee5f869a6d107249a75caa5fc1b8aa',
+            'topics': ['0x' + self.decoder.get_method_id(event_abi[0]),
+                       '0x00000000000000000000000065039084cc6f4773291a6ed7dcf5bc3a2e894ff3'],
+            'data': '0x' + '{:064x}'.format(64) + '{:064x}'.format(2) + '{:064x}'.format(1) +
+                    '00000000000000000000000017e054b16ca658789c927c854976450adbda7df0',
+        }
+        decoded_event = self.decoder.decode_log(log)
+        lazy_event = self.decoder.decode_log(log, lazy=True)
+        self.assertIsInstance(lazy_event, LazyDecodedEvent)
+
+        # Nothing is decoded until it's read
+        self.assertEqual('OwnersChanged', lazy_event['name'])
+        self.assertEqual('65039084cc6f4773291a6ed7dcf5bc3a2e894ff3', lazy_event['params'][0]['value'])
+        self.assertEqual('wallet', lazy_event['params'][0]['name'])
+        self.assertIsNone(lazy_event._decoded_data)
+        self.assertEqual(2, lazy_event['params'][2]['value'])
+        self.assertEqual({0, 2}, set(lazy_event._values))
+        self.assertEqual(['17e054b16ca658789c927c854976450adbda7df0'], lazy_event['params'][1]['value'])
+        self.assertIs(lazy_event['params'][1]['value'], lazy_event['params'][1]['value'])
+
+        # Behaves like the decoded dictionary
+        self.assertEqual(decoded_event, lazy_event)
+        self.assertEqual(decoded_event, dict(lazy_event))
+        self.assertEqual(decoded_event, lazy_event.to_dict())
+        self.assertIsInstance(lazy_event.to_dict()['params'][0], dict)
+        self.assertEqual(list(decoded_event), list(lazy_event))
+        self.assertEqual(decoded_event['address'], lazy_event.get('address'))
+        self.assertIsNone(lazy_event.get('unknown'))
+        self.assertEqual([decoded_event], self.decoder.decode_logs([log], lazy=True))
+
+        # Errors are raised when params are read
+        lazy_event = self.decoder.decode_log(dict(log, data='0x', address=None), lazy=True)
+        self.assertEqual('65039084cc6f4773291a6ed7dcf5bc3a2e894ff3', lazy_event['params'][0]['value'])
+        with self.assertRaises(Exception):
+            lazy_event['params'][1]['value']
+        with self.assertRaises(ValueError):
+            lazy_event['address']
+
     def test_decode_transaction_hash(self):
         self.decoder.add_abi(self.test_abi)
 
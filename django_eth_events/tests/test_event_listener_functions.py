@@ -1,17 +1,39 @@
 # -*- coding: utf-8 -*-
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from eth_tester import EthereumTester
+from hexbytes import HexBytes
+from web3 import HTTPProvider, Web3
+from web3.datastructures import AttributeDict
 from web3.providers.eth_tester import EthereumTesterProvider
 
 from ..event_listener import EventListener
-from ..exceptions import InvalidAddressException
+from ..exceptions import InvalidAddressException, UnknownBlock
 from ..factories import DaemonFactory
 from ..models import Daemon
 from ..utils import normalize_address_without_0x
-from .utils import abi, bin_hex
+from .fake_node import FakeHTTPNodeServer, FakeNode, fake_address
+from .utils import (CentralizedOracle, CreatedContractsAddressesGetter, abi,
+                    bin_hex)
 
 
 class TestDaemon(TestCase):
+    # Factory with a fixed address, and the contracts it creates
+    factory_contract_map = [
+        {
+            'NAME': 'Factory',
+            'EVENT_ABI': abi,
+            'EVENT_DATA_RECEIVER': 'django_eth_events.tests.utils.ContractCreationReceiver',
+            'ADDRESSES': [fake_address(0)]
+        },
+        {
+            'NAME': 'Created',
+            'EVENT_ABI': abi,
+            'EVENT_DATA_RECEIVER': 'django_eth_events.tests.utils.CentralizedOraclesReceiver',
+            'ADDRESSES_GETTER': 'django_eth_events.tests.utils.CreatedContractsAddressesGetter'
+        },
+    ]
+
     def setUp(self):
         self.daemon = DaemonFactory()
         self.el = EventListener(provider=EthereumTesterProvider(EthereumTester()))
@@ -182,3 +204,102 @@ class TestDaemon(TestCase):
 
         self.assertEqual(len(el.original_contract_map[0]['ADDRESSES']), 4)
         self.assertEqual(len(el.contract_map[0]['ADDRESSES']), 1)
+
+    def test_prefetch_logs(self):
+        node = FakeNode(blocks=6, txs_per_block=2)
+        with FakeHTTPNodeServer(node) as server:
+            el = EventListener(provider=HTTPProvider(server.uri))
+            self.assertEqual('range', el.get_logs_prefetch_strategy())
+            block_numbers = range(1, 6)
+            prefetched_blocks = el.web3_service.get_blocks(block_numbers)
+
+            node.requests.clear()
+            el.logs_prefetch_strategy = 'range'
+            prefetched_logs = el.prefetch_logs(prefetched_blocks, block_numbers)
+            self.assertEqual(1, len(node.requests))
+            self.assertEqual(1, len(node.methods_requested('eth_getLogs')))
+            self.assertEqual(list(block_numbers), sorted(prefetched_logs))
+            self.assertEqual(2, len(prefetched_logs[3]))
+
+            el.logs_prefetch_strategy = 'receipts'
+            prefetched_logs_with_receipts = el.prefetch_logs(prefetched_blocks, block_numbers)
+            for block_number in block_numbers:
+                self.assertEqual([log['transactionHash'] for log in prefetched_logs_with_receipts[block_number]],
+                                 [log['transactionHash'].hex() for log in prefetched_logs[block_number]])
+
+            # Receipts are used if node refuses the logs of a block
+            el.logs_prefetch_strategy = 'range'
+            node.max_logs_per_request = 1
+            self.assertEqual(prefetched_logs_with_receipts, el.prefetch_logs(prefetched_blocks, block_numbers))
+            node.max_logs_per_request = None
+
+            # Block changed after prefetching, might be a reorg
+            el.logs_prefetch_strategy = 'range'
+            prefetched_block = prefetched_blocks[3]
+            prefetched_blocks[3] = AttributeDict(prefetched_block, hash=HexBytes('0x' + 'ff' * 32))
+            with self.assertRaises(UnknownBlock):
+                el.prefetch_logs(prefetched_blocks, block_numbers)
+
+            # Only logs of watched addresses
+            el.logs_prefetch_strategy = 'filter'
+            el.decoder.events.add(FakeNode.event_topic)
+            prefetched_blocks[3] = prefetched_block
+            watched_addresses = {Web3.toChecksumAddress(fake_address(0))}
+            prefetched_logs = el.prefetch_logs(prefetched_blocks, block_numbers, watched_addresses)
+            self.assertTrue(all(len(logs) == 1 for logs in prefetched_logs.values()))
+            el.prefetch_logs_for_new_addresses(prefetched_blocks, prefetched_logs,
+                                               {Web3.toChecksumAddress(fake_address(1))}, range(4, 6))
+            self.assertEqual([1, 1, 1, 2, 2], [len(prefetched_logs[block_number]) for block_number in block_numbers])
+            self.assertEqual([0, 1], [log['logIndex'] for log in prefetched_logs[5]])
+
+            el.logs_prefetch_strategy = 'not-valid'
+            with self.assertRaises(ImproperlyConfigured):
+                el.prefetch_logs(prefetched_blocks, block_numbers)
+        EventListener.instance = None
+
+    def test_process_blocks_with_contract_created(self):
+        CentralizedOracle().reset()
+        CreatedContractsAddressesGetter.addresses = []
+        node = FakeNode(blocks=5, txs_per_block=2)
+        # Contract is created by the factory and emits an event in the same block
+        created_address = fake_address(10)
+        event_abi = [event for event in abi if event['type'] == 'event' and event['name'] == 'ContractInstantiation']
+        topic = '0x' + self.el.decoder.get_method_id(event_abi[0])
+        data = '0x' + '00' * 12 + fake_address(20)[2:] + '00' * 12 + created_address[2:]
+        block_transactions = node.blocks[2]['transactions']
+        for tx_hash, address in zip(block_transactions, (fake_address(0), created_address)):
+            log = node.receipts[tx_hash]['logs'][0]
+            log.update(address=address, topics=[topic], data=data)
+
+        with FakeHTTPNodeServer(node) as server:
+            el = EventListener(contract_map=self.factory_contract_map, provider=HTTPProvider(server.uri))
+            el.logs_prefetch_strategy = 'filter'
+            block_numbers = range(1, 5)
+            prefetched_blocks = el.web3_service.get_blocks(block_numbers)
+            watched_addresses = el.get_prefetch_watched_addresses()
+            prefetched_logs = el.prefetch_logs(prefetched_blocks, block_numbers, watched_addresses)
+            self.assertEqual([0, 1, 0, 0], [len(prefetched_logs[block_number]) for block_number in block_numbers])
+
+            el.process_blocks(self.daemon, block_numbers, prefetched_blocks, prefetched_logs, watched_addresses)
+            self.assertEqual([created_address[2:]], CreatedContractsAddressesGetter.addresses)
+            self.assertEqual(1, CentralizedOracle().length())
+            self.assertEqual(2, len(prefetched_logs[2]))
+            self.assertEqual(4, self.daemon.block_number)
+        CentralizedOracle().reset()
+        CreatedContractsAddressesGetter.addresses = []
+        EventListener.instance = None
+
+    def test_invalidate_contract_address_cache(self):
+        el = EventListener(contract_map=self.factory_contract_map, provider=self.provider)
+        contract_address_cache = {}
+        el.route_logs([], contract_address_cache)
+        self.assertEqual({'Factory', 'Created'}, set(contract_address_cache))
+        factory_addresses = contract_address_cache['Factory']
+
+        # Only addresses of contracts using an addresses getter can change
+        el.invalidate_contract_address_cache(contract_address_cache)
+        self.assertEqual(['Factory'], list(contract_address_cache))
+        el.route_logs([], contract_address_cache)
+        self.assertIs(factory_addresses, contract_address_cache['Factory'])
+        self.assertIn('Created', contract_address_cache)
+        EventListener.instance = None
@@ -0,0 +1,44 @@
+from unittest import skipIf
+
+from django.test import TestCase
+from hexbytes import HexBytes
+
+from ..json_codec import JsonCodec, OrjsonCodec, get_json_codec, orjson
+
+
+class TestJsonCodec(TestCase):
+
+    def check_codec(self, codec: JsonCodec):
+        decoded_logs = [{'event_receiver': 'django_eth_events.tests.receivers.Receiver',
+                         'event': {'name': 'Transfer',
+                                   'params': [{'name': 'value', 'value': 2 ** 256 - 1},
+                                              {'name': 'small', 'value': -12},
+                                              {'name': 'text', 'value': b'hello'},
+                                              {'name': 'hash', 'value': HexBytes('0x' + 'ff' * 32)}]}}]
+        encoded = codec.dumps(decoded_logs)
+        self.assertIsInstance(encoded, str)
+        decoded = codec.loads(encoded)
+        params = decoded[0]['event']['params']
+        self.assertEqual(2 ** 256 - 1, params[0]['value'])
+        self.assertEqual(-12, params[1]['value'])
+        self.assertEqual('hello', params[2]['value'])
+        self.assertEqual('0x' + 'ff' * 32, params[3]['value'])
+        self.assertEqual(decoded, codec.loads(codec.dumps_bytes(decoded_logs)))
+
+        rpc_response = b'[{"jsonrpc": "2.0", "id": 1, ' \
+                       b'"result": {"number": "0x1b4", "hash": "0x1234567890123456789012"}}]'
+        self.assertEqual('0x1b4', codec.loads(rpc_response)[0]['result']['number'])
+
+    def test_json_codec(self):
+        self.check_codec(get_json_codec('json'))
+        with self.assertRaises(ValueError):
+            get_json_codec('not-existing')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_codec(self):
+        codec = get_json_codec()
+        self.assertIsInstance(codec, OrjsonCodec)
+        self.check_codec(codec)
+        # Same json than standard library
+        value = {'a': [1, 2 ** 70, 'b'], 'c': None}
+        self.assertEqual(value, JsonCodec().loads(codec.dumps(value)))
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from hexbytes import HexBytes
+
+from ..decoder import Decoder
+from ..log_router import LogRouter
+
+
+class TestLogRouter(TestCase):
+    event_abi = [{'anonymous': False, 'name': 'Transfer', 'type': 'event',
+                  'inputs': [{'indexed': True, 'name': 'from', 'type': 'address'},
+                             {'indexed': True, 'name': 'to', 'type': 'address'},
+                             {'indexed': False, 'name': 'value', 'type': 'uint256'}]}]
+    decoder = Decoder()
+
+    def setUp(self):
+        self.decoder.reset()
+        self.decoder.add_abi(self.event_abi)
+        self.topic = '0x' + self.decoder.get_method_id(self.event_abi[0])
+
+    def build_log(self, address: str, topic: str=None):
+        return {'address': address, 'topics': [topic or self.topic, '0x' + '00' * 32, '0x' + '00' * 32],
+                'data': '0x' + '{:064x}'.format(1), 'transactionHash': '0x' + '00' * 32}
+
+    def test_route(self):
+        address_1 = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+        address_2 = '0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359'
+        address_3 = '0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB'
+        log_router = LogRouter(self.decoder)
+        self.assertRaises(ValueError, log_router.route, [])
+
+        # Address 2 is watched by both contracts
+        self.assertTrue(log_router.update([{address_1, address_2}, {address_2}]))
+        logs = [
+            self.build_log(address_2),
+            self.build_log(address_1.lower()),  # Not checksumed
+            self.build_log(address_3),  # Not watched
+            self.build_log(address_1, topic='0x' + '12' * 32),  # Unknown topic
+            dict(self.build_log(address_1), topics=[]),  # Anonymous
+            self.build_log(address_2[2:]),  # Without 0x, topic as bytes
+        ]
+        logs[5]['topics'][0] = HexBytes(self.topic)
+        self.assertEqual([[logs[0], logs[1], logs[5]], [logs[0], logs[5]]], log_router.route(logs))
+
+        # Index is only rebuilt if addresses change
+        routes = log_router.routes
+        self.assertFalse(log_router.update([{address_1, address_2}, {address_2}]))
+        self.assertIs(routes, log_router.routes)
+        self.assertTrue(log_router.update([{address_1, address_2}, {address_2, address_3}]))
+        self.assertEqual([[logs[0], logs[1], logs[5]], [logs[0], logs[2], logs[5]]], log_router.route(logs))
+
+        # Only entries of the changed contracts are updated, index is the same than building it from scratch
+        for address_sets in ([{address_1}, {address_2, address_3}], [{address_1, address_3}, set()],
+                             [{address_1.lower(), address_2}, {address_1}]):
+            self.assertTrue(log_router.update(address_sets))
+            built_log_router = LogRouter(self.decoder)
+            built_log_router.build(address_sets)
+            self.assertEqual(built_log_router.routes, log_router.routes)
+        self.assertEqual([[logs[0], logs[1], logs[5]], [logs[1]]], log_router.route(logs))
+
+        # Routed logs can be decoded
+        self.assertEqual(3, len(self.decoder.decode_logs(log_router.route(logs)[0])))
@@ -0,0 +1,73 @@
+from django.test import TestCase
+
+from ..exceptions import Web3ConnectionException
+from ..node_pool import NodePool, NodePoolProvider
+from ..web3_service import Web3Service
+from .fake_node import FakeHTTPNodeServer, FakeNode
+
+
+class TestNodePool(TestCase):
+
+    def test_requests_spread_across_nodes(self):
+        node_1, node_2 = FakeNode(blocks=20), FakeNode(blocks=20)
+        with FakeHTTPNodeServer(node_1) as server_1, FakeHTTPNodeServer(node_2) as server_2:
+            provider = Web3Service.get_provider_from_uris([server_1.uri, server_2.uri])
+            self.assertIsInstance(provider, NodePoolProvider)
+            web3_service = Web3Service(provider, max_batch_requests=2, adaptive_batch_requests=False)
+            self.assertIsInstance(web3_service.batch_transport, NodePool)
+            # Main, slow and batch requests share the same pool (and node stats)
+            node_pool = web3_service.main_provider.node_pool
+            slow_provider = web3_service.web3_slow.providers[0]
+            self.assertIs(node_pool, slow_provider.node_pool)
+            self.assertIs(node_pool, web3_service.batch_transport)
+            self.assertEqual(web3_service.slow_provider_timeout, slow_provider.timeout)
+            # And the same http connection pool
+            for node in node_pool.nodes:
+                self.assertIs(web3_service.http_session, node.transport.session)
+
+            blocks = web3_service.get_blocks(range(20))
+            self.assertEqual(list(range(20)), sorted(blocks))
+            web3_service.get_logs_for_blocks(blocks.values())
+            self.assertEqual(19, web3_service.get_current_block_number())
+            self.assertEqual(2, len(web3_service.get_logs_for_event_using_filter(3, 3, FakeNode.event_topic)))
+            self.assertGreater(node_1.payloads, 0)
+            self.assertGreater(node_2.payloads, 0)
+
+    def test_failover_and_dropped_nodes(self):
+        node_1 = FakeNode(blocks=5)
+        with FakeHTTPNodeServer(node_1) as server_1:
+            node_pool = NodePool.from_uris([server_1.uri, 'http://127.0.0.1:1'], min_samples=5,
+                                           hedge_requests=False)
+            rpc_request = [{'jsonrpc': '2.0', 'method': 'eth_blockNumber', 'params': [], 'id': 1}]
+            for _ in range(20):
+                self.assertEqual('0x4', node_pool.send(rpc_request)[0]['result'])
+            # Node not working is not used after failing
+            down_node = node_pool.nodes[1]
+            self.assertEqual(1, down_node.stats.requests)
+            self.assertEqual(1, down_node.stats.errors)
+
+            # Nodes with too many errors are dropped
+            for _ in range(10):
+                down_node.stats.record_failure()
+            self.assertEqual([node_pool.nodes[0]], node_pool.get_healthy_nodes())
+            self.assertGreater(down_node.stats.dropped_until, 0)
+
+        with self.assertRaises(Web3ConnectionException):
+            node_pool.send(rpc_request)
+
+    def test_hedged_requests(self):
+        slow_node, fast_node = FakeNode(blocks=5), FakeNode(blocks=5)
+        with FakeHTTPNodeServer(slow_node) as slow_server, FakeHTTPNodeServer(fast_node) as fast_server:
+            node_pool = NodePool.from_uris([slow_server.uri, fast_server.uri], min_samples=3,
+                                           outlier_factor=1000)
+            rpc_request = [{'jsonrpc': '2.0', 'method': 'eth_blockNumber', 'params': [], 'id': 1}]
+            for node in node_pool.nodes:
+                for _ in range(3):
+                    node_pool._send_to_node(node, rpc_request)
+
+            # Slow node is always chosen, but fast node answers the hedged request
+            slow_node.delay = 2
+            node_pool.get_nodes_by_preference = lambda: list(node_pool.nodes)
+            fast_node.payloads = 0
+            self.assertEqual('0x4', node_pool.send(rpc_request)[0]['result'])
+            self.assertEqual(1, fast_node.payloads)
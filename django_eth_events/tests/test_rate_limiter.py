@@ -0,0 +1,53 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from ..rate_limiter import RateLimiter, RequestPriority
+
+
+class TestRateLimiter(TestCase):
+
+    def test_rate_limiter(self):
+        rate_limiter = RateLimiter(max_requests_per_second=20)
+        start = time.monotonic()
+        for _ in range(10):
+            rate_limiter.acquire(requests=4)
+        # 20 requests of burst, the other 20 at 20 requests per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+        rate_limiter = RateLimiter(max_weight_per_second=100)
+        self.assertEqual(101, rate_limiter.get_weight(['eth_getLogs', 'eth_blockNumber', 'eth_getBlockByNumber']))
+        self.assertEqual(10, rate_limiter.get_weight(['unknown_method']))
+        self.assertLess(rate_limiter.acquire_for_methods(['eth_getLogs']), 0.1)
+        # Only 25 units left, and weight bigger than the capacity waits until the bucket is full
+        self.assertGreater(rate_limiter.acquire(weight=1000), 0.5)
+        self.assertLess(rate_limiter.weight_bucket.tokens, 0)
+
+        self.assertFalse(RateLimiter().enabled)
+        self.assertEqual(0., RateLimiter().acquire(requests=1000))
+
+    def test_priorities(self):
+        rate_limiter = RateLimiter(max_requests_per_second=10)
+        rate_limiter.acquire(requests=10)
+        served = []
+
+        def acquire(name, priority):
+            with rate_limiter.priority(priority):
+                rate_limiter.acquire(requests=2)
+            served.append(name)
+
+        threads = [threading.Thread(target=acquire, args=('backfill-%d' % i, RequestPriority.LOW)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        head_thread = threading.Thread(target=acquire, args=('head', RequestPriority.HIGH))
+        head_thread.start()
+        threads.append(head_thread)
+        for thread in threads:
+            thread.join()
+
+        # Head request was the last one, but it was served first
+        self.assertEqual('head', served[0])
+        self.assertEqual(4, len(served))
+        self.assertEqual(RequestPriority.NORMAL, rate_limiter.current_priority)
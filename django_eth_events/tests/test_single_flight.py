@@ -0,0 +1,49 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from ..single_flight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+
+    def test_single_flight(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def slow_call(value):
+            calls.append(value)
+            time.sleep(0.2)
+            return value * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(single_flight.do('key', slow_call, 2)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([4] * 5, results)
+        self.assertEqual([2], calls)
+        self.assertEqual(4, single_flight.coalesced)
+        self.assertEqual(0, len(single_flight))
+
+        # Calls are not cached once finished
+        self.assertEqual(6, single_flight.do('key', slow_call, 3))
+
+    def test_single_flight_exception(self):
+        single_flight = SingleFlight()
+        future, is_leader = single_flight.start('key')
+        self.assertTrue(is_leader)
+        waiting_future, is_leader = single_flight.start('key')
+        self.assertFalse(is_leader)
+        self.assertIs(future, waiting_future)
+
+        single_flight.finish('key', exception=ValueError('Node failed'))
+        with self.assertRaisesRegex(ValueError, 'Node failed'):
+            waiting_future.result()
+        with self.assertRaises(ZeroDivisionError):
+            single_flight.do('key', lambda: 1 / 0)
+        self.assertEqual(0, len(single_flight))
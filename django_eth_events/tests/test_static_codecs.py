@@ -0,0 +1,93 @@
+import random
+
+from django.test import TestCase
+from eth_abi import decode_abi, encode_abi
+from eth_abi.exceptions import InsufficientDataBytes, NonEmptyPaddingBytes
+from hexbytes import HexBytes
+
+from ..decoder import Decoder
+from ..static_codecs import (STATIC_DECODERS, StaticDataDecoder,
+                             get_static_data_decoder)
+
+
+def random_value(data_type: str):
+    if data_type == 'address':
+        return '0x{:040x}'.format(random.getrandbits(160))
+    elif data_type == 'uint256':
+        return random.choice([0, 1, 2 ** 256 - 1, random.getrandbits(256), random.getrandbits(64)])
+    elif data_type == 'int256':
+        return random.choice([0, -1, 2 ** 255 - 1, -2 ** 255, random.randint(-2 ** 255, 2 ** 255 - 1)])
+    elif data_type == 'bool':
+        return random.choice([True, False])
+    return bytes(random.getrandbits(8) for _ in range(32))
+
+
+class TestStaticCodecs(TestCase):
+    decoder = Decoder()
+
+    def setUp(self):
+        self.decoder.reset()
+
+    def test_get_static_data_decoder(self):
+        self.assertIsInstance(get_static_data_decoder(['address', 'uint256', 'bool']), StaticDataDecoder)
+        self.assertIsInstance(get_static_data_decoder([]), StaticDataDecoder)
+        for data_types in (['address', 'bytes'], ['string'], ['address[]'], ['uint8'], ['bytes32[2]']):
+            self.assertIsNone(get_static_data_decoder(data_types))
+
+    def test_static_data_decoder(self):
+        random.seed(0)
+        data_types = list(STATIC_DECODERS)
+        for _ in range(200):
+            types = random.sample(data_types, random.randint(1, len(data_types))) * random.randint(1, 2)
+            values = [random_value(data_type) for data_type in types]
+            data = encode_abi(types, values)
+            # Same values than `decode_abi`, addresses normalized like `Decoder` does
+            expected = tuple(Decoder.decode_address(value) if data_type == 'address' else value
+                             for data_type, value in zip(types, decode_abi(types, data)))
+            static_data_decoder = StaticDataDecoder(types)
+            for encoded_data in (data, HexBytes(data), '0x' + data.hex(), data.hex()):
+                decoded = static_data_decoder(encoded_data)
+                self.assertEqual(expected, decoded)
+                self.assertEqual([type(value) for value in expected], [type(value) for value in decoded])
+
+        # Data not valid for `decode_abi` is not decoded
+        static_data_decoder = StaticDataDecoder(['address', 'bool'])
+        self.assertIsNone(static_data_decoder(b'\x00' * 32))
+        self.assertIsNone(static_data_decoder(b'\x01' + b'\x00' * 63))
+        self.assertIsNone(static_data_decoder(b'\x00' * 63 + b'\x02'))
+        self.assertIsNone(static_data_decoder('0xzz'))
+
+    def test_decode_log(self):
+        random.seed(1)
+        event_abi = [{'anonymous': False, 'name': 'Trade', 'type': 'event',
+                      'inputs': [{'indexed': True, 'name': 'trader', 'type': 'address'},
+                                 {'indexed': False, 'name': 'market', 'type': 'address'},
+                                 {'indexed': True, 'name': 'id', 'type': 'uint256'},
+                                 {'indexed': False, 'name': 'amount', 'type': 'uint256'},
+                                 {'indexed': False, 'name': 'cost', 'type': 'int256'},
+                                 {'indexed': False, 'name': 'sell', 'type': 'bool'},
+                                 {'indexed': False, 'name': 'orderHash', 'type': 'bytes32'}]}]
+        self.decoder.add_abi(event_abi)
+        topic = '0x' + self.decoder.get_method_id(event_abi[0])
+        decode_plan = self.decoder.decode_plans[topic[2:]]
+        self.assertIsNotNone(decode_plan.static_data_decoder)
+
+        data_types = ['address', 'uint256', 'int256', 'bool', 'bytes32']
+        logs = [{
+            'address': '0x{:040x}'.format(random.getrandbits(160)),
+            'transactionHash': '0x{:064x}'.format(random.getrandbits(256)),
+            'topics': [topic, '0x{:064x}'.format(random.getrandbits(160)), '0x{:064x}'.format(i)],
+            'data': '0x' + encode_abi(data_types, [random_value(data_type) for data_type in data_types]).hex(),
+        } for i in range(50)]
+
+        decoded_events = [self.decoder.decode_log(log) for log in logs]
+        # Same result using `decode_abi`
+        static_data_decoder, decode_plan.static_data_decoder = decode_plan.static_data_decoder, None
+        self.assertEqual([self.decoder.decode_log(log) for log in logs], decoded_events)
+
+        # Not valid data raises the same errors than `decode_abi`
+        decode_plan.static_data_decoder = static_data_decoder
+        with self.assertRaises(InsufficientDataBytes):
+            self.decoder.decode_log(dict(logs[0], data=logs[0]['data'][:-2]))
+        with self.assertRaises(NonEmptyPaddingBytes):
+            self.decoder.decode_log(dict(logs[0], data='0x01' + logs[0]['data'][4:]))
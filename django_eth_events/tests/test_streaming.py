@@ -0,0 +1,46 @@
+import json
+
+from django.test import TestCase
+
+from ..streaming import JsonDocumentScanner, iter_json_rpc_result
+
+
+def split_in_chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestStreaming(TestCase):
+
+    def test_iter_json_rpc_result(self):
+        result = [{'address': '0x' + '1' * 40, 'logIndex': '0x%x' % i, 'data': 'ñ,]}' * i, 'topics': []}
+                  for i in range(50)]
+        result.extend([1234567, 'text', None, [1, [2]]])
+        response = json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': result}, indent=1).encode()
+        for chunk_size in (1, 3, 7, 100, len(response)):
+            self.assertEqual(result, list(iter_json_rpc_result(split_in_chunks(response, chunk_size),
+                                                               max_buffer_size=10)))
+
+        self.assertEqual([], list(iter_json_rpc_result([b'{"jsonrpc":"2.0","id":1,"result":[]}'])))
+        self.assertEqual([], list(iter_json_rpc_result([b'{"jsonrpc":"2.0","id":1,"result":null}'])))
+
+    def test_iter_json_rpc_result_errors(self):
+        error_response = b'{"jsonrpc":"2.0","id":1,"error":{"code":-32005,"message":"query returned more than 10000"}}'
+        with self.assertRaisesRegex(ValueError, 'more than 10000'):
+            list(iter_json_rpc_result(split_in_chunks(error_response, 5)))
+
+        with self.assertRaisesRegex(ValueError, 'not a list'):
+            list(iter_json_rpc_result([b'{"jsonrpc":"2.0","id":1,"result":"0x1"}']))
+
+        # Connection closed in the middle of the response
+        items = iter_json_rpc_result([b'{"jsonrpc":"2.0","id":1,"result":[{"a": 1}, {"b"'])
+        self.assertEqual({'a': 1}, next(items))
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_json_document_scanner(self):
+        result = [{'data': 'ñ,]}"\\' * i, 'topics': [[], {}]} for i in range(20)]
+        response = json.dumps([{'jsonrpc': '2.0', 'id': 1, 'result': result}]).encode()
+        for chunk_size in (1, 2, 3, 7, 100, len(response)):
+            chunks = split_in_chunks(response, chunk_size)
+            scanner = JsonDocumentScanner()
+            self.assertEqual([False] * (len(chunks) - 1) + [True], [scanner.feed(chunk) for chunk in chunks])
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from ..subscription import SubscriptionListener
+from .fake_node import FakeNode, FakeWebsocketNodeServer
+
+
+class TestSubscriptionListener(TestCase):
+
+    def start_listener(self, listener: SubscriptionListener) -> threading.Thread:
+        thread = threading.Thread(target=listener.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(listener.stop)
+        return thread
+
+    def test_new_heads_are_processed(self):
+        node = FakeNode(blocks=2)
+        processed = threading.Event()
+        processed_block_numbers = []
+
+        def process():
+            processed_block_numbers.append(node.block_number)
+            processed.set()
+
+        with FakeWebsocketNodeServer(node) as server:
+            listener = SubscriptionListener(server.uri, process=process, poll_interval=60, reconnect_interval=0.1)
+            thread = self.start_listener(listener)
+
+            # Blocks mined before connecting are processed
+            self.assertTrue(processed.wait(5))
+            processed.clear()
+            self.assertTrue(listener.connected)
+
+            server.mine_block()
+            self.assertTrue(processed.wait(5))
+            processed.clear()
+            self.assertEqual(2, listener.head_block_number)
+            self.assertEqual([1, 2], processed_block_numbers)
+
+            # Listener reconnects if connection drops
+            server.drop_connections()
+            self.assertTrue(processed.wait(5))
+            self.assertEqual(2, len(node.methods_requested('eth_subscribe')))
+            listener.stop()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_polling_without_connection(self):
+        processed = []
+        listener = SubscriptionListener('ws://127.0.0.1:1', process=lambda: processed.append(time.time()),
+                                        poll_interval=0.1, reconnect_interval=0.1)
+        thread = self.start_listener(listener)
+        time.sleep(1)
+        self.assertFalse(listener.connected)
+        self.assertGreater(len(processed), 2)
+        listener.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
+import threading
+import time
 from pathlib import Path
 
 from django.test import TestCase
 from eth_tester import EthereumTester
-from web3 import HTTPProvider, IPCProvider
+from hexbytes import HexBytes
+from web3 import HTTPProvider, IPCProvider, Web3, WebsocketProvider
 from web3.providers.eth_tester import EthereumTesterProvider
 
-from ..exceptions import UnknownBlock
+from ..exceptions import (BatchRequestTimeout, UnknownBlock,
+                          UnknownTransaction, Web3ConnectionException)
+from ..transports import (BatchTransport, IPCBatchTransport,
+                          WebsocketBatchTransport)
 from ..web3_service import Web3Service, Web3ServiceProvider
+from .fake_node import (FakeHTTPNodeServer, FakeIPCNodeServer, FakeNode,
+                        fake_address, fake_hash)
 
 
 class TestSingleton(TestCase):
@@ -58,3 +66,520 @@ class TestSingleton(TestCase):
             provider = web3_service.web3.providers[0]
             self.assertTrue(isinstance(provider, IPCProvider))
             self.assertEqual(provider.ipc_path, socket_path)
+
+    def test_provider_ws(self):
+        with self.settings(ETHEREUM_NODE_URL='ws://localhost:8546'):
+            web3_service = Web3ServiceProvider()
+            provider = web3_service.web3.providers[0]
+            self.assertTrue(isinstance(provider, WebsocketProvider))
+            self.assertTrue(isinstance(web3_service.batch_transport, WebsocketBatchTransport))
+
+
+class TestBatchTransport(TestCase):
+
+    def test_demultiplex(self):
+        rpc_request = [{'id': 1}, {'id': 2}, {'id': 3}]
+        rpc_response = [{'id': 3, 'result': 'c'}, {'id': 1, 'result': 'a'}]
+        responses = BatchTransport.demultiplex(rpc_request, rpc_response)
+        self.assertEqual(['a', None, 'c'], [response.get('result') for response in responses])
+        self.assertEqual(2, responses[1]['id'])
+        self.assertIn('error', responses[1])
+
+        # Whole batch rejected
+        responses = BatchTransport.demultiplex(rpc_request, {'id': None, 'error': {'code': -32600}})
+        self.assertEqual([1, 2, 3], [response['id'] for response in responses])
+        self.assertTrue(all('error' in response for response in responses))
+
+    def test_ipc_batch_requests(self):
+        node = FakeNode(blocks=10, txs_per_block=3)
+        with FakeIPCNodeServer(node) as server:
+            web3_service = Web3Service(IPCProvider(ipc_path=server.ipc_path), max_batch_requests=5,
+                                       batch_retry_backoff=0)
+            self.assertTrue(isinstance(web3_service.batch_transport, IPCBatchTransport))
+
+            connections, node.payloads = server.connections, 0
+            blocks = web3_service.get_blocks(range(10))
+            self.assertEqual(list(range(10)), sorted(blocks))
+            self.assertEqual(HexBytes(node.blocks[4]['hash']), blocks[4]['hash'])
+            # 2 batches sent concurrently, at most one connection for each of them
+            self.assertEqual(2, node.payloads)
+            self.assertLessEqual(server.connections - connections, 2)
+            request_ids = [request['id'] for request in node.methods_requested('eth_getBlockByNumber')]
+            self.assertEqual(len(request_ids), len(set(request_ids)))
+
+            node.payloads = 0
+            block_number_with_logs = web3_service.get_logs_for_blocks(blocks.values())
+            # Receipts of every block are requested together, 30 receipts in batches of 5 or more
+            self.assertLessEqual(node.payloads, 6)
+            self.assertEqual(3, len(block_number_with_logs[7]))
+
+            # Idle connections are reused
+            connections = server.connections
+            with self.assertRaises(UnknownBlock):
+                web3_service.get_blocks([9, 10])
+            self.assertEqual(connections, server.connections)
+            web3_service.batch_transport.close()
+
+    def test_ipc_batch_connection_error(self):
+        transport = IPCBatchTransport('/tmp/not-existing-socket.ipc', timeout=1)
+        with self.assertRaises(Web3ConnectionException):
+            transport.send([{'jsonrpc': '2.0', 'method': 'eth_blockNumber', 'params': [], 'id': 1}])
+
+    def test_get_logs_for_block_range_with_filters(self):
+        node = FakeNode(blocks=6, txs_per_block=3)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri))
+            addresses = [Web3.toChecksumAddress(fake_address(tx_index)) for tx_index in range(3)]
+            topics = [FakeNode.event_topic]
+
+            block_number_with_logs = web3_service.get_logs_for_block_range(1, 5)
+            self.assertEqual(list(range(1, 6)), sorted(block_number_with_logs))
+            self.assertTrue(all(len(logs) == 3 for logs in block_number_with_logs.values()))
+
+            block_number_with_logs = web3_service.get_logs_for_block_range(1, 5, addresses=addresses[:1],
+                                                                           topics=topics)
+            self.assertTrue(all(len(logs) == 1 for logs in block_number_with_logs.values()))
+
+            block_number_with_logs = web3_service.get_logs_for_block_range(1, 5, addresses=addresses,
+                                                                           topics=['0x' + '00' * 32])
+            self.assertTrue(all(len(logs) == 0 for logs in block_number_with_logs.values()))
+
+            # Empty filters don't match anything
+            node.requests.clear()
+            self.assertEqual([], web3_service.get_logs_for_addresses_and_topics(1, 5, [], topics))
+            self.assertEqual([], web3_service.get_logs_for_addresses_and_topics(1, 5, addresses, []))
+            self.assertEqual([], node.requests)
+
+            # Split by max addresses
+            logs = web3_service.get_logs_for_addresses_and_topics(1, 5, addresses, topics, max_addresses_per_filter=2)
+            self.assertEqual(2, len(node.methods_requested('eth_getLogs')))
+            self.assertEqual(15, len(logs))
+            self.assertEqual(sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])), logs)
+
+            # Split when node refuses the filter
+            node.requests.clear()
+            node.max_addresses_per_filter = 1
+            logs = web3_service.get_logs_for_addresses_and_topics(1, 5, addresses, topics)
+            self.assertEqual(5, len(node.methods_requested('eth_getLogs')))  # 3 -> 1 + 2 -> 1 + 1 + 1
+            self.assertEqual(15, len(logs))
+            self.assertEqual(sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])), logs)
+
+            # Ranges with too many logs are split
+            node.requests.clear()
+            node.max_logs_per_request = 6
+            block_number_with_logs = web3_service.get_logs_for_block_range(0, 5)
+            self.assertTrue(all(len(block_number_with_logs[block_number]) == 3 for block_number in range(6)))
+            # 0-5 -> 0-2 + 3-5 -> 0-1 + 2 + 3-4 + 5
+            self.assertEqual(7, len(node.methods_requested('eth_getLogs')))
+            self.assertIn(web3_service.all_logs_window_key, web3_service.logs_window_sizes)
+
+    def test_shared_connection_pool(self):
+        node = FakeNode(blocks=20, txs_per_block=2)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_workers=3, max_batch_requests=2)
+            session = web3_service.http_session
+            self.assertIs(session, web3_service.main_provider.session)
+            self.assertIs(session, web3_service.web3_slow.providers[0].session)
+            self.assertIs(session, web3_service.batch_transport.session)
+            self.assertEqual(3, web3_service.get_connection_metrics()['pool_size'])
+
+            web3_service.get_current_block_number()
+            blocks = web3_service.get_blocks(range(20))
+            web3_service.get_logs_for_blocks(blocks.values())
+            web3_service.get_logs_for_event_using_filter(0, 19, FakeNode.event_topic)
+
+            metrics = web3_service.get_connection_metrics()
+            # Connections are not thrown away, max 1 connection per worker
+            self.assertLessEqual(metrics['connections'], 3)
+            self.assertGreater(metrics['requests'], 20)
+            self.assertEqual(metrics['requests'] - metrics['connections'], metrics['reused_connections'])
+
+    def test_batch_partial_failures(self):
+        node = FakeNode(blocks=10, txs_per_block=2)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0)
+            node.requests.clear()
+            node.fail('eth_getBlockByNumber', '0x3', times=2)
+            node.fail('eth_getBlockByNumber', '0x5', drop=True)
+            blocks = web3_service.get_blocks(range(10))
+            self.assertEqual(list(range(10)), sorted(blocks))
+            # Only failed requests are retried: 10 + (3, 5) + (3)
+            requested = [request['params'][0] for request in node.methods_requested('eth_getBlockByNumber')]
+            self.assertEqual(13, len(requested))
+            self.assertEqual(['0x3', '0x5', '0x3'], requested[10:])
+
+            tx_hashes = node.blocks[2]['transactions']
+            node.fail('eth_getTransactionReceipt', tx_hashes[1], times=3)
+            self.assertEqual(set(tx_hashes), set(web3_service.get_transaction_receipts(tx_hashes)))
+
+            # Failing after every retry
+            node.requests.clear()
+            node.fail('eth_getTransactionReceipt', tx_hashes[1], times=4)
+            with self.assertRaises(UnknownTransaction):
+                web3_service.get_transaction_receipts(tx_hashes)
+            self.assertEqual(5, len(node.requests))
+
+            # Not found results are not retried. Blocks not mined yet are never cached, so all of them are requested
+            node.requests.clear()
+            with self.assertRaises(UnknownBlock):
+                web3_service.get_blocks([10, 11, 12])
+            self.assertEqual(3, len(node.methods_requested('eth_getBlockByNumber')))
+
+    def test_adaptive_batch_size(self):
+        node = FakeNode(blocks=40, txs_per_block=2)
+        node.max_batch_size = 6
+        with FakeHTTPNodeServer(node) as server:
+            # Concurrent batches are sent with the same size before the node answers, so the node limit is
+            # learned with fewer probes. Rejected sizes are still never used again
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0)
+            self.assertEqual(list(range(40)), sorted(web3_service.get_blocks(range(40))))
+            self.assertLess(web3_service.blocks_batch_size.ceiling, 10)
+            self.assertLessEqual(web3_service.blocks_batch_size.size, web3_service.blocks_batch_size.ceiling)
+
+            # Sending one batch at a time, the node limit is found probing bigger sizes
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0,
+                                       max_workers=1)
+            blocks = web3_service.get_blocks(range(40))
+            self.assertEqual(list(range(40)), sorted(blocks))
+            self.assertLessEqual(web3_service.blocks_batch_size.size, 6)
+            # Receipts batch size is independent
+            self.assertEqual(10, web3_service.receipts_batch_size.size)
+
+            node.max_batch_size = 1
+            tx_hashes = blocks[0]['transactions']
+            self.assertEqual(set(tx_hashes), set(web3_service.get_transaction_receipts(tx_hashes)))
+            self.assertEqual(1, web3_service.receipts_batch_size.size)
+
+            # Batch size is shrunk if responses are too big
+            node.max_batch_size = None
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0,
+                                       max_batch_response_size=1000)
+            self.assertEqual(1000, web3_service.blocks_batch_size.max_response_size)
+            self.assertEqual(list(range(40)), sorted(web3_service.get_blocks(range(40))))
+            self.assertLess(web3_service.blocks_batch_size.size, 10)
+
+            # Batch size is fixed if not adaptive, but rejected batches are still split
+            node.max_batch_size = 4
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0,
+                                       adaptive_batch_requests=False)
+            self.assertEqual(list(range(40)), sorted(web3_service.get_blocks(range(40))))
+            self.assertEqual(10, web3_service.blocks_batch_size.size)
+
+    def test_batch_timeout(self):
+        node = FakeNode(blocks=10, txs_per_block=2)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0,
+                                       max_batch_retries=2)
+            web3_service.batch_transport.timeout = 0.1
+            node.delay = 0.3
+            node.payloads = 0
+            with self.assertRaises(BatchRequestTimeout):
+                web3_service.get_blocks(range(10))
+            # Timed out batches are sent again, but not split as the node could be just slow
+            self.assertEqual(3, node.payloads)
+            self.assertEqual(10, web3_service.blocks_batch_size.size)
+
+            node.delay = 0
+            self.assertEqual(list(range(10)), sorted(web3_service.get_blocks(range(10))))
+
+    def test_supports_logs_range(self):
+        node = FakeNode(blocks=150, txs_per_block=1)
+        with FakeHTTPNodeServer(node) as server:
+            self.assertTrue(Web3Service(HTTPProvider(server.uri)).supports_logs_range())
+            logs_filter = node.methods_requested('eth_getLogs')[-1]['params'][0]
+            # Last blocks, like the ones requested when following the chain
+            self.assertEqual(('0x32', '0x95'), (logs_filter['fromBlock'], logs_filter['toBlock']))
+
+            # Ranges refused for being too big are split
+            node.max_logs_per_request = 10
+            self.assertTrue(Web3Service(HTTPProvider(server.uri)).supports_logs_range())
+            node.max_logs_per_request = None
+
+            # Node only returning logs of old blocks
+            node.logs_indexed_to_block = 0
+            self.assertFalse(Web3Service(HTTPProvider(server.uri)).supports_logs_range())
+
+    def test_get_logs_bisecting_range(self):
+        node = FakeNode(blocks=40, txs_per_block=2)
+        node.max_logs_per_request = 10
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_logs_per_filter=10)
+            logs = web3_service.get_logs_for_event_using_filter(0, 39, FakeNode.event_topic)
+            self.assertEqual(80, len(logs))
+            self.assertEqual(sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])), logs)
+            # 2 logs per block, so 5 blocks per window
+            self.assertEqual(5, web3_service.logs_window_sizes[FakeNode.event_topic])
+
+            # Learned window is reused, no more refused ranges
+            node.requests.clear()
+            logs = web3_service.get_logs_for_event_using_filter(0, 39, FakeNode.event_topic)
+            self.assertEqual(80, len(logs))
+            self.assertEqual(8, len(node.methods_requested('eth_getLogs')))
+
+            # Other errors are not retried
+            node.fail('eth_getLogs', None)
+            with self.assertRaises(ValueError):
+                web3_service.get_logs_for_address_using_filter(0, 39, Web3.toChecksumAddress(fake_address(0)))
+            self.assertEqual(1, len(node.methods_requested('eth_getLogs')) - 8)
+
+    def test_get_logs_for_events_using_filter(self):
+        node = FakeNode(blocks=30, txs_per_block=3)
+        other_topic = '0x' + 'cd' * 32
+        for receipt in node.receipts.values():
+            if receipt['transactionIndex'] == '0x1':
+                receipt['logs'][0]['topics'] = [other_topic]
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_workers=4)
+            logs = web3_service.get_logs_for_events_using_filter(0, 29, [FakeNode.event_topic, other_topic])
+            self.assertEqual(90, len(logs))
+            # Merged in block order and log order inside the block
+            self.assertEqual([(block_number, log_index) for block_number in range(30) for log_index in range(3)],
+                             [(log['blockNumber'], log['logIndex']) for log in logs])
+            # 2 events * 4 windows
+            self.assertEqual(8, len(node.methods_requested('eth_getLogs')))
+
+            node.requests.clear()
+            logs = web3_service.get_logs_for_events_using_filter(5, 9, [other_topic], window_size=1)
+            self.assertEqual(5, len(logs))
+            self.assertEqual(5, len(node.methods_requested('eth_getLogs')))
+            self.assertEqual([], web3_service.get_logs_for_events_using_filter(5, 9, []))
+
+    def test_iter_logs_for_events_using_filter(self):
+        node = FakeNode(blocks=30, txs_per_block=3)
+        node.max_logs_per_request = 20
+        other_topic = '0x' + 'cd' * 32
+        for receipt in node.receipts.values():
+            if receipt['transactionIndex'] == '0x1':
+                receipt['logs'][0]['topics'] = [other_topic]
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_logs_per_filter=20)
+            logs = web3_service.iter_logs_for_events_using_filter(0, 29, [FakeNode.event_topic, other_topic])
+            self.assertEqual(0, len(node.methods_requested('eth_getLogs')))
+            logs = list(logs)
+            self.assertEqual([(block_number, log_index) for block_number in range(30) for log_index in range(3)],
+                             [(log['blockNumber'], log['logIndex']) for log in logs])
+            # Logs are formatted like web3 `getLogs`
+            self.assertEqual(web3_service.web3.eth.getLogs({'fromBlock': 0, 'toBlock': 9,
+                                                            'topics': [other_topic]}),
+                             [log for log in logs if log['topics'][0].hex() == other_topic][:10])
+            # Ranges with too many logs are split and window is learned
+            self.assertIn(FakeNode.event_topic, web3_service.logs_window_sizes)
+            self.assertIn(other_topic, web3_service.logs_window_sizes)
+
+    def test_get_logs_for_blocks_using_block_receipts(self):
+        node = FakeNode(blocks=10, txs_per_block=3)
+        node.block_receipts_methods = ('parity_getBlockReceipts',)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), batch_retry_backoff=0)
+            blocks = web3_service.get_blocks(range(10))
+            node.requests.clear()
+            block_number_with_logs = web3_service.get_logs_for_blocks(blocks.values())
+            self.assertEqual(3, len(block_number_with_logs[7]))
+            self.assertEqual('parity_getBlockReceipts', web3_service.get_block_receipts_method(blocks[0]))
+            # Detection of the supported method and 1 request per block
+            self.assertEqual(1, len(node.methods_requested('eth_getBlockReceipts')))
+            self.assertEqual(11, len(node.methods_requested('parity_getBlockReceipts')))
+            self.assertEqual(0, len(node.methods_requested('eth_getTransactionReceipt')))
+
+            # Receipts are retrieved transaction by transaction if block receipts fail
+            node.requests.clear()
+            node.fail('parity_getBlockReceipts', '0x3', times=4)
+            self.assertEqual(block_number_with_logs, web3_service.get_logs_for_blocks(blocks.values()))
+            self.assertEqual(3, len(node.methods_requested('eth_getTransactionReceipt')))
+
+            # Disabled
+            web3_service = Web3Service(HTTPProvider(server.uri), block_receipts_method=None)
+            node.requests.clear()
+            self.assertEqual(block_number_with_logs, web3_service.get_logs_for_blocks(blocks.values()))
+            self.assertEqual(0, len(node.methods_requested('parity_getBlockReceipts')))
+            self.assertEqual(30, len(node.methods_requested('eth_getTransactionReceipt')))
+
+    def test_coalesced_requests(self):
+        node = FakeNode(blocks=10, txs_per_block=1)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), block_cache_size=0)
+            node.delay = 0.2
+            node.requests.clear()
+            blocks_results, block_results = [], []
+            threads = [threading.Thread(target=lambda: blocks_results.append(web3_service.get_blocks(range(10))))
+                       for _ in range(3)]
+            threads.extend(threading.Thread(target=lambda: block_results.append(web3_service.get_block(3)))
+                           for _ in range(3))
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # Every block was only requested once, `get_block` and batches join each other
+            self.assertEqual(10, len(node.methods_requested('eth_getBlockByNumber')))
+            self.assertGreater(web3_service.single_flight.coalesced, 0)
+            self.assertEqual([list(range(10))] * 3, [sorted(blocks) for blocks in blocks_results])
+            self.assertEqual([3] * 3, [block['number'] for block in block_results])
+
+            # Reorg checks (not using the cache) join batches too
+            node.requests.clear()
+            threads = [threading.Thread(target=lambda: blocks_results.append(web3_service.get_blocks([8, 9]))),
+                       threading.Thread(target=lambda: block_results.append(
+                           web3_service.get_block(9, use_cache=False)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(2, len(node.methods_requested('eth_getBlockByNumber')))
+            self.assertEqual(9, block_results[-1]['number'])
+
+    def test_rate_limiter(self):
+        node = FakeNode(blocks=40, txs_per_block=1)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, block_cache_size=0,
+                                       adaptive_batch_requests=False, max_requests_per_second=40)
+            start = time.monotonic()
+            web3_service.get_blocks(range(40))
+            web3_service.get_blocks(range(40))
+            # 40 requests of burst, the other 40 at 40 requests per second
+            self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+            # Rate limited batches are sent again instead of being split
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=10, batch_retry_backoff=0,
+                                       block_cache_size=0)
+            node.rate_limited_payloads = 1
+            node.requests.clear()
+            self.assertEqual(list(range(10)), sorted(web3_service.get_blocks(range(10))))
+            self.assertEqual(10, len(node.methods_requested('eth_getBlockByNumber')))
+            self.assertGreaterEqual(web3_service.blocks_batch_size.size, 10)
+
+    def test_compression(self):
+        node = FakeNode(blocks=50, txs_per_block=1)
+        node.compressed_responses = True
+        with FakeHTTPNodeServer(node) as server:
+            # Requests are not compressed by default
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=50, block_cache_size=0,
+                                       adaptive_batch_requests=False)
+            self.assertEqual(list(range(50)), sorted(web3_service.get_blocks(range(50))))
+            self.assertEqual(0, node.compressed_payloads)
+
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=50, block_cache_size=0,
+                                       adaptive_batch_requests=False, request_compression='auto')
+            self.assertEqual(list(range(50)), sorted(web3_service.get_blocks(range(50))))
+            self.assertEqual(1, node.compressed_payloads)
+            metrics = web3_service.get_connection_metrics()
+            self.assertLess(metrics['request_wire_bytes'], metrics['request_bytes'])
+            self.assertLess(metrics['response_wire_bytes'], metrics['response_bytes'])
+
+            # Node doesn't support compressed requests, they are sent again uncompressed
+            node.compressed_requests = False
+            node.compressed_payloads = 0
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=50, block_cache_size=0,
+                                       adaptive_batch_requests=False, request_compression='auto')
+            self.assertEqual(list(range(50)), sorted(web3_service.get_blocks(range(50))))
+            self.assertFalse(web3_service.batch_transport.request_compression.enabled)
+            self.assertEqual(0, node.compressed_payloads)
+
+            # Proxy for the node always receives compressed requests
+            node.compressed_requests = True
+            web3_service = Web3Service(HTTPProvider(server.uri), max_batch_requests=50, block_cache_size=0,
+                                       adaptive_batch_requests=False, request_compression=None,
+                                       compressed_proxy_uri=server.uri + '/')
+            self.assertEqual(list(range(50)), sorted(web3_service.get_blocks(range(50))))
+            self.assertEqual(server.uri + '/', web3_service.batch_transport.endpoint_uri)
+            self.assertEqual('gzip', web3_service.batch_transport.request_compression.encoding)
+            self.assertEqual(1, node.compressed_payloads)
+
+    def test_raw_requests(self):
+        node = FakeNode(blocks=5, txs_per_block=1)
+        with FakeHTTPNodeServer(node) as server:
+            raw_web3_service = Web3Service(HTTPProvider(server.uri), block_cache_size=0)
+            web3_service = Web3Service(HTTPProvider(server.uri), block_cache_size=0, raw_requests=False)
+            self.assertTrue(raw_web3_service.raw_requests)
+            self.assertEqual(web3_service.get_current_block_number(), raw_web3_service.get_current_block_number())
+
+            # Results are formatted like web3 does
+            for block_identifier in (3, node.blocks[3]['hash']):
+                self.assertEqual(web3_service.get_block(block_identifier),
+                                 raw_web3_service.get_block(block_identifier))
+
+            tx_hash = node.blocks[3]['transactions'][0]
+            receipt = raw_web3_service.get_transaction_receipt(tx_hash)
+            self.assertEqual(web3_service.get_transaction_receipt(tx_hash), receipt)
+            self.assertEqual(3, receipt.blockNumber)
+            self.assertEqual(3, receipt['logs'][0]['blockNumber'])
+            with self.assertRaises(UnknownTransaction):
+                raw_web3_service.get_transaction_receipt('0x' + '12' * 32)
+            with self.assertRaises(UnknownBlock):
+                raw_web3_service.get_block(10)
+
+        # Providers without batch transport use web3
+        self.assertFalse(Web3Service(EthereumTesterProvider(EthereumTester())).raw_requests)
+
+    def test_block_cache(self):
+        node = FakeNode(blocks=10, txs_per_block=1)
+        with FakeHTTPNodeServer(node) as server:
+            web3_service = Web3Service(HTTPProvider(server.uri))
+            blocks = web3_service.get_blocks(range(10))
+            node.requests.clear()
+            self.assertEqual(blocks, web3_service.get_blocks(range(10)))
+            self.assertEqual(blocks[3], web3_service.get_block(3))
+            # Blocks are also found by hash
+            self.assertEqual(blocks[3], web3_service.get_block(blocks[3]['hash']))
+            self.assertEqual(blocks[3], web3_service.get_block(node.blocks[3]['hash']))
+            self.assertEqual(0, len(node.requests))
+
+            # Blocks are formatted like web3 does, no matter how they were retrieved. They cannot be modified,
+            # so cache is never changed by the caller
+            self.assertEqual(HexBytes(node.blocks[3]['hash']), blocks[3]['hash'])
+            self.assertEqual([HexBytes(tx_hash) for tx_hash in node.blocks[3]['transactions']],
+                             blocks[3]['transactions'])
+            self.assertEqual(blocks[3], web3_service.get_block(3, use_cache=False))
+            with self.assertRaises(TypeError):
+                blocks[3]['hash'] = fake_hash(0xc0, 3)
+
+            # Full transactions are not cached
+            web3_service.get_blocks([3, 4], full_transactions=True)
+            self.assertEqual(2, len(node.methods_requested('eth_getBlockByNumber')))
+
+            # Node was resynced to a lower block, cached blocks above its head are removed
+            del node.blocks[9]
+            self.assertEqual(8, web3_service.get_current_block_number())
+            self.assertIsNone(web3_service.block_cache.get(9))
+
+            # Block 8 changed, head of the chain and reorg checks don't use cache
+            node.blocks[8]['hash'] = fake_hash(0xc0, 8)
+            node.requests.clear()
+            self.assertEqual(HexBytes(fake_hash(0xc0, 8)), web3_service.get_current_block()['hash'])
+            self.assertEqual(HexBytes(fake_hash(0xc0, 8)), web3_service.get_block(8, use_cache=False)['hash'])
+            self.assertEqual(2, len(node.methods_requested('eth_getBlockByNumber')))
+            self.assertEqual(HexBytes(fake_hash(0xc0, 8)), web3_service.get_blocks([8])[8]['hash'])
+            self.assertEqual(2, len(node.methods_requested('eth_getBlockByNumber')))
+
+    def test_map_concurrently(self):
+        web3_service = Web3Service(IPCProvider(ipc_path='/tmp/not-existing.ipc'), max_workers=3)
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def work(item):
+            with lock:
+                running.append(item)
+                max_running.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(item)
+            return item * 2
+
+        self.assertEqual([item * 2 for item in range(20)], web3_service.map_concurrently(work, range(20)))
+        self.assertEqual(3, max(max_running))
+        # Workers are reused
+        executor = web3_service.executor
+        web3_service.map_concurrently(work, range(5))
+        self.assertIs(executor, web3_service.executor)
+
+        # Nested calls run in the worker thread instead of waiting for other workers
+        def nested_work(item):
+            thread = threading.current_thread()
+            return web3_service.map_concurrently(lambda _: threading.current_thread() is thread, range(5))
+
+        self.assertTrue(all(all(results) for results in web3_service.map_concurrently(nested_work, range(10))))
+
+        with self.assertRaises(ZeroDivisionError):
+            web3_service.map_concurrently(lambda item: 1 / item, range(5))
+        web3_service.close()
@@ -1,6 +1,6 @@
 from json import loads
 
-from ..chainevents import AbstractEventReceiver
+from ..chainevents import AbstractAddressesGetter, AbstractEventReceiver
 
 abi = loads(
     '[{"inputs": [{"type": "address", "name": ""}], "constant": true, "name": "isInstantiation", "payable": false, '
@@ -257,3 +257,28 @@ class ErroredCentralizedOraclesReceiver(AbstractEventReceiver):
 
     def rollback(self, decoded_event, block_info):
         1/0
+
+
+class CreatedContractsAddressesGetter(AbstractAddressesGetter):
+    """
+    Addresses of the contracts created by `ContractCreationReceiver`
+    """
+    addresses = []
+
+    def get_addresses(self):
+        return list(self.addresses)
+
+    def __contains__(self, address):
+        return address in self.addresses
+
+
+class ContractCreationReceiver(AbstractEventReceiver):
+    """
+    A dummy factory receiver, stores the address of `ContractInstantiation` events
+    """
+    def save(self, decoded_event, block_info):
+        CreatedContractsAddressesGetter.addresses.append(decoded_event['params'][1]['value'])
+        return decoded_event
+
+    def rollback(self, decoded_event, block_info):
+        CreatedContractsAddressesGetter.addresses.pop()
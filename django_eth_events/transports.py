@@ -0,0 +1,307 @@
+import asyncio
+import concurrent.futures
+import logging
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from .compression import RequestCompression, is_compression_rejected
+from .exceptions import (BatchRequestRejected, BatchRequestTimeout,
+                         RateLimitExceeded, Web3ConnectionException)
+from .json_codec import json_codec
+from .streaming import JsonDocumentScanner
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResponse(list):
+    """
+    List of JSON-RPC responses, also storing the size in bytes of the raw response
+    """
+    def __init__(self, responses, size: int=0):
+        super().__init__(responses)
+        self.size = size
+
+
+class BatchTransport:
+    """
+    Sends batched JSON-RPC requests (a list of requests) in one single write to the node and
+    returns the responses in the same order of the requests, matching them by `id`
+    """
+
+    def send(self, rpc_request: List[Dict[str, Any]], timeout: Optional[int]=None) -> BatchResponse:
+        """
+        :param rpc_request: list of JSON-RPC requests, every one of them with a unique `id`
+        :param timeout: Timeout for this batch, timeout of the transport if not provided
+        :raises Web3ConnectionException
+        :raises BatchRequestRejected: if batch is too big or node is rate limiting
+        :raises BatchRequestTimeout: if node doesn't answer in time
+        :return: list of JSON-RPC responses, sorted like `rpc_request`
+        """
+        if not rpc_request:
+            return BatchResponse([])
+        rpc_response, size = self._send(rpc_request, timeout=timeout)
+        if isinstance(rpc_response, dict):
+            # Node rejected the whole batch, e.g. {"id": null, "error": {"message": "batch too large"}}
+            raise BatchRequestRejected('Node rejected batch of %d requests: %s' % (len(rpc_request),
+                                                                                  rpc_response.get('error')))
+        return BatchResponse(self.demultiplex(rpc_request, rpc_response), size=size)
+
+    def request(self, rpc_request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends only one JSON-RPC request, not batched
+        :raises Web3ConnectionException
+        :return: JSON-RPC response
+        """
+        rpc_response, _ = self._send(rpc_request)
+        if not isinstance(rpc_response, dict):
+            raise Web3ConnectionException('Not valid response for %s request' % rpc_request.get('method'))
+        return rpc_response
+
+    def _send(self, rpc_request, timeout: Optional[int]=None) -> Tuple[Any, int]:
+        """
+        :param rpc_request: list of JSON-RPC requests or only one request
+        :param timeout: Timeout for the request, timeout of the transport if not provided
+        :return: Tuple (decoded response, size of raw response in bytes)
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def demultiplex(rpc_request: List[Dict[str, Any]], rpc_response) -> List[Dict[str, Any]]:
+        """
+        Nodes don't need to return batched responses in order, so match them by id. Requests
+        without response are returned as JSON-RPC errors
+        :param rpc_request: list of JSON-RPC requests
+        :param rpc_response: raw decoded response from the node
+        :return: list of JSON-RPC responses, sorted like `rpc_request`
+        """
+        if isinstance(rpc_response, dict):
+            # Node rejected the whole batch, e.g. {"id": null, "error": {...}}
+            return [dict(rpc_response, id=request['id']) for request in rpc_request]
+
+        responses_by_id = {response.get('id'): response for response in rpc_response}
+        return [responses_by_id.get(request['id'],
+                                    {'jsonrpc': '2.0',
+                                     'id': request['id'],
+                                     'error': {'code': -32603, 'message': 'Missing response'}})
+                for request in rpc_request]
+
+
+class HttpBatchTransport(BatchTransport):
+    """
+    Sends batches using http/s. Responses are requested compressed (gzip/deflate) and requests are compressed
+    depending on `request_compression`
+    """
+
+    def __init__(self, endpoint_uri: str, session: Optional[requests.Session]=None, timeout: Optional[int]=None,
+                 request_compression: Optional[str]=None):
+        """
+        :param request_compression: `None` (not compressed), `auto` (negotiated with the node), `gzip` or `deflate`.
+        See `RequestCompression`
+        """
+        self.endpoint_uri = endpoint_uri
+        self.session = session or requests.session()
+        self.timeout = timeout
+        self.request_compression = RequestCompression(request_compression)
+        # Size of the responses, decompressed and as received
+        self.response_bytes = 0
+        self.response_wire_bytes = 0
+
+    def _post(self, data: bytes, requests_count: int, timeout: Optional[int]=None) -> requests.Response:
+        body, headers = self.request_compression.encode(data)
+        try:
+            response = self.session.post(self.endpoint_uri, data=body, headers=headers,
+                                         timeout=timeout or self.timeout)
+        except requests.exceptions.ReadTimeout as e:
+            raise BatchRequestTimeout('Timeout for batch of %d requests' % requests_count) from e
+        except requests.exceptions.RequestException as e:
+            raise Web3ConnectionException('Cannot send batch request to %s' % self.endpoint_uri) from e
+
+        if 'Content-Encoding' in headers and is_compression_rejected(response.status_code, response.content) \
+                and self.request_compression.rejected():
+            return self._post(data, requests_count, timeout=timeout)
+        return response
+
+    def _send(self, rpc_request, timeout: Optional[int]=None):
+        requests_count = len(rpc_request) if isinstance(rpc_request, list) else 1
+        response = self._post(json_codec.dumps_bytes(rpc_request), requests_count, timeout=timeout)
+
+        if response.status_code == 429:
+            raise RateLimitExceeded('Node rate limited batch of %d requests' % requests_count)
+        elif response.status_code == 413:
+            raise BatchRequestRejected('Node rejected batch of %d requests with HTTP %d' % (requests_count,
+                                                                                          response.status_code))
+        try:
+            response.raise_for_status()
+            content = response.content
+            self.response_bytes += len(content)
+            self.response_wire_bytes += self.get_wire_size(response)
+            return json_codec.loads(content), len(content)
+        except (requests.exceptions.HTTPError, ValueError) as e:
+            raise Web3ConnectionException('Not valid response from %s' % self.endpoint_uri) from e
+
+    @staticmethod
+    def get_wire_size(response: requests.Response) -> int:
+        """
+        :return: bytes received for the body, compressed if node compressed the response
+        """
+        try:
+            return response.raw.tell()
+        except (AttributeError, OSError):
+            return len(response.content)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """
+        :return: Dictionary with bytes of the requests (`request_bytes`) and responses (`response_bytes`),
+        and bytes really sent (`request_wire_bytes`) and received (`response_wire_bytes`) after compression
+        """
+        return {
+            'request_bytes': self.request_compression.bytes,
+            'request_wire_bytes': self.request_compression.compressed_bytes,
+            'response_bytes': self.response_bytes,
+            'response_wire_bytes': self.response_wire_bytes,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class IPCBatchTransport(BatchTransport):
+    """
+    Keeps persistent connections to the IPC socket. Every batch takes an idle connection (or opens a new one) and
+    returns it when the response is read, so batches sent concurrently are not interleaved on the same socket and
+    there are never more connections than batches in flight
+    """
+
+    recv_buffer_size = 65536
+
+    def __init__(self, ipc_path: str, timeout: int=10):
+        self.ipc_path = ipc_path
+        self.timeout = timeout
+        self._idle_sockets = []
+        self._lock = threading.Lock()
+
+    def _get_socket(self) -> socket.socket:
+        with self._lock:
+            if self._idle_sockets:
+                return self._idle_sockets.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.ipc_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def close(self):
+        with self._lock:
+            idle_sockets, self._idle_sockets = self._idle_sockets, []
+        for sock in idle_sockets:
+            sock.close()
+
+    def _send(self, rpc_request, timeout: Optional[int]=None):
+        sock = None
+        try:
+            sock = self._get_socket()
+            sock.settimeout(timeout or self.timeout)
+            sock.sendall(json_codec.dumps_bytes(rpc_request))
+            response = self._read_response(sock)
+        except socket.timeout as e:
+            if sock is not None:
+                sock.close()
+            raise BatchRequestTimeout('Timeout for batch of %d requests' % len(rpc_request)) from e
+        except (OSError, ValueError) as e:
+            # Connection is not reusable after a failure, there could be pending data on the socket
+            if sock is not None:
+                sock.close()
+            raise Web3ConnectionException('Cannot send batch request using IPC socket %s' % self.ipc_path) from e
+        with self._lock:
+            self._idle_sockets.append(sock)
+        return response
+
+    def _read_response(self, sock: socket.socket):
+        chunks = []
+        scanner = JsonDocumentScanner()
+        while True:
+            chunk = sock.recv(self.recv_buffer_size)
+            if not chunk:
+                raise ConnectionResetError('IPC socket closed by the node')
+            chunks.append(chunk)
+            # Only decode when the response is complete
+            if scanner.feed(chunk):
+                raw_response = b''.join(chunks)
+                return json_codec.loads(raw_response), len(raw_response)
+
+
+class WebsocketBatchTransport(BatchTransport):
+    """
+    Keeps one persistent websocket connection, running its own event loop in a background thread.
+    Only one batch can be in flight at the same time, as responses cannot be told apart from
+    the ones of a different batch
+    """
+
+    def __init__(self, endpoint_uri: str, timeout: int=10, websocket_kwargs: Optional[Dict[str, Any]]=None):
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+        self.websocket_kwargs = websocket_kwargs or {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._connection = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    async def _send_async(self, payload: str):
+        import websockets
+        if self._connection is None:
+            self._connection = await websockets.connect(self.endpoint_uri, **self.websocket_kwargs)
+        await self._connection.send(payload)
+        return await self._connection.recv()
+
+    def _send(self, rpc_request, timeout: Optional[int]=None):
+        with self._lock:
+            future = asyncio.run_coroutine_threadsafe(self._send_async(json_codec.dumps(rpc_request)), self._get_loop())
+            try:
+                raw_response = future.result(timeout or self.timeout)
+            except concurrent.futures.TimeoutError as e:
+                future.cancel()
+                self.close()
+                raise BatchRequestTimeout('Timeout for batch of %d requests' % len(rpc_request)) from e
+            except Exception as e:
+                future.cancel()
+                self.close()
+                raise Web3ConnectionException('Cannot send batch request using websocket %s' %
+                                              self.endpoint_uri) from e
+        return json_codec.loads(raw_response), len(raw_response)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(connection.close(), self._loop)
+
+
+def get_batch_transport_from_uri(node_uri: str, timeout: Optional[int]=None,
+                                 session: Optional[requests.Session]=None) -> BatchTransport:
+    """
+    :param node_uri: http/s, ipc or ws uri of the node
+    :param timeout: Timeout for requests
+    :param session: Session for http/s nodes
+    :return: batch transport for the node
+    """
+    if node_uri.startswith('http'):
+        return HttpBatchTransport(node_uri, session=session, timeout=timeout or 10)
+    elif node_uri.startswith('ipc'):
+        return IPCBatchTransport(node_uri.replace('ipc://', ''), timeout=timeout or 10)
+    elif node_uri.startswith('ws'):
+        return WebsocketBatchTransport(node_uri, timeout=timeout or 10)
+    else:
+        raise ValueError('%s uri is not supported. Must start by http, ipc or ws' % node_uri)
@@ -1,19 +1,41 @@
 import concurrent.futures
+import copy
+import heapq
+import itertools
 import logging
 import socket
-from typing import Dict, List, Tuple
+import threading
+import time
+from contextlib import closing
+from typing import (Any, Callable, Dict, Iterable, Iterator, List,
+                    Optional, Tuple)
 
-import requests
 from django.core.exceptions import ImproperlyConfigured
 from eth_tester import EthereumTester
-from requests.exceptions import ConnectionError
-from web3 import HTTPProvider, IPCProvider, Web3
+from hexbytes import HexBytes
+from requests.exceptions import ConnectionError, Timeout
+from web3 import HTTPProvider, IPCProvider, Web3, WebsocketProvider
+from web3.datastructures import AttributeDict
 from web3.exceptions import UnhandledRequest
 from web3.middleware import geth_poa_middleware
+from web3.middleware.pythonic import (block_formatter, log_entry_formatter,
+                                      receipt_formatter)
 from web3.providers.eth_tester import EthereumTesterProvider
 
-from .exceptions import (UnknownBlock, UnknownTransaction,
+from .batching import AdaptiveBatchSize
+from .block_cache import BlockCache, normalize_hash
+from .compression import SUPPORTED_ENCODINGS
+from .connection_pool import ConnectionPool, PooledHTTPProvider
+from .exceptions import (BatchRequestRejected, BatchRequestTimeout,
+                         RateLimitExceeded, UnknownBlock, UnknownTransaction,
                          Web3ConnectionException)
+from .json_codec import json_codec
+from .node_pool import NodePoolProvider
+from .rate_limiter import RateLimiter, RequestPriority
+from .single_flight import SingleFlight
+from .streaming import iter_json_rpc_result
+from .transports import (BatchTransport, HttpBatchTransport,
+                         IPCBatchTransport, WebsocketBatchTransport)
 
 logger = logging.getLogger(__name__)
 
@@ -24,15 +46,45 @@ class Web3ServiceProvider:
     def __new__(cls):
         if not hasattr(cls, 'instance'):
             from django.conf import settings
-            provider = Web3Service.get_provider_from_uri(settings.ETHEREUM_NODE_URL)
+            node_uris = getattr(settings, 'ETHEREUM_NODE_URLS', None) or [settings.ETHEREUM_NODE_URL]
+            provider = Web3Service.get_provider_from_uris(node_uris)
             cls.instance = Web3Service(provider,
                                        settings.ETHEREUM_MAX_WORKERS,
-                                       settings.ETHEREUM_MAX_BATCH_REQUESTS)
+                                       settings.ETHEREUM_MAX_BATCH_REQUESTS,
+                                       adaptive_batch_requests=getattr(settings,
+                                                                       'ETHEREUM_ADAPTIVE_BATCH_REQUESTS', True),
+                                       block_receipts_method=getattr(settings,
+                                                                     'ETHEREUM_BLOCK_RECEIPTS_METHOD', 'auto'),
+                                       max_requests_per_second=getattr(settings,
+                                                                       'ETHEREUM_MAX_REQUESTS_PER_SECOND', None),
+                                       max_weight_per_second=getattr(settings,
+                                                                     'ETHEREUM_MAX_WEIGHT_PER_SECOND', None),
+                                       request_compression=getattr(settings,
+                                                                   'ETHEREUM_REQUEST_COMPRESSION', None),
+                                       compressed_proxy_uri=getattr(settings,
+                                                                    'ETHEREUM_COMPRESSED_PROXY_URL', None),
+                                       raw_requests=getattr(settings, 'ETHEREUM_RAW_REQUESTS', True),
+                                       max_batch_response_size=getattr(settings,
+                                                                       'ETHEREUM_MAX_BATCH_RESPONSE_SIZE', None))
         return cls.instance
 
 
 class Web3Service:
-    connection_exceptions: Tuple[Exception] = (UnhandledRequest, socket.timeout, ConnectionError)
+    connection_exceptions: Tuple[Exception] = (UnhandledRequest, socket.timeout, ConnectionError,
+                                               Web3ConnectionException)
+    # Errors returned by nodes when a `eth_getLogs` range has too many logs or takes too long
+    logs_range_too_big_messages: Tuple[str] = ('more than', 'too many', 'too large', 'limit exceeded',
+                                               'size exceeded', 'timeout', 'timed out')
+    # Exceptions raised when a node refuses a `eth_getLogs` request
+    logs_range_exceptions: Tuple[Exception] = (ValueError, Timeout, socket.timeout)
+    # Window key learned for `eth_getLogs` requests without address or topics filter
+    all_logs_window_key: str = '*'
+    # Methods returning every receipt of a block, in order of preference
+    block_receipts_methods: Tuple[str] = ('eth_getBlockReceipts', 'parity_getBlockReceipts')
+    # Bytes read from the node every time when streaming responses
+    stream_chunk_size: int = 1 << 16
+    # Last blocks requested with `eth_getLogs` to check if node supports block ranges
+    logs_range_probe_blocks: int = 100
 
     @staticmethod
     def get_provider_from_uri(node_uri: str):
@@ -41,45 +93,221 @@ class Web3Service:
         elif node_uri.startswith('ipc'):
             path = node_uri.replace('ipc://', '')
             return IPCProvider(ipc_path=path)
+        elif node_uri.startswith('ws'):
+            return WebsocketProvider(node_uri)
         elif node_uri.startswith('test'):
             return EthereumTesterProvider(EthereumTester())
         else:
-            raise ValueError('%s uri is not supported. Must start by http, ipc, or test' % node_uri)
+            raise ValueError('%s uri is not supported. Must start by http, ipc, ws or test' % node_uri)
+
+    @staticmethod
+    def get_provider_from_uris(node_uris: List[str]):
+        """
+        :param node_uris: uris of the nodes
+        :return: provider for the node if there's only one uri, `NodePoolProvider` balancing the nodes otherwise
+        """
+        if len(node_uris) == 1:
+            return Web3Service.get_provider_from_uri(node_uris[0])
+        return NodePoolProvider(node_uris)
 
     def __init__(self, provider,
-                 max_workers: int=10, max_batch_requests: int=10, slow_provider_timeout: int=400):
+                 max_workers: int=10, max_batch_requests: int=10, slow_provider_timeout: int=400,
+                 max_batch_retries: int=3, batch_retry_backoff: float=0.5, adaptive_batch_requests: bool=True,
+                 max_logs_per_filter: int=10000, block_cache_size: int=1000, finality_depth: int=100,
+                 max_in_flight_tasks: Optional[int]=None, block_receipts_method: Optional[str]='auto',
+                 max_requests_per_second: Optional[float]=None, max_weight_per_second: Optional[float]=None,
+                 request_compression: Optional[str]=None, compressed_proxy_uri: Optional[str]=None,
+                 raw_requests: bool=True, max_batch_response_size: Optional[int]=None):
         """
         :param node_uri: Node http address. If uri starts with 'test', EthereumTester will be used
         :param max_workers: Max workers for multithread calls. 1 -> No multithread
         :param max_batch_requests: Max requests in the same batch for RPC
         :param self.slow_provider_timeout: Timeout for time lasting requests (like filters)
+        :param max_batch_retries: Max retries for failed requests of a batch
+        :param batch_retry_backoff: Seconds to wait before first retry of failed requests, doubled every retry
+        :param adaptive_batch_requests: If True, `max_batch_requests` is only the initial size of the batches and
+        it's adapted to the node response time, response size and rejected batches
+        :param max_logs_per_filter: Expected max number of logs returned by one `eth_getLogs`, used to learn the
+        window of blocks requested for every event
+        :param block_cache_size: Max number of block headers cached. 0 disables the cache
+        :param finality_depth: Block headers older than this depth are not cached
+        :param max_in_flight_tasks: Max tasks submitted to the workers (running or waiting) at the same time,
+        shared by every call. By default twice `max_workers`
+        :param block_receipts_method: Method to retrieve every receipt of a block with only one request
+        (`eth_getBlockReceipts` or `parity_getBlockReceipts`). `auto` detects if node supports any of them,
+        `None` retrieves receipts transaction by transaction
+        :param max_requests_per_second: Max requests sent to the node per second (every request of a batch counts).
+        `None` for no limit
+        :param max_weight_per_second: Max weight (compute units of hosted nodes) of the requests sent to the node
+        per second. `None` for no limit
+        :param request_compression: Compression of batched http requests: `None` (not compressed), `auto` (gzip
+        until node rejects a compressed request), `gzip` or `deflate`. Responses are always requested compressed
+        :param compressed_proxy_uri: http/s uri of a proxy for the node always accepting compressed requests.
+        If provided, batched requests are sent to the proxy instead of the node
+        :param raw_requests: If True, requests following the head of the chain (block number, blocks and receipts)
+        are sent without the web3 middleware stack when the provider supports it. Results are formatted like web3
+        does. See `_do_raw_request`
+        :param max_batch_response_size: Size in bytes. If adaptive, batch size is shrunk when a batch response
+        is bigger. `None` for no limit
         """
         self.provider = provider
         self.max_workers = max_workers
         self.max_batch_requests = max_batch_requests
         self.slow_provider_timeout = slow_provider_timeout
+        self.max_batch_retries = max_batch_retries
+        self.batch_retry_backoff = batch_retry_backoff
+        self.adaptive_batch_requests = adaptive_batch_requests
+        self.max_batch_response_size = max_batch_response_size
+        self.max_logs_per_filter = max_logs_per_filter
+        self.request_compression = request_compression
+        self.compressed_proxy_uri = compressed_proxy_uri
+        # Number of blocks requested with the same `eth_getLogs` for every event or address, learned from
+        # logs density and ranges refused by the node
+        self.logs_window_sizes: Dict[str, int] = {}
+        # Blocks and receipts have very different sizes, so batch size is adapted independently
+        self.blocks_batch_size = self.build_batch_size()
+        self.receipts_batch_size = self.build_batch_size()
+        self.block_receipts_batch_size = self.build_batch_size()
+        self.block_cache = BlockCache(max_size=block_cache_size, finality_depth=finality_depth,
+                                      formatter=self.format_block)
         self.node_uri = self.get_node_uri()
 
-        self.web3 = Web3(provider)
+        # Every concurrent call uses the same workers, so concurrency against the node is always `max_workers`
+        self.max_in_flight_tasks = max_in_flight_tasks or max_workers * 2
+        self._in_flight_tasks = threading.BoundedSemaphore(self.max_in_flight_tasks)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._worker_state = threading.local()
+        # Identical requests sent at the same time by different threads are only sent once
+        self.single_flight = SingleFlight()
+        self.rate_limiter = RateLimiter(max_requests_per_second, max_weight_per_second)
+
+        # Every http client (main, slow and batch requests) shares the same connection pool
+        self.connection_pool = ConnectionPool(pool_size=max_workers)
+        self.http_session = self.connection_pool.session
+
+        self.web3 = Web3(self.get_pooled_provider(provider))
         self.web3_slow = Web3(self.slow_provider)
-        self.http_session = requests.session()
+        if self.rate_limiter.enabled:
+            for web3 in (self.web3, self.web3_slow):
+                web3.middleware_stack.add(self.rate_limiter_middleware, name='rate_limiter')
+        self.batch_transport = self.get_batch_transport()
+        self._request_ids = itertools.count(1)
+        self._supports_logs_range = None
+        self._block_receipts_method = block_receipts_method
+        self.raw_requests = raw_requests and self.has_batch_transport()
 
         # If rinkeby, inject Geth PoA middleware
         # http://web3py.readthedocs.io/en/latest/middleware.html#geth-style-proof-of-authority
         try:
             if int(self.web3.net.version) == RINKEBY_CHAIN_ID:
                 self.web3.middleware_stack.inject(geth_poa_middleware, layer=0)
+                # Raw requests would not go through the PoA middleware
+                self.raw_requests = False
         # For tests using dummy connections (like IPC)
-        except (UnhandledRequest, ConnectionError, ConnectionRefusedError, FileNotFoundError):
+        except (UnhandledRequest, ConnectionError, ConnectionRefusedError, FileNotFoundError,
+                Web3ConnectionException):
             pass
 
+    def get_pooled_provider(self, provider):
+        """
+        :return: provider using the connection pool if it's a HTTPProvider or a NodePoolProvider created without
+        http session, same provider otherwise
+        """
+        if isinstance(provider, HTTPProvider):
+            return PooledHTTPProvider(endpoint_uri=provider.endpoint_uri,
+                                      request_kwargs=getattr(provider, '_request_kwargs', None),
+                                      session=self.http_session)
+        elif isinstance(provider, NodePoolProvider) and provider.owns_node_pool and provider.session is None:
+            return provider.with_session(self.http_session)
+        return provider
+
+    def rate_limiter_middleware(self, make_request, web3):
+        """
+        Web3 middleware waiting for the rate limiter before every request
+        """
+        def middleware(method, params):
+            self.rate_limiter.acquire_for_methods([method])
+            return make_request(method, params)
+        return middleware
+
+    def priority(self, priority: int):
+        """
+        Requests sent by the thread inside the context (and by the workers running its tasks) use `priority`
+        in the rate limiter
+        :param priority: `RequestPriority`
+        """
+        return self.rate_limiter.priority(priority)
+
+    @property
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def close(self):
+        """
+        Stops the workers. They will be started again if needed
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def map_concurrently(self, function: Callable[[any], any], iterable: Iterable[any]) -> List[any]:
+        """
+        Calls `function` for every item using the workers of the service. Items are submitted lazily while there
+        are less than `max_in_flight_tasks` tasks in flight (for every caller), so generators (like adaptive
+        chunks) are only consumed when a worker is going to be available. If called from a worker, items are
+        processed sequentially in the same thread, as waiting for other workers could deadlock
+        :return: results in the same order than `iterable`
+        :raises: first exception raised by `function`. Pending tasks are cancelled
+        """
+        if self.max_workers <= 1 or getattr(self._worker_state, 'is_worker', False):
+            return [function(item) for item in iterable]
+
+        priority = self.rate_limiter.current_priority
+
+        def run(item):
+            self._worker_state.is_worker = True
+            with self.rate_limiter.priority(priority):
+                return function(item)
+
+        futures = []
+        try:
+            for item in iterable:
+                self._in_flight_tasks.acquire()
+                try:
+                    future = self.executor.submit(run, item)
+                except BaseException:
+                    self._in_flight_tasks.release()
+                    raise
+                future.add_done_callback(lambda _: self._in_flight_tasks.release())
+                futures.append(future)
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def get_connection_metrics(self) -> Dict[str, int]:
+        metrics = self.connection_pool.get_metrics()
+        if isinstance(self.batch_transport, HttpBatchTransport):
+            metrics.update(self.batch_transport.get_metrics())
+        return metrics
+
     @property
     def slow_provider(self):
         if isinstance(self.provider, HTTPProvider):
-            return HTTPProvider(endpoint_uri=self.provider.endpoint_uri,
-                                request_kwargs={'timeout': self.slow_provider_timeout})
+            return PooledHTTPProvider(endpoint_uri=self.provider.endpoint_uri,
+                                      request_kwargs={'timeout': self.slow_provider_timeout},
+                                      session=self.http_session)
         elif isinstance(self.provider, IPCProvider):
             return IPCProvider(ipc_path=self.provider.ipc_path, timeout=self.slow_provider_timeout)
+        elif isinstance(self.provider, NodePoolProvider):
+            # Same pool (and node stats) than the main provider
+            return self.main_provider.clone(timeout=self.slow_provider_timeout)
         else:
             return self.provider
 
@@ -90,10 +318,46 @@ class Web3Service:
     def get_node_uri(self) -> str:
         if isinstance(self.provider, HTTPProvider):
             return self.provider.endpoint_uri
+        elif isinstance(self.provider, NodePoolProvider):
+            # First http node, for clients not supporting several nodes
+            return next((node_uri for node_uri in self.provider.node_uris if node_uri.startswith('http')), None)
 
     def has_http_provider(self):
         return isinstance(self.main_provider, HTTPProvider)
 
+    def get_batch_transport(self) -> Optional[BatchTransport]:
+        """
+        :return: transport for batched JSON-RPC requests, `None` if provider doesn't support batching
+        """
+        if isinstance(self.provider, HTTPProvider):
+            if self.compressed_proxy_uri:
+                # Proxy is known to support compressed requests, no need to negotiate
+                return HttpBatchTransport(self.compressed_proxy_uri, session=self.http_session,
+                                          request_compression=self.request_compression
+                                          if self.request_compression in SUPPORTED_ENCODINGS else 'gzip')
+            return HttpBatchTransport(self.provider.endpoint_uri, session=self.http_session,
+                                      request_compression=self.request_compression)
+        elif isinstance(self.provider, NodePoolProvider):
+            # Same pool (and node stats) than the main provider
+            return self.main_provider.node_pool
+        elif isinstance(self.provider, IPCProvider):
+            return IPCBatchTransport(self.provider.ipc_path, timeout=self.provider.timeout)
+        elif isinstance(self.provider, WebsocketProvider):
+            return WebsocketBatchTransport(self.provider.endpoint_uri,
+                                           websocket_kwargs=getattr(self.provider, 'websocket_kwargs', None))
+
+    def has_batch_transport(self) -> bool:
+        return self.batch_transport is not None
+
+    def build_batch_size(self) -> AdaptiveBatchSize:
+        """
+        :return: batch size controller. If batch size is not adaptive, it will always be `max_batch_requests`
+        """
+        if self.adaptive_batch_requests:
+            return AdaptiveBatchSize(self.max_batch_requests, max_response_size=self.max_batch_response_size)
+        return AdaptiveBatchSize(self.max_batch_requests, min_size=self.max_batch_requests,
+                                 max_size=self.max_batch_requests, max_response_size=self.max_batch_response_size)
+
     def make_sure_cheksumed_address(self, address: str) -> str:
         """
         Makes sure an address is checksumed. If not, returns it checksumed
@@ -120,9 +384,19 @@ class Web3Service:
         :return: <int>
         """
         try:
-            return self.web3.eth.blockNumber
+            # Needed to follow the head of the chain, so it's not delayed by other requests
+            with self.priority(RequestPriority.HIGH):
+                if self.raw_requests:
+                    block_number = int(self._do_coalesced_raw_request('eth_blockNumber'), 16)
+                else:
+                    # Results of web3 are formatted, so they are not shared with raw and batched requests
+                    block_number = self.single_flight.do(('web3', 'eth_blockNumber'),
+                                                         lambda: self.web3.eth.blockNumber)
         except self.connection_exceptions as e:
             raise Web3ConnectionException('Web3 provider is not connected') from e
+        # Cached blocks above the head of the node are not valid anymore
+        self.block_cache.update_head(block_number)
+        return block_number
 
     def get_transaction_receipt(self, transaction_hash):
         """
@@ -132,7 +406,11 @@ class Web3Service:
         :return:
         """
         try:
-            receipt = self.web3.eth.getTransactionReceipt(transaction_hash)
+            if self.raw_requests:
+                receipt = self._get_raw_transaction_receipt(transaction_hash)
+            else:
+                receipt = self.single_flight.do(('web3', 'eth_getTransactionReceipt', transaction_hash),
+                                                self.web3.eth.getTransactionReceipt, transaction_hash)
 
             if not receipt:
                 # Might be because a reorg
@@ -146,48 +424,89 @@ class Web3Service:
     def get_transaction_receipts(self, tx_hashes):
         tx_with_receipt = {}
 
-        if self.has_http_provider():
+        if self.has_batch_transport():
             # Query limit for RPC is 131072
-            for tx_hashes_chunk in self._chunks(tx_hashes, self.max_batch_requests):
+            def get_receipts(tx_hashes_chunk):
                 rpc_request = [self._build_tx_receipt_request(tx_hash) for tx_hash in tx_hashes_chunk]
-                for rpc_response in self._do_request(rpc_request):
-                    tx = rpc_response['result']
+                return tx_hashes_chunk, self._do_batch_request(rpc_request, self.receipts_batch_size)
+
+            # Receipts are returned by the requested hash, so they are found using the hashes of web3 blocks (bytes)
+            for tx_hashes_chunk, receipts in self.map_concurrently(
+                    get_receipts, self._adaptive_chunks(tx_hashes, self.receipts_batch_size)):
+                for tx_hash, tx in zip(tx_hashes_chunk, receipts):
                     if not tx:
                         raise UnknownTransaction
-                    tx_hash = tx['transactionHash']
                     tx_with_receipt[tx_hash] = tx
         else:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_receipts_with_tx = {executor.submit(self.get_transaction_receipt, tx): tx
-                                           for tx in tx_hashes}
-
-                for future in concurrent.futures.as_completed(future_receipts_with_tx):
-                    tx = future_receipts_with_tx[future]
-                    receipt = future.result()
-                    if not receipt:
-                        raise UnknownTransaction
-                    tx_with_receipt[tx] = receipt
+            tx_hashes = list(tx_hashes)
+            for tx, receipt in zip(tx_hashes, self.map_concurrently(self.get_transaction_receipt, tx_hashes)):
+                if not receipt:
+                    raise UnknownTransaction
+                tx_with_receipt[tx] = receipt
 
         return tx_with_receipt
 
-    def get_block(self, block_identifier, full_transactions=False):
+    def get_block(self, block_identifier, full_transactions=False, use_cache=True):
         """
         :param block_identifier:
         :param full_transactions:
+        :param use_cache: if False, block header is always retrieved from the node (and cache is updated)
         :raises Web3ConnectionException
         :raises UnknownBlock
         :return:
         """
+        if use_cache and not full_transactions:
+            block = self.get_cached_block(block_identifier)
+            if block is not None:
+                return block
+
         try:
-            block = self.web3.eth.getBlock(block_identifier, full_transactions)
+            if self.raw_requests:
+                block = self._get_raw_block(block_identifier, full_transactions)
+            else:
+                block = self.single_flight.do(('web3', 'eth_getBlock', block_identifier, full_transactions),
+                                              self.web3.eth.getBlock, block_identifier, full_transactions)
             if not block:
                 raise UnknownBlock
+            if not full_transactions:
+                self.block_cache.put(block)
             return block
         except self.connection_exceptions:
             raise Web3ConnectionException('Web3 provider is not connected')
         except Exception as e:
             raise UnknownBlock from e
 
+    @staticmethod
+    def format_block(block: Optional[Dict[str, any]]) -> Optional[AttributeDict]:
+        """
+        Every block is returned (and cached) like web3 `getBlock` returns it, no matter if it was retrieved using
+        web3, raw or batched requests. Blocks are immutable, so they can be shared with the cache
+        :param block: block from the node or already formatted
+        :return: formatted block, `None` if not found
+        """
+        if isinstance(block, AttributeDict):
+            return block
+        return Web3Service._format_raw_result(block_formatter, block)
+
+    @staticmethod
+    def is_block_hash(block_identifier) -> bool:
+        """
+        :return: True if block identifier is a block hash (bytes or hex string), False if it's a block number
+        or `latest`/`earliest`/`pending`
+        """
+        return isinstance(block_identifier, bytes) or \
+            (isinstance(block_identifier, str) and len(block_identifier) in (64, 66))
+
+    def get_cached_block(self, block_identifier) -> Optional[Dict[str, Any]]:
+        """
+        :param block_identifier: block number or block hash
+        :return: block header stored in the cache, `None` if not cached
+        """
+        if isinstance(block_identifier, int):
+            return self.block_cache.get(block_identifier)
+        elif self.is_block_hash(block_identifier):
+            return self.block_cache.get_by_hash(block_identifier)
+
     def get_blocks(self, block_identifiers, full_transactions=False):
         """
         :param block_identifiers:
@@ -198,32 +517,52 @@ class Web3Service:
         """
 
         blocks = {}
+        cached_blocks = {}
+
+        if not full_transactions:
+            # Only block headers are cached
+            block_identifiers = list(block_identifiers)
+            for block_identifier in block_identifiers:
+                block = self.get_cached_block(block_identifier)
+                if block is not None:
+                    cached_blocks[block_identifier] = block
+            block_identifiers = [block_identifier for block_identifier in block_identifiers
+                                 if block_identifier not in cached_blocks]
 
-        if self.has_http_provider():
+        if not block_identifiers:
+            return cached_blocks
+        elif self.has_batch_transport():
             # Query limit for RPC is 131072
-            for block_numbers_chunk in self._chunks(block_identifiers, self.max_batch_requests):
-                rpc_request = [self._build_block_request(block_number) for block_number in block_numbers_chunk]
-                for rpc_response in self._do_request(rpc_request):
-                    block = rpc_response['result']
+            rpc_requests = ([self._build_block_request(block_number, full_transactions)
+                             for block_number in block_numbers_chunk]
+                            for block_numbers_chunk in self._adaptive_chunks(block_identifiers,
+                                                                             self.blocks_batch_size))
+            for blocks_chunk in self.map_concurrently(
+                    lambda rpc_request: self._do_batch_request(rpc_request, self.blocks_batch_size), rpc_requests):
+                for block in blocks_chunk:
                     if not block:
                         raise UnknownBlock
 
-                    block_number = int(block['number'], 16)
-                    block['number'] = block_number
-                    block['timestamp'] = int(block['timestamp'], 16)
-                    blocks[block_number] = block
+                    block = self.format_block(block)
+                    blocks[block['number']] = block
+                    if not full_transactions:
+                        self.block_cache.put(block)
         else:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # Get blocks from ethereum node and mark each future with its block_id
-                future_to_block_id = {executor.submit(self.get_block, block_id, full_transactions): block_id
-                                      for block_id in block_identifiers}
-                for future in concurrent.futures.as_completed(future_to_block_id):
-                    block_id = future_to_block_id[future]
-                    block = future.result()
-                    if not block:
-                        raise UnknownBlock
-                    blocks[block_id] = block
+            block_identifiers = list(block_identifiers)
+            for block_id, block in zip(block_identifiers,
+                                       self.map_concurrently(lambda block_id: self.get_block(block_id,
+                                                                                             full_transactions),
+                                                             block_identifiers)):
+                if not block:
+                    raise UnknownBlock
+                blocks[block_id] = block
 
+        # Cached blocks removed from cache when storing the new ones belong to other chain
+        stale_block_numbers = [block_number for block_number, block in cached_blocks.items()
+                               if not self.block_cache.is_cached(block)]
+        blocks.update(cached_blocks)
+        if stale_block_numbers:
+            blocks.update(self.get_blocks(stale_block_numbers, full_transactions))
         return blocks
 
     def get_current_block(self, full_transactions=False):
@@ -233,7 +572,8 @@ class Web3Service:
         :raises UnknownBlock
         :return:
         """
-        return self.get_block(self.get_current_block_number(), full_transactions)
+        # Head of the chain is the block most likely to change, so it's always retrieved from the node
+        return self.get_block(self.get_current_block_number(), full_transactions, use_cache=False)
 
     def get_logs_for_block(self, block):
         """
@@ -241,15 +581,7 @@ class Web3Service:
         :param block: web3 block to get logs from
         :return: list of log dictionaries
         """
-
-        logs = []
-        tx_with_receipt = self.get_transaction_receipts(block['transactions'])
-
-        for tx in block['transactions']:
-            receipt = tx_with_receipt[tx]
-            logs.extend(receipt.get('logs', []))
-
-        return logs
+        return self.get_logs_for_blocks([block])[block['number']]
 
     def get_logs_for_blocks(self, blocks):
         """
@@ -260,53 +592,572 @@ class Web3Service:
 
         block_number_with_logs = {}
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Get blocks from ethereum node and mark each future with its block_id
-            future_logs_to_block = {executor.submit(self.get_logs_for_block, block): block for block in blocks}
-            for future in concurrent.futures.as_completed(future_logs_to_block):
-                block = future_logs_to_block[future]
-                logs = future.result()
-                block_number_with_logs[block['number']] = logs
+        blocks = list(blocks)
+        block_receipts = self.get_block_receipts(blocks) if self.has_batch_transport() else {}
+        # Receipts of every other block are retrieved together, so requests are spread across the workers
+        tx_with_receipt = self.get_transaction_receipts([tx for block in blocks if block['number'] not in block_receipts
+                                                         for tx in block['transactions']])
+        for block in blocks:
+            if block['number'] in block_receipts:
+                receipts = block_receipts[block['number']]
+            else:
+                receipts = [tx_with_receipt[tx] for tx in block['transactions']]
+            logs = []
+            for receipt in receipts:
+                logs.extend(receipt.get('logs', []))
+            block_number_with_logs[block['number']] = logs
 
         return block_number_with_logs
 
+    def get_block_receipts_method(self, block) -> Optional[str]:
+        """
+        Checks (only once, if not configured) which method the node supports to retrieve every receipt of a block
+        :param block: block with transactions, used for the check
+        :return: `eth_getBlockReceipts`, `parity_getBlockReceipts` or `None` if node doesn't support any of them
+        """
+        if self._block_receipts_method == 'auto':
+            supported_method = None
+            for method in self.block_receipts_methods:
+                rpc_responses = self._do_request([self._build_block_receipts_request(method, block['number'])])
+                result = rpc_responses[0].get('result') if rpc_responses else None
+                if isinstance(result, list) and len(result) == len(block['transactions']):
+                    supported_method = method
+                    break
+
+            if supported_method:
+                logger.info('Node supports %s, receipts of a block will be retrieved with one request',
+                            supported_method)
+            else:
+                logger.info('Node does not support %s, receipts will be retrieved transaction by transaction',
+                            ' or '.join(self.block_receipts_methods))
+            self._block_receipts_method = supported_method
+        return self._block_receipts_method
+
+    def get_block_receipts(self, blocks) -> Dict[int, List[Dict[str, any]]]:
+        """
+        Recover every receipt of the blocks with one request per block, if node supports it
+        :param blocks: blocks with transaction hashes
+        :return: a dictionary, the key is the block number and value is the list of receipts. Blocks without
+        transactions or which receipts could not be retrieved (not supported, failed or from other chain) are
+        not included
+        """
+        blocks = [block for block in blocks if block['transactions']]
+        if not blocks:
+            return {}
+        method = self.get_block_receipts_method(blocks[0])
+        if not method:
+            return {}
+
+        rpc_requests = ([self._build_block_receipts_request(method, block['number']) for block in blocks_chunk]
+                        for blocks_chunk in self._adaptive_chunks(blocks, self.block_receipts_batch_size))
+        results = itertools.chain.from_iterable(self.map_concurrently(
+            lambda rpc_request: self._do_batch_request(rpc_request, self.block_receipts_batch_size), rpc_requests))
+
+        block_receipts = {}
+        for block, receipts in zip(blocks, results):
+            if receipts and len(receipts) == len(block['transactions']) and \
+                    normalize_hash(receipts[0]['blockHash']) == normalize_hash(block['hash']):
+                block_receipts[block['number']] = receipts
+            else:
+                logger.warning('Cannot get receipts of block %d using %s, retrieving them transaction by transaction',
+                               block['number'], method)
+        return block_receipts
+
+    def supports_logs_range(self) -> bool:
+        """
+        Checks (only once) if node supports `eth_getLogs` for block ranges, requesting the logs of the last
+        `logs_range_probe_blocks` blocks like the ones requested when following the chain (logs of the genesis
+        block are returned even by nodes not able to return logs of recent blocks). If node refuses the range
+        because it's too big it's supported, as refused ranges are split
+        :raises Web3ConnectionException
+        :return: True if supported, False otherwise
+        """
+        if self._supports_logs_range is None:
+            try:
+                to_block = self.get_current_block_number()
+                from_block = max(0, to_block - self.logs_range_probe_blocks + 1)
+                self.web3.eth.getLogs({'fromBlock': from_block, 'toBlock': to_block})
+                self._supports_logs_range = True
+            except self.connection_exceptions as e:
+                raise Web3ConnectionException('Web3 provider is not connected') from e
+            except Exception as e:
+                if self.is_logs_range_too_big_error(e):
+                    self._supports_logs_range = True
+                else:
+                    logger.warning('Node does not support eth_getLogs, logs will be recovered using receipts',
+                                   exc_info=True)
+                    self._supports_logs_range = False
+        return self._supports_logs_range
+
+    def get_logs_for_block_range(self, from_block: int, to_block: int, addresses: Optional[List[str]]=None,
+                                 topics: Optional[List[str]]=None,
+                                 max_addresses_per_filter: int=1000) -> Dict[int, List[any]]:
+        """
+        Recover logs for every block in the range using `eth_getLogs`. If `addresses` or `topics` are provided
+        only matching logs will be returned by the node
+        :param from_block: first block number of the range
+        :param to_block: last block number of the range (included)
+        :param addresses: checksumed addresses emitting the logs
+        :param topics: first topic (event hash) of the logs
+        :param max_addresses_per_filter: addresses will be split in several filters if there are more
+        :raises ValueError: if node refuses the logs of one block (or a filter with one address)
+        :return: a dictionary, the key is the block number and value is list of logs
+        """
+        block_number_with_logs = {block_number: [] for block_number in range(from_block, to_block + 1)}
+        if addresses is None and topics is None:
+            # Every log of the range can be too many for one request, window is learned and refused ranges split
+            logs = self.get_logs_using_windows({}, from_block, to_block, window_key=self.all_logs_window_key)
+        else:
+            logs = self.get_logs_for_addresses_and_topics(from_block, to_block, addresses, topics,
+                                                          max_addresses_per_filter)
+        for log in logs:
+            block_number_with_logs.setdefault(log['blockNumber'], []).append(log)
+        return block_number_with_logs
+
+    def get_logs_for_addresses_and_topics(self, from_block: int, to_block: int, addresses: Optional[List[str]],
+                                          topics: Optional[List[str]],
+                                          max_addresses_per_filter: int=1000) -> List[any]:
+        """
+        Recover logs emitted by any of the `addresses` with any of the `topics` as first topic. Addresses are split
+        in several filters if there are more than `max_addresses_per_filter`, or if the node refuses the filter
+        :param addresses: checksumed addresses. If `None` logs are not filtered by address
+        :param topics: event hashes. If `None` logs are not filtered by topic
+        :return: list of logs sorted by block number and log index
+        """
+        logs_filter = {'fromBlock': from_block,
+                       'toBlock': to_block}
+        if topics is not None:
+            if not topics:
+                return []
+            logs_filter['topics'] = [sorted(topics)]
+
+        if addresses is None:
+            return self.web3_slow.eth.getLogs(logs_filter)
+        elif not addresses:
+            # An empty address filter would match every address
+            return []
+
+        addresses = sorted(addresses)
+        logs = []
+        for addresses_chunk in self._chunks(addresses, max_addresses_per_filter):
+            logs.extend(self._get_logs_for_addresses(logs_filter, addresses_chunk))
+
+        if len(addresses) > max_addresses_per_filter:
+            logs.sort(key=lambda log: (log['blockNumber'], log['logIndex']))
+        return logs
+
+    def _get_logs_for_addresses(self, logs_filter: Dict[str, any], addresses: List[str]) -> List[any]:
+        """
+        Splits addresses in half if the node refuses the filter (nodes can limit number of addresses)
+        """
+        try:
+            return self.web3_slow.eth.getLogs(dict(logs_filter, address=addresses))
+        except ValueError:
+            if len(addresses) == 1:
+                raise
+            logger.warning('Node refused logs filter with %d addresses, splitting it', len(addresses))
+            middle = len(addresses) // 2
+            logs = self._get_logs_for_addresses(logs_filter, addresses[:middle])
+            logs.extend(self._get_logs_for_addresses(logs_filter, addresses[middle:]))
+            logs.sort(key=lambda log: (log['blockNumber'], log['logIndex']))
+            return logs
+
     def get_logs_for_address_using_filter(self, from_block: int, to_block: int, address: str) -> List[any]:
         """
         Recover logs using filter for address
         """
-        return self.web3_slow.eth.getLogs({'fromBlock': from_block,
-                                           'toBlock': to_block,
-                                           'address': address})
+        return self.get_logs_using_windows({'address': address}, from_block, to_block, window_key=address)
 
     def get_logs_for_event_using_filter(self, from_block: int, to_block: int, event_hash: str) -> List[any]:
         """
         Recover logs using filter for event
         """
-        logs_filter = {'fromBlock': from_block,
-                       'toBlock': to_block,
-                       'topics': [event_hash]}
-        return self.web3_slow.eth.getLogs(logs_filter)
+        return self.get_logs_using_windows({'topics': [event_hash]}, from_block, to_block, window_key=event_hash)
+
+    def get_logs_for_events_using_filter(self, from_block: int, to_block: int, event_hashes: List[str],
+                                         window_size: Optional[int]=None) -> List[any]:
+        """
+        Recover logs for every event concurrently. Block range is split in windows, and every (event, window)
+        query is run by the `max_workers` workers of the service
+        :param event_hashes: event hashes (first topic of the logs)
+        :param window_size: blocks for every query. If not provided, range is split in one window per worker,
+        or using the window learned for the event if it's smaller
+        :return: list of logs sorted by block number and log index
+        """
+        blocks = to_block - from_block + 1
+        if blocks <= 0 or not event_hashes:
+            return []
+
+        queries = []
+        for event_hash in event_hashes:
+            event_window_size = window_size or min(self.logs_window_sizes.get(event_hash, blocks),
+                                                   -(-blocks // self.max_workers))  # Ceil division
+            for window_from_block in range(from_block, to_block + 1, event_window_size):
+                window_to_block = min(to_block, window_from_block + event_window_size - 1)
+                queries.append((event_hash, window_from_block, window_to_block))
+
+        logs = []
+        for query_logs in self.map_concurrently(
+                lambda query: self.get_logs_using_windows({'topics': [query[0]]}, query[1], query[2], query[0]),
+                queries):
+            logs.extend(query_logs)
+
+        logs.sort(key=lambda log: (log['blockNumber'], log['logIndex']))
+        return logs
+
+    def get_logs_using_windows(self, logs_filter: Dict[str, any], from_block: int, to_block: int,
+                               window_key: Optional[str]=None) -> List[any]:
+        """
+        Recover logs for the block range using windows of the size learned for `window_key` (whole range if
+        nothing was learned yet). Ranges refused by the node because of the number of logs or a timeout are split
+        :param logs_filter: `eth_getLogs` filter without `fromBlock` and `toBlock`
+        :param window_key: key (event hash, address...) to learn and reuse the window size
+        :return: list of logs sorted by block number
+        """
+        logs = []
+        window_from_block = from_block
+        while window_from_block <= to_block:
+            window_size = self.logs_window_sizes.get(window_key)
+            window_to_block = to_block if window_size is None else min(to_block, window_from_block + window_size - 1)
+            logs.extend(self._get_logs_bisecting_range(logs_filter, window_from_block, window_to_block, window_key))
+            window_from_block = window_to_block + 1
+        return logs
+
+    def _get_logs_bisecting_range(self, logs_filter: Dict[str, any], from_block: int, to_block: int,
+                                  window_key: Optional[str]) -> List[any]:
+        """
+        Splits block range in half (recursively) if node refuses it
+        """
+        try:
+            logs = self.web3_slow.eth.getLogs(dict(logs_filter, fromBlock=from_block, toBlock=to_block))
+        except self.logs_range_exceptions as e:
+            if from_block == to_block or not self.is_logs_range_too_big_error(e):
+                raise
+            middle = (from_block + to_block) // 2
+            logger.warning('Node refused logs from block=%d to block=%d for %s, splitting range: %s',
+                           from_block, to_block, window_key or logs_filter, e)
+            self.update_logs_window_size(window_key, middle - from_block + 1)
+            logs = self._get_logs_bisecting_range(logs_filter, from_block, middle, window_key)
+            logs.extend(self._get_logs_bisecting_range(logs_filter, middle + 1, to_block, window_key))
+            return logs
+
+        self.learn_logs_window_size(window_key, to_block - from_block + 1, len(logs))
+        return logs
+
+    def iter_logs_for_events_using_filter(self, from_block: int, to_block: int,
+                                          event_hashes: List[str]) -> Iterator[any]:
+        """
+        Like `get_logs_for_events_using_filter`, but logs are streamed instead of returned in a list. Every event
+        is requested using the windows learned for it and the responses are merged, so there's only one window
+        per event in memory (or none, for http nodes)
+        :return: iterator of logs sorted by block number and log index
+        """
+        return heapq.merge(*[self.iter_logs_using_windows({'topics': [event_hash]}, from_block, to_block, event_hash)
+                             for event_hash in event_hashes],
+                           key=lambda log: (log['blockNumber'], log['logIndex']))
+
+    def iter_logs_using_windows(self, logs_filter: Dict[str, any], from_block: int, to_block: int,
+                                window_key: Optional[str]=None) -> Iterator[any]:
+        """
+        Like `get_logs_using_windows`, but logs are streamed instead of returned in a list
+        """
+        window_from_block = from_block
+        while window_from_block <= to_block:
+            window_size = self.logs_window_sizes.get(window_key)
+            window_to_block = to_block if window_size is None else min(to_block, window_from_block + window_size - 1)
+            yield from self._iter_logs_bisecting_range(logs_filter, window_from_block, window_to_block, window_key)
+            window_from_block = window_to_block + 1
+
+    def _iter_logs_bisecting_range(self, logs_filter: Dict[str, any], from_block: int, to_block: int,
+                                   window_key: Optional[str]) -> Iterator[any]:
+        """
+        Splits block range in half (recursively) if node refuses it. Node errors are returned before the first log,
+        so once a log is yielded range will not be split
+        """
+        logs = self.iter_logs_using_filter(dict(logs_filter, fromBlock=from_block, toBlock=to_block))
+        try:
+            first_log = next(logs, None)
+        except self.logs_range_exceptions as e:
+            if from_block == to_block or not self.is_logs_range_too_big_error(e):
+                raise
+            middle = (from_block + to_block) // 2
+            logger.warning('Node refused logs from block=%d to block=%d for %s, splitting range: %s',
+                           from_block, to_block, window_key or logs_filter, e)
+            self.update_logs_window_size(window_key, middle - from_block + 1)
+            yield from self._iter_logs_bisecting_range(logs_filter, from_block, middle, window_key)
+            yield from self._iter_logs_bisecting_range(logs_filter, middle + 1, to_block, window_key)
+            return
+
+        logs_count = 0
+        if first_log is not None:
+            yield first_log
+            logs_count = 1
+            for log in logs:
+                yield log
+                logs_count += 1
+        self.learn_logs_window_size(window_key, to_block - from_block + 1, logs_count)
+
+    def iter_logs_using_filter(self, logs_filter: Dict[str, any]) -> Iterator[any]:
+        """
+        Recover logs using `eth_getLogs`. For http nodes the response is parsed while it's received and logs are
+        yielded one by one, so memory used doesn't depend on the number of logs returned
+        :param logs_filter: `eth_getLogs` filter
+        :raises ValueError: if node returns an error
+        :return: iterator of logs, formatted like web3 `getLogs` logs
+        """
+        if not isinstance(self.provider, HTTPProvider):
+            yield from self.web3_slow.eth.getLogs(logs_filter)
+            return
+
+        self.rate_limiter.acquire_for_methods(['eth_getLogs'])
+        rpc_request = {'jsonrpc': '2.0',
+                       'method': 'eth_getLogs',
+                       'params': [{key: hex(value) if isinstance(value, int) else value
+                                   for key, value in logs_filter.items()}],
+                       'id': next(self._request_ids)}
+        response = self.http_session.post(self.node_uri, data=json_codec.dumps_bytes(rpc_request),
+                                          headers={'Content-Type': 'application/json'},
+                                          timeout=self.slow_provider_timeout, stream=True)
+        with closing(response):
+            response.raise_for_status()
+            for log in iter_json_rpc_result(response.iter_content(chunk_size=self.stream_chunk_size)):
+                yield log_entry_formatter(log)
+
+    def learn_logs_window_size(self, window_key: Optional[str], blocks: int, logs_count: int):
+        """
+        Updates the window so `max_logs_per_filter` logs are expected for every request, using the density
+        of logs of a range of blocks
+        :param blocks: number of blocks of the range
+        :param logs_count: logs returned by the node for the range
+        """
+        if logs_count:
+            self.update_logs_window_size(window_key, max(1, blocks * self.max_logs_per_filter // logs_count),
+                                         can_grow=True)
+        elif window_key in self.logs_window_sizes:
+            self.update_logs_window_size(window_key, blocks * 2, can_grow=True)
+
+    def is_logs_range_too_big_error(self, exception: Exception) -> bool:
+        if isinstance(exception, (Timeout, socket.timeout)):
+            return True
+        message = str(exception).lower()
+        return any(too_big_message in message for too_big_message in self.logs_range_too_big_messages)
+
+    def update_logs_window_size(self, window_key: Optional[str], window_size: int, can_grow: bool=False):
+        """
+        :param window_key: key (event hash, address...) of the window. Nothing is stored if `None`
+        :param window_size: number of blocks
+        :param can_grow: if False, window is only updated if smaller. If True, window can be doubled at most
+        """
+        if window_key is None:
+            return
+        current_window_size = self.logs_window_sizes.get(window_key)
+        if current_window_size is None:
+            self.logs_window_sizes[window_key] = window_size
+        elif can_grow:
+            self.logs_window_sizes[window_key] = min(window_size, current_window_size * 2)
+        else:
+            self.logs_window_sizes[window_key] = min(window_size, current_window_size)
 
     def _do_request(self, rpc_request):
-        if self.has_http_provider():
-            return self.http_session.post(self.node_uri, json=rpc_request).json()
+        if self.has_batch_transport():
+            self.rate_limiter.acquire_for_methods(request['method'] for request in rpc_request)
+            try:
+                return self.batch_transport.send(rpc_request)
+            except RateLimitExceeded:
+                self.rate_limiter.throttled()
+                raise
         else:
             raise ImproperlyConfigured('Not valid provider')
 
+    def _do_raw_request(self, method: str, params: Optional[List[any]]=None) -> any:
+        """
+        Sends one request using the transport of the batched requests, without the web3 middleware stack
+        (formatters, attribute dicts and PoA middleware), so result is returned as the node sends it
+        :raises ValueError: if node returns an error
+        :return: result of the request
+        """
+        self.rate_limiter.acquire_for_methods([method])
+        try:
+            rpc_response = self.batch_transport.request({'jsonrpc': '2.0',
+                                                         'method': method,
+                                                         'params': params or [],
+                                                         'id': next(self._request_ids)})
+        except RateLimitExceeded:
+            self.rate_limiter.throttled()
+            raise
+        if rpc_response.get('error'):
+            raise ValueError('Error for %s request: %s' % (method, rpc_response['error']))
+        return rpc_response.get('result')
+
+    @staticmethod
+    def _get_request_key(method: str, params: List[any]) -> Tuple[str, str]:
+        """
+        :return: key of a JSON-RPC request for `single_flight`. Raw requests and requests of batches use the same
+        keys, so they can join each other
+        """
+        return method, json_codec.dumps(params)
+
+    def _do_coalesced_raw_request(self, method: str, params: Optional[List[any]]=None) -> any:
+        """
+        Same as `_do_raw_request`, but if a request with the same method and params is in flight (sent by other
+        thread, alone or in a batch) its result is used. Result is shared, so it must not be modified
+        """
+        params = params or []
+        return self.single_flight.do(self._get_request_key(method, params), self._do_raw_request, method, params)
+
+    @staticmethod
+    def _format_raw_result(formatter: Callable[[Dict[str, any]], Dict[str, any]],
+                           result: Optional[Dict[str, any]]) -> Optional[AttributeDict]:
+        """
+        :param formatter: web3 result formatter (`block_formatter`, `receipt_formatter`...)
+        :return: result formatted like web3 does (pythonic and attrdict middlewares), `None` if not found
+        """
+        if not result:
+            return None
+        return AttributeDict.recursive(formatter(result))
+
+    def _get_raw_block(self, block_identifier, full_transactions: bool=False) -> Optional[AttributeDict]:
+        """
+        :param block_identifier: block number, block hash or `latest`/`earliest`/`pending`
+        :return: block formatted like web3 `getBlock` returns it, `None` if not found
+        """
+        if isinstance(block_identifier, int):
+            # Same params than `_build_block_request`, so it can join batched requests
+            block = self._do_coalesced_raw_request('eth_getBlockByNumber', ['0x{:x}'.format(block_identifier),
+                                                                            full_transactions])
+        elif self.is_block_hash(block_identifier):
+            block = self._do_coalesced_raw_request('eth_getBlockByHash', ['0x' + normalize_hash(block_identifier),
+                                                                          full_transactions])
+        else:
+            block = self._do_coalesced_raw_request('eth_getBlockByNumber', [block_identifier, full_transactions])
+        return self._format_raw_result(block_formatter, block)
+
+    def _get_raw_transaction_receipt(self, transaction_hash) -> Optional[AttributeDict]:
+        """
+        :return: receipt formatted like web3 `getTransactionReceipt` returns it, `None` if not found
+        """
+        receipt = self._do_coalesced_raw_request('eth_getTransactionReceipt', [HexBytes(transaction_hash).hex()])
+        return self._format_raw_result(receipt_formatter, receipt)
+
+    def _do_batch_request(self, rpc_request: List[Dict[str, any]],
+                          batch_size: Optional[AdaptiveBatchSize]=None) -> List[any]:
+        """
+        Sends a batched request using `_send_batch_request`. Requests with the same method and params than
+        requests in flight (sent by other threads, in batches or using `_do_coalesced_raw_request`) are not sent,
+        their results are used
+        :param rpc_request: list of JSON-RPC requests with unique ids
+        :param batch_size: batch size controller updated with the stats of the request
+        :return: list of results, sorted like `rpc_request`. `None` for requests failing after every retry
+        """
+        keys = [self._get_request_key(request['method'], request['params']) for request in rpc_request]
+        calls = [self.single_flight.start(key) for key in keys]
+        sent = [i for i, (_, is_leader) in enumerate(calls) if is_leader]
+        try:
+            sent_results = self._send_batch_request([rpc_request[i] for i in sent], batch_size) if sent else []
+        except BaseException as e:
+            for i in sent:
+                self.single_flight.finish(keys[i], exception=e)
+            raise
+        for i, result in zip(sent, sent_results):
+            self.single_flight.finish(keys[i], result=result)
+
+        # Results are copied, as callers can modify them (like block numbers)
+        return [copy.copy(future.result()) for future, _ in calls]
+
+    def _send_batch_request(self, rpc_request: List[Dict[str, any]],
+                            batch_size: Optional[AdaptiveBatchSize]=None) -> List[any]:
+        """
+        Sends a batched request. Requests with an error or without response are retried (with exponential backoff)
+        up to `max_batch_retries`, keeping the successful results. `null` results (like blocks not mined yet or
+        unknown receipts) are not retried
+        :param rpc_request: list of JSON-RPC requests with unique ids
+        :param batch_size: batch size controller updated with the stats of the request. If node rejects the
+        batch, it is split using the shrunk batch size
+        :raises BatchRequestRejected: if node rejects a batch with only one request
+        :raises BatchRequestTimeout: if node doesn't answer in time after every retry
+        :return: list of results, sorted like `rpc_request`. `None` for requests failing after every retry or
+        with `null` result
+        """
+        results = [None] * len(rpc_request)
+        pending = list(range(len(rpc_request)))
+        for retry in range(self.max_batch_retries + 1):
+            if retry:
+                logger.warning('%d of %d requests of batch failed, retry=%d', len(pending), len(rpc_request), retry)
+                time.sleep(self.batch_retry_backoff * 2 ** (retry - 1))
+
+            start = time.monotonic()
+            try:
+                rpc_responses = self._do_request([rpc_request[i] for i in pending])
+            except (RateLimitExceeded, BatchRequestTimeout):
+                # Batch is sent again when the rate limiter allows it or the node is less busy, splitting it
+                # would not help (node limits for the size of batches are rejected explicitly)
+                if retry == self.max_batch_retries:
+                    raise
+                continue
+            except BatchRequestRejected:
+                if batch_size is None or len(pending) == 1:
+                    raise
+                new_size = batch_size.record_failure(len(pending))
+                logger.warning('Node rejected batch of %d requests, splitting it in batches of %d',
+                               len(pending), new_size)
+                pending_rpc_request = [rpc_request[i] for i in pending]
+                sub_results = []
+                for rpc_request_chunk in self._chunks(pending_rpc_request,
+                                                       min(new_size, (len(pending) + 1) // 2)):
+                    sub_results.extend(self._send_batch_request(rpc_request_chunk, batch_size))
+                for i, result in zip(pending, sub_results):
+                    results[i] = result
+                break
+
+            if batch_size is not None and not retry:
+                batch_size.record_success(len(pending), time.monotonic() - start,
+                                          getattr(rpc_responses, 'size', 0))
+
+            failed = []
+            for i, rpc_response in zip(pending, rpc_responses):
+                if rpc_response.get('error') or 'result' not in rpc_response:
+                    failed.append(i)
+                else:
+                    results[i] = rpc_response['result']
+            pending = failed
+
+            if not pending:
+                break
+        return results
+
     def _build_block_request(self, block_number: int, full_transactions: bool=False) -> Dict[str, any]:
         block_number_hex = '0x{:x}'.format(block_number)
         return {"jsonrpc": "2.0",
                 "method": "eth_getBlockByNumber",
                 "params": [block_number_hex, full_transactions],
-                "id": 1
+                "id": next(self._request_ids)
                 }
 
-    def _build_tx_receipt_request(self, tx_hash: str) -> Dict[str, any]:
+    def _build_block_receipts_request(self, method: str, block_number: int) -> Dict[str, any]:
+        return {"jsonrpc": "2.0",
+                "method": method,
+                "params": ['0x{:x}'.format(block_number)],
+                "id": next(self._request_ids)}
+
+    def _build_tx_receipt_request(self, tx_hash) -> Dict[str, any]:
+        # Transaction hashes of web3 blocks are bytes
         return {"jsonrpc": "2.0",
                 "method": "eth_getTransactionReceipt",
-                "params": [tx_hash],
-                "id": 1}
+                "params": [HexBytes(tx_hash).hex()],
+                "id": next(self._request_ids)}
 
     def _chunks(self, iterable, size):
         for i in range(0, len(iterable), size):
             yield iterable[i:i + size]
+
+    def _adaptive_chunks(self, iterable, batch_size: AdaptiveBatchSize):
+        """
+        Like `_chunks`, but size of every chunk is the current size of `batch_size`, so it can change
+        between chunks
+        """
+        iterable = list(iterable)
+        i = 0
+        while i < len(iterable):
+            size = batch_size.size
+            yield iterable[i:i + size]
+            i += size
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Benchmarks `Decoder.decode_log` on synthetic logs, comparing the precompiled decode plans with decoding without
+them (walking the abi of the event for every log, as it was done before):
+
+    python scripts/benchmark_decoder.py --logs 3000000
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eth_abi import decode_abi, encode_abi  # noqa: E402
+from hexbytes import HexBytes  # noqa: E402
+
+from django_eth_events.decoder import Decoder  # noqa: E402
+from django_eth_events.utils import remove_0x_head  # noqa: E402
+
+EVENTS_ABI = [
+    {'anonymous': False, 'name': 'Transfer', 'type': 'event',
+     'inputs': [{'indexed': True, 'name': 'from', 'type': 'address'},
+                {'indexed': True, 'name': 'to', 'type': 'address'},
+                {'indexed': False, 'name': 'value', 'type': 'uint256'}]},
+    {'anonymous': False, 'name': 'OutcomeTokenPurchase', 'type': 'event',
+     'inputs': [{'indexed': True, 'name': 'buyer', 'type': 'address'},
+                {'indexed': False, 'name': 'outcomeTokenIndex', 'type': 'uint8'},
+                {'indexed': False, 'name': 'outcomeTokenCount', 'type': 'uint256'},
+                {'indexed': False, 'name': 'marketFees', 'type': 'uint256'},
+                {'indexed': False, 'name': 'outcomeTokenCost', 'type': 'int256'}]},
+    {'anonymous': False, 'name': 'OwnersChanged', 'type': 'event',
+     'inputs': [{'indexed': False, 'name': 'owners', 'type': 'address[]'},
+                {'indexed': False, 'name': 'required', 'type': 'uint256'},
+                {'indexed': False, 'name': 'ipfsHash', 'type': 'bytes'}]},
+]
+
+
+def random_address() -> str:
+    return '0x{:040x}'.format(random.getrandbits(160))
+
+
+def random_value(param_type: str):
+    if param_type == 'address':
+        return random_address()
+    elif param_type == 'address[]':
+        return [random_address() for _ in range(random.randint(1, 5))]
+    elif param_type == 'bytes':
+        return os.urandom(random.randint(0, 64))
+    elif param_type.startswith('int'):
+        return random.randint(-2 ** 127, 2 ** 127)
+    return random.getrandbits(int(param_type[4:]) if param_type.startswith('uint') else 8)
+
+
+def build_logs(decoder: Decoder, count: int):
+    """
+    :return: `count` synthetic logs of the events of `EVENTS_ABI`
+    """
+    logs = []
+    for _ in range(count):
+        event = random.choice(EVENTS_ABI)
+        topics = ['0x' + decoder.get_method_id(event)]
+        data_types, data_values = [], []
+        for param in event['inputs']:
+            value = random_value(param['type'])
+            if param['indexed']:
+                topics.append(HexBytes(encode_abi([param['type']], [value])))
+            else:
+                data_types.append(param['type'])
+                data_values.append(value)
+        logs.append({
+            'address': random_address(),
+            'transactionHash': '0x{:064x}'.format(random.getrandbits(256)),
+            'topics': topics,
+            'data': '0x' + encode_abi(data_types, data_values).hex(),
+        })
+    return logs
+
+
+def decode_log_without_plan(decoder: Decoder, log):
+    """
+    `Decoder.decode_log` without decode plans
+    """
+    method = decoder.methods[remove_0x_head(log['topics'][0])]
+    decoded_params = []
+    data_i = 0
+    topics_i = 1
+    data_types = []
+    for param in method['inputs']:
+        if not param['indexed']:
+            data_types.append(param['type'])
+    decoded_data = decode_abi(data_types, HexBytes(log['data']))
+    for param in method['inputs']:
+        decoded_p = {'name': param['name']}
+        if param['indexed']:
+            decoded_p['value'] = log['topics'][topics_i]
+            topics_i += 1
+        else:
+            decoded_p['value'] = decoded_data[data_i]
+            data_i += 1
+        if '[]' in param['type']:
+            if 'address' in param['type']:
+                decoded_p['value'] = [decoder.decode_address(address) for address in decoded_p['value']]
+            else:
+                decoded_p['value'] = list(decoded_p['value'])
+        elif 'address' == param['type']:
+            decoded_p['value'] = decoder.decode_address(decoded_p['value'])
+        decoded_params.append(decoded_p)
+    return {
+        'params': decoded_params,
+        'name': method['name'],
+        'address': decoder.decode_address(log['address']),
+        'transaction_hash': decoder.decode_transaction(log['transactionHash'])
+    }
+
+
+def benchmark(decode, logs, count: int) -> float:
+    """
+    :return: logs decoded per second
+    """
+    start = time.perf_counter()
+    for log in itertools.islice(itertools.cycle(logs), count):
+        decode(log)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logs', type=int, default=2000000, help='Logs decoded by every decoder')
+    parser.add_argument('--distinct-logs', type=int, default=10000, help='Distinct synthetic logs generated')
+    args = parser.parse_args()
+
+    random.seed(0)
+    decoder = Decoder()
+    decoder.add_abi(EVENTS_ABI)
+    logs = build_logs(decoder, min(args.logs, args.distinct_logs))
+    for log in logs:
+        assert decoder.decode_log(log) == decode_log_without_plan(decoder, log)
+
+    without_plan = benchmark(lambda log: decode_log_without_plan(decoder, log), logs, args.logs)
+    with_plan = benchmark(decoder.decode_log, logs, args.logs)
+    print('Decoded %d logs' % args.logs)
+    print('%-16s %12.0f logs/s' % ('without plan', without_plan))
+    print('%-16s %12.0f logs/s' % ('decode plan', with_plan))
+    print('%-16s %11.2fx' % ('speedup', with_plan / without_plan))
+
+
+if __name__ == '__main__':
+    main()
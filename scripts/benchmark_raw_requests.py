@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Compares the raw requests of `Web3Service` (without web3 middleware stack) with the web3 requests for the calls
+following the head of the chain, using an in-memory fake node served over http:
+
+    python scripts/benchmark_raw_requests.py --calls 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import HTTPProvider  # noqa: E402
+
+from django_eth_events.tests.fake_node import (FakeHTTPNodeServer,  # noqa: E402
+                                               FakeNode)
+from django_eth_events.web3_service import Web3Service  # noqa: E402
+
+
+def benchmark(function, calls: int) -> float:
+    """
+    :return: microseconds per call
+    """
+    start = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=1000, help='Calls for every method')
+    parser.add_argument('--blocks', type=int, default=100, help='Blocks of the fake node')
+    args = parser.parse_args()
+
+    node = FakeNode(blocks=args.blocks, txs_per_block=2)
+    tx_hashes = [tx_hash for block in node.blocks.values() for tx_hash in block['transactions']]
+    with FakeHTTPNodeServer(node) as server:
+        print('%-28s %12s %12s %8s' % ('method', 'web3 (us)', 'raw (us)', 'speedup'))
+        web3_services = [Web3Service(HTTPProvider(server.uri), max_workers=1, block_cache_size=0,
+                                     raw_requests=raw_requests) for raw_requests in (False, True)]
+        for name, call in (('get_current_block_number', lambda s, i: s.get_current_block_number()),
+                           ('get_block', lambda s, i: s.get_block(i % args.blocks, use_cache=False)),
+                           ('get_transaction_receipt', lambda s, i: s.get_transaction_receipt(
+                               tx_hashes[i % len(tx_hashes)]))):
+            web3_time, raw_time = [benchmark(lambda i: call(web3_service, i), args.calls)
+                                   for web3_service in web3_services]
+            print('%-28s %12.1f %12.1f %7.2fx' % (name, web3_time, raw_time, web3_time / raw_time))
+        for web3_service in web3_services:
+            web3_service.close()
+
+
+if __name__ == '__main__':
+    main()
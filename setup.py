@@ -36,6 +36,11 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'async': ['aiohttp>=3'],
+        'fast-json': ['orjson'],
+        'columnar': ['numpy'],
+    },
     license='MIT License',
     description='A simple Django app to react to Ethereum events.',
     url='https://github.com/gnosis/django-eth-events',